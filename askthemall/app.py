@@ -1,20 +1,81 @@
 import locale
 import logging
+import threading
+from enum import Enum
 
-from dependency_injector.wiring import inject, Provide
+import streamlit as st
+from dependency_injector import containers as di_containers
 
-from askthemall import view
-from askthemall.core.persistence import DatabaseMigration
+from askthemall import containers, view
 
+logger = logging.getLogger(__name__)
 
-@inject
-def run(database_migration: DatabaseMigration = Provide["database_migration"]):
-    # TODO: skip init if application is already running to improve performance when not in dev mode
 
-    logging.basicConfig(
-        level=logging.INFO,
-        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    )
-    locale.setlocale(locale.LC_TIME, "")
-    database_migration.migrate()
+class Readiness(Enum):
+    STARTING = "starting"
+    READY = "ready"
+    FAILED = "failed"
+
+
+class Bootstrap:
+    """Builds the container, wires the modules and migrates the database once per process.
+
+    Streamlit re-executes the main script on every rerun, but imported modules are kept,
+    so the state kept here survives reruns and is shared by all sessions of the process.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__readiness = Readiness.STARTING
+        self.__container: di_containers.Container | None = None
+        self.__error: Exception | None = None
+
+    @property
+    def readiness(self) -> Readiness:
+        return self.__readiness
+
+    @property
+    def error(self) -> Exception | None:
+        return self.__error
+
+    @property
+    def container(self) -> di_containers.Container | None:
+        return self.__container
+
+    def start(self) -> Readiness:
+        if self.__readiness is Readiness.READY:
+            return self.__readiness
+        with self.__lock:
+            if self.__readiness is not Readiness.READY:
+                self.__start()
+        return self.__readiness
+
+    def __start(self):
+        try:
+            logging.basicConfig(
+                level=logging.INFO,
+                format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            )
+            locale.setlocale(locale.LC_TIME, "")
+            if self.__container is None:
+                self.__container = containers.init()
+            self.__container.database_migration().migrate()
+            self.__container.chat_bot_registry().register()
+            self.__readiness = Readiness.READY
+            self.__error = None
+            logger.info("Application started")
+        except Exception as e:
+            # the next rerun tries again, e.g. when OpenSearch was not yet reachable
+            logger.exception("Application failed to start")
+            self.__readiness = Readiness.FAILED
+            self.__error = e
+
+
+bootstrap = Bootstrap()
+
+
+def run():
+    if bootstrap.start() is not Readiness.READY:
+        st.error(f"AskThemAll failed to start: {bootstrap.error}")
+        return
     view.render()
@@ -1,8 +1,14 @@
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 from dependency_injector import containers, providers
 from opensearchpy import OpenSearch
 
+from askthemall.core.cache import LruResponseCache
+from askthemall.core.client import HistoryPolicy
+from askthemall.core.hedging import HedgedChatClient
+from askthemall.core.model import ChatBotRegistry, ChatCache
+from askthemall.core.scheduler import RequestScheduler
 from askthemall.lc import LangChainClient
 from askthemall.opensearch import (
     OpenSearchDatabaseMigration,
@@ -11,7 +17,11 @@ from askthemall.opensearch import (
     OpenSearchInteractionRepository,
     IndexNames,
 )
+from askthemall.opensearch.bulk import OpenSearchBulkWriter
+from askthemall.opensearch.cache import OpenSearchResponseCache
+from askthemall.opensearch.migration import OpenSearchIndexMigrator
 from askthemall.settings import Settings
+from askthemall.synthetic import SyntheticChatClient
 from askthemall.view.settings import ViewSettings
 
 logger = logging.getLogger(__name__)
@@ -22,26 +32,6 @@ def init():
     # noinspection PyArgumentList
     settings = Settings()
 
-    chat_client_providers = []
-    for chat_bot_id, chat_bot_settings in settings.chat_bots.items():
-        api_keys = {
-            "google": settings.google.api_key,
-            "groq": settings.groq.api_key,
-            "mistral": settings.mistral.api_key,
-        }
-        chat_client_providers.append(
-            providers.Singleton(
-                LangChainClient,
-                llm_type=chat_bot_settings.client.type,
-                api_key=api_keys[chat_bot_settings.client.type],
-                client_id=chat_bot_id,
-                model_name=chat_bot_settings.client.model_name,
-                name=chat_bot_settings.name,
-            )
-        )
-
-    container.chat_clients = providers.List(*chat_client_providers)
-
     container.opensearch = providers.Singleton(
         OpenSearch,
         hosts=[{"host": settings.opensearch.host, "port": settings.opensearch.port}],
@@ -56,22 +46,146 @@ def init():
         IndexNames, prefix=settings.opensearch.index_prefix
     )
 
+    cache_settings = settings.cache
+    container.response_cache = (
+        providers.Singleton(
+            LruResponseCache,
+            max_size=cache_settings.max_size,
+            ttl=cache_settings.ttl,
+            backend=(
+                providers.Singleton(
+                    OpenSearchResponseCache,
+                    client=container.opensearch,
+                    index=container.index_names.provided.responses,
+                    ttl=cache_settings.ttl,
+                )
+                if cache_settings.persistent
+                else None
+            ),
+        )
+        if cache_settings.enabled
+        else providers.Object(None)
+    )
+
+    # all chat bots of a provider share its rate limits
+    scheduler_providers = {}
+    chat_client_providers = {}
+    for chat_bot_id, chat_bot_settings in settings.chat_bots.items():
+        if chat_bot_settings.client.type == "synthetic":
+            synthetic_settings = chat_bot_settings.client.synthetic
+            chat_client_providers[chat_bot_id] = providers.Singleton(
+                SyntheticChatClient,
+                client_id=chat_bot_id,
+                name=chat_bot_settings.name,
+                model_name=chat_bot_settings.client.model_name,
+                first_token_delay=synthetic_settings.first_token_delay,
+                tokens_per_second=synthetic_settings.tokens_per_second,
+                answer_tokens_mean=synthetic_settings.answer_tokens_mean,
+                answer_tokens_stddev=synthetic_settings.answer_tokens_stddev,
+                error_rate=synthetic_settings.error_rate,
+                error_status_code=synthetic_settings.error_status_code,
+                seed=synthetic_settings.seed,
+            )
+            continue
+        provider_settings = getattr(settings, chat_bot_settings.client.type)
+        if provider_settings is None:
+            raise ValueError(
+                f"Chat bot '{chat_bot_id}' requires the "
+                f"[{chat_bot_settings.client.type}] settings"
+            )
+        if chat_bot_settings.client.type not in scheduler_providers:
+            scheduler_providers[chat_bot_settings.client.type] = providers.Singleton(
+                RequestScheduler,
+                name=chat_bot_settings.client.type,
+                requests_per_minute=provider_settings.requests_per_minute,
+                tokens_per_minute=provider_settings.tokens_per_minute,
+                max_retries=provider_settings.max_retries,
+            )
+        chat_client_providers[chat_bot_id] = providers.Singleton(
+            LangChainClient,
+            llm_type=chat_bot_settings.client.type,
+            api_key=provider_settings.api_key,
+            client_id=chat_bot_id,
+            model_name=chat_bot_settings.client.model_name,
+            name=chat_bot_settings.name,
+            history_policy=HistoryPolicy(
+                max_turns=chat_bot_settings.history.max_turns,
+                max_tokens=chat_bot_settings.history.max_tokens,
+                summarize=chat_bot_settings.history.summarize,
+            ),
+            response_cache=container.response_cache,
+            scheduler=scheduler_providers[chat_bot_settings.client.type],
+        )
+
+    # fallbacks are never hedged themselves
+    unhedged_client_providers = dict(chat_client_providers)
+    for chat_bot_id, chat_bot_settings in settings.chat_bots.items():
+        hedging = chat_bot_settings.hedging
+        if hedging is None:
+            continue
+        if (
+            hedging.fallback not in unhedged_client_providers
+            or hedging.fallback == chat_bot_id
+        ):
+            raise ValueError(
+                f"Chat bot '{chat_bot_id}' requires another configured chat bot "
+                f"as fallback, got '{hedging.fallback}'"
+            )
+        chat_client_providers[chat_bot_id] = providers.Singleton(
+            HedgedChatClient,
+            primary=unhedged_client_providers[chat_bot_id],
+            fallback=unhedged_client_providers[hedging.fallback],
+            percentile=hedging.percentile,
+            min_samples=hedging.min_samples,
+            initial_delay=hedging.initial_delay,
+        )
+
+    container.schedulers = providers.Dict(**scheduler_providers)
+    container.chat_clients = providers.List(*chat_client_providers.values())
+
+    bulk_settings = settings.opensearch.bulk
+    container.bulk_writer = (
+        providers.Singleton(
+            OpenSearchBulkWriter,
+            client=container.opensearch,
+            flush_size=bulk_settings.flush_size,
+            flush_interval=bulk_settings.flush_interval,
+            refresh=bulk_settings.refresh,
+            max_retries=bulk_settings.max_retries,
+            retry_backoff=bulk_settings.retry_backoff,
+        )
+        if bulk_settings.enabled
+        else providers.Object(None)
+    )
+
+    container.index_migrator = providers.Singleton(
+        OpenSearchIndexMigrator,
+        client=container.opensearch,
+        migrations_index=container.index_names.provided.migrations,
+        reindex_slices=settings.opensearch.migration.reindex_slices,
+    )
+
     container.chat_bot_repository = providers.Singleton(
         OpenSearchChatBotRepository,
         client=container.opensearch,
         index_names=container.index_names,
+        index_migrator=container.index_migrator,
     )
 
     container.chat_repository = providers.Singleton(
         OpenSearchChatRepository,
         client=container.opensearch,
         index_names=container.index_names,
+        bulk_writer=container.bulk_writer,
+        index_migrator=container.index_migrator,
     )
 
     container.interaction_repository = providers.Singleton(
         OpenSearchInteractionRepository,
         client=container.opensearch,
         index_names=container.index_names,
+        bulk_writer=container.bulk_writer,
+        index_migrator=container.index_migrator,
     )
 
     container.database_migration = providers.Singleton(
@@ -79,10 +193,32 @@ def init():
         chat_bot_repository=container.chat_bot_repository,
         chat_repository=container.chat_repository,
         interaction_repository=container.interaction_repository,
+        index_migrator=container.index_migrator,
+        background=settings.opensearch.migration.background,
+    )
+
+    container.executor = providers.Singleton(
+        ThreadPoolExecutor, thread_name_prefix="askthemall"
+    )
+
+    container.chat_bot_registry = providers.Singleton(
+        ChatBotRegistry,
+        chat_bot_repository=container.chat_bot_repository,
+        chat_clients=container.chat_clients,
+    )
+
+    # a cache of live chats per user, created on the user's first rerun
+    container.chat_cache = providers.Factory(
+        ChatCache,
+        max_chats=settings.chat_cache.max_chats,
+        max_size=settings.chat_cache.max_size,
     )
 
     container.view_settings = providers.Singleton(
-        ViewSettings, app_title=settings.app_name
+        ViewSettings,
+        app_title=settings.app_name,
+        coalesce_window=settings.streaming.coalesce_window,
+        coalesce_size=settings.streaming.coalesce_size,
     )
 
     container.wire(
@@ -91,7 +227,6 @@ def init():
             "askthemall.core.model",
             "askthemall.lc",
             "askthemall.opensearch",
-            "askthemall.app",
             "askthemall.view",
             "askthemall.view.model",
         ]
@@ -0,0 +1,136 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Iterable, Generator, Tuple
+
+logger = logging.getLogger(__name__)
+
+# the number of lookups between two log lines with the cache stats
+STATS_LOG_INTERVAL = 100
+
+
+def normalize(text: str) -> str:
+    """Normalizes a text for cache lookups, ignoring case and whitespace differences."""
+    return " ".join(text.split()).casefold()
+
+
+def cache_key(scope: str, history: Iterable[str], question: str) -> str:
+    """Returns the key of the answer to a question, given the preceding messages.
+
+    The scope identifies the client and model, so answers of different models are
+    never mixed up.
+    """
+    history_hash = hashlib.sha256()
+    for message in history:
+        history_hash.update(normalize(message).encode())
+        history_hash.update(b"\0")
+    return hashlib.sha256(
+        "\0".join([scope, history_hash.hexdigest(), normalize(question)]).encode()
+    ).hexdigest()
+
+
+def replay(answer: str) -> Generator[str, None, None]:
+    """Streams a cached answer word by word, like a model would."""
+    yield from re.findall(r"\s*\S+|\s+$", answer)
+
+
+@dataclass(frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    size: int
+
+
+class ResponseCache(ABC):
+    @abstractmethod
+    def get(self, key: str) -> str | None:
+        pass
+
+    @abstractmethod
+    def put(self, key: str, answer: str):
+        pass
+
+
+class LruResponseCache(ResponseCache):
+    """Thread-safe in-memory cache of answers, evicting the least recently used ones.
+
+    Answers expire `ttl` seconds after they were cached. An optional `backend`, e.g. a
+    persistent cache shared between processes, is consulted on a miss and written
+    through on every put. Failures of the backend are logged and treated as misses.
+    The hit and miss counts are logged every `STATS_LOG_INTERVAL` lookups.
+    """
+
+    def __init__(
+        self, max_size: int = 1000, ttl: float = 3600, backend: ResponseCache = None
+    ):
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__backend = backend
+        self.__entries: OrderedDict[str, Tuple[float, str]] = OrderedDict()
+        self.__lock = threading.Lock()
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def stats(self) -> CacheStats:
+        with self.__lock:
+            return CacheStats(
+                hits=self.__hits, misses=self.__misses, size=len(self.__entries)
+            )
+
+    def get(self, key: str) -> str | None:
+        answer = self.__get(key)
+        stats = self.stats
+        if (stats.hits + stats.misses) % STATS_LOG_INTERVAL == 0:
+            logger.info(
+                f"Response cache: {stats.hits} hits, {stats.misses} misses, "
+                f"{stats.size} answers cached"
+            )
+        return answer
+
+    def __get(self, key: str) -> str | None:
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return entry[1]
+            if entry:
+                del self.__entries[key]
+        answer = self.__get_from_backend(key)
+        with self.__lock:
+            if answer is None:
+                self.__misses += 1
+                return None
+            self.__hits += 1
+            self.__store(key, answer)
+            return answer
+
+    def put(self, key: str, answer: str):
+        with self.__lock:
+            self.__store(key, answer)
+        if self.__backend:
+            try:
+                self.__backend.put(key, answer)
+            except Exception:
+                logger.exception("Failed to store answer in the cache backend")
+
+    def __store(self, key: str, answer: str):
+        self.__entries[key] = (time.monotonic() + self.__ttl, answer)
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+
+    def __get_from_backend(self, key: str) -> str | None:
+        if not self.__backend:
+            return None
+        try:
+            return self.__backend.get(key)
+        except Exception:
+            logger.exception("Failed to get answer from the cache backend")
+            return None
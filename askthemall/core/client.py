@@ -1,6 +1,6 @@
 from abc import ABC, abstractmethod
 from dataclasses import dataclass
-from typing import List, Generator
+from typing import Iterable, Generator, AsyncGenerator, Sequence
 
 SUGGEST_TITLE_QUESTION = [
     "Generate a short descriptive title with minimum 3 words and maximum 15 words for this chat",
@@ -13,6 +13,13 @@ SUGGEST_TITLE_QUESTION = [
     "Do not include any other text.",
 ]
 
+SUMMARIZE_HISTORY_QUESTION = [
+    "Summarize the conversation below in at most 200 words.",
+    "Keep the facts, decisions and open questions that later questions may refer to.",
+    "Write the summary in the language of the conversation.",
+    "Do not include any other text.",
+]
+
 
 @dataclass
 class ChatInteraction:
@@ -20,13 +27,110 @@ class ChatInteraction:
     answer: str
 
 
+@dataclass(frozen=True)
+class ChatSummary:
+    text: str
+    # the number of leading interactions of the chat covered by the summary
+    interaction_count: int
+
+
+@dataclass(frozen=True)
+class TokenUsage:
+    input_tokens: int
+    output_tokens: int
+
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimates the number of tokens of a text, at about 4 characters per token."""
+    return len(text) // 4 + 1
+
+
+@dataclass(frozen=True)
+class HistoryPolicy:
+    """Bounds the history sent along with every question.
+
+    Only the latest `max_turns` interactions that fit in `max_tokens` are kept. Older
+    interactions are dropped or, when `summarize` is set, condensed into a summary.
+    """
+
+    max_turns: int | None = None
+    max_tokens: int | None = None
+    summarize: bool = False
+
+    def window(self, interactions: Sequence[ChatInteraction]) -> int:
+        """Returns the number of latest interactions to keep."""
+        kept = 0
+        tokens = 0
+        for interaction in reversed(interactions):
+            tokens += estimate_tokens(interaction.question)
+            tokens += estimate_tokens(interaction.answer)
+            if not self.fits(kept + 1, tokens):
+                break
+            kept += 1
+        return kept
+
+    def fits(self, turns: int, tokens: int) -> bool:
+        """Returns whether a history of this many turns and tokens is kept whole."""
+        return (self.max_turns is None or turns <= self.max_turns) and (
+            self.max_tokens is None or tokens <= self.max_tokens
+        )
+
+
 class ChatSession(ABC):
     @abstractmethod
     def ask(self, question) -> Generator[str, None, None]:
         pass
 
     @abstractmethod
-    def suggest_title(self) -> str:
+    def suggest_title(self, question: str) -> str:
+        """Suggests a title for a chat starting with the given question.
+
+        Does not use or change the history of the session, so it may run concurrently
+        with `ask`.
+        """
+        pass
+
+    @abstractmethod
+    def aask(self, question) -> AsyncGenerator[str, None]:
+        pass
+
+    @abstractmethod
+    async def asuggest_title(self, question: str) -> str:
+        pass
+
+    @property
+    @abstractmethod
+    def summary(self) -> ChatSummary | None:
+        """The summary of the interactions that were left out of the history."""
+        pass
+
+    @property
+    @abstractmethod
+    def answered_by(self) -> str | None:
+        """The id of the client that answered the last question."""
+        pass
+
+    @property
+    @abstractmethod
+    def usage(self) -> TokenUsage | None:
+        """The token usage of the last answer, if the provider reported it."""
+        pass
+
+    @property
+    @abstractmethod
+    def answered_from_cache(self) -> bool:
+        """Whether the last answer was replayed from a cache instead of generated."""
+        pass
+
+    @property
+    @abstractmethod
+    def history_size(self) -> int:
+        """The number of characters kept in the history, including the summary."""
+        pass
+
+    @abstractmethod
+    def add_interaction(self, interaction: ChatInteraction):
+        """Adds an interaction that was answered elsewhere to the history."""
         pass
 
 
@@ -41,12 +145,32 @@ class ChatClient(ABC):
     def name(self) -> str:
         pass
 
+    @property
+    @abstractmethod
+    def client_type(self) -> str:
+        pass
+
+    @property
+    @abstractmethod
+    def model_name(self) -> str:
+        pass
+
     @abstractmethod
     def start_session(self) -> ChatSession:
         pass
 
     @abstractmethod
     def restore_session(
-        self, interaction_data_list: List[ChatInteraction]
+        self,
+        interactions: Iterable[ChatInteraction],
+        summary: ChatSummary = None,
+        interaction_count: int = None,
     ) -> ChatSession:
+        """Restores a session from the history of a chat.
+
+        `interactions` are the latest interactions of the chat, newest first. They are
+        read lazily and only as far as the session needs them, and may stop at the
+        interactions covered by `summary`. `interaction_count` is the number of
+        interactions of the whole chat; without it, all interactions are read.
+        """
         pass
@@ -0,0 +1,392 @@
+import asyncio
+import contextlib
+import itertools
+import logging
+import math
+import threading
+import time
+from collections import deque
+from queue import Queue, Empty
+from typing import Iterable, Callable, Iterator, Generator, AsyncGenerator
+
+from askthemall.core.client import (
+    ChatClient,
+    ChatSession,
+    ChatInteraction,
+    ChatSummary,
+    TokenUsage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class LatencyTracker:
+    """Thread-safe window of the latest latency samples."""
+
+    def __init__(self, window: int = 100):
+        self.__samples = deque(maxlen=window)
+        self.__lock = threading.Lock()
+
+    def __len__(self):
+        with self.__lock:
+            return len(self.__samples)
+
+    def record(self, seconds: float):
+        with self.__lock:
+            self.__samples.append(seconds)
+
+    def percentile(self, percentile: float) -> float | None:
+        """Returns the nearest-rank percentile of the samples, if there are any."""
+        with self.__lock:
+            samples = sorted(self.__samples)
+        if not samples:
+            return None
+        rank = max(math.ceil(percentile / 100 * len(samples)), 1)
+        return samples[rank - 1]
+
+
+class HedgedChatClient(ChatClient):
+    """Hedges slow answers of a chat client with a fallback client.
+
+    When the first chunk of an answer takes longer than the given percentile of the
+    latest times to first chunk, the question is asked to the fallback as well and the
+    answer that starts first is streamed. Until `min_samples` times were measured,
+    `initial_delay` seconds are used instead.
+    """
+
+    def __init__(
+        self,
+        primary: ChatClient,
+        fallback: ChatClient,
+        percentile: float = 95,
+        min_samples: int = 20,
+        initial_delay: float = 5.0,
+    ):
+        self.__primary = primary
+        self.__fallback = fallback
+        self.__percentile = percentile
+        self.__min_samples = min_samples
+        self.__initial_delay = initial_delay
+        self.__first_chunk_latencies = LatencyTracker()
+
+    @property
+    def id(self) -> str:
+        return self.__primary.id
+
+    @property
+    def name(self) -> str:
+        return self.__primary.name
+
+    @property
+    def client_type(self) -> str:
+        return self.__primary.client_type
+
+    @property
+    def model_name(self) -> str:
+        return self.__primary.model_name
+
+    @property
+    def hedge_delay(self) -> float:
+        if len(self.__first_chunk_latencies) < self.__min_samples:
+            return self.__initial_delay
+        return self.__first_chunk_latencies.percentile(self.__percentile)
+
+    def record_first_chunk_latency(self, seconds: float):
+        self.__first_chunk_latencies.record(seconds)
+
+    def start_session(self) -> ChatSession:
+        return HedgedChatSession(
+            self, self.__primary.start_session(), self.__fallback.start_session()
+        )
+
+    def restore_session(
+        self,
+        interactions: Iterable[ChatInteraction],
+        summary: ChatSummary = None,
+        interaction_count: int = None,
+    ) -> ChatSession:
+        # both sessions read the interactions they need, which are only kept in memory
+        # until the other session read them too
+        primary_interactions, fallback_interactions = itertools.tee(interactions)
+        primary = self.__primary.restore_session(
+            primary_interactions, summary=summary, interaction_count=interaction_count
+        )
+        # the summary made by the primary is reused, so the history is summarized once
+        fallback = self.__fallback.restore_session(
+            fallback_interactions,
+            summary=primary.summary or summary,
+            interaction_count=interaction_count,
+        )
+        return HedgedChatSession(self, primary, fallback)
+
+
+class _StreamWorker:
+    """Streams an answer in a background thread, into a queue shared by the workers."""
+
+    def __init__(
+        self,
+        name: str,
+        session: ChatSession,
+        stream: Callable[[], Iterator[str]],
+        events: Queue,
+    ):
+        self.name = name
+        # whether the stream was consumed to its end, so its session kept the answer
+        self.completed = False
+        self.__session = session
+        self.__stream = stream
+        self.__events = events
+        self.__chunks: Iterator[str] | None = None
+        self.__reading = False
+        self.__cancelled = False
+        self.__stopped = False
+        self.__handed_over: ChatInteraction | None = None
+        self.__lock = threading.Lock()
+        self.__thread = threading.Thread(
+            target=self.__run, name=f"hedge-{name}", daemon=True
+        )
+        self.__thread.start()
+
+    def cancel(self):
+        """Stops streaming and closes the stream.
+
+        A chunk that is being read cannot be interrupted from another thread, so the
+        stream is then closed as soon as the chunk arrives, and the chunk is dropped.
+        """
+        with self.__lock:
+            self.__cancelled = True
+            if self.__chunks is not None and not self.__reading:
+                self.__close()
+
+    def hand_over(self, interaction: ChatInteraction):
+        """Adds the answer of the other worker to the session, once this one stopped.
+
+        The answer is left out if this worker completed its own answer meanwhile, as
+        its session then kept it. The caller does not wait for this worker to stop.
+        """
+        with self.__lock:
+            if not self.__stopped:
+                self.__handed_over = interaction
+                return
+        self.__add_handed_over(interaction)
+
+    def __run(self):
+        try:
+            chunks = self.__stream()
+            with self.__lock:
+                self.__chunks = chunks
+            try:
+                while True:
+                    with self.__lock:
+                        if self.__cancelled:
+                            return
+                        self.__reading = True
+                    try:
+                        chunk = next(chunks)
+                    except StopIteration:
+                        self.completed = True
+                        break
+                    finally:
+                        with self.__lock:
+                            self.__reading = False
+                    with self.__lock:
+                        if self.__cancelled:
+                            return
+                    self.__events.put((self, chunk, None))
+            finally:
+                with self.__lock:
+                    self.__close()
+            self.__events.put((self, None, None))
+        except Exception as e:
+            self.__events.put((self, None, e))
+        finally:
+            with self.__lock:
+                self.__stopped = True
+                interaction = self.__handed_over
+            if interaction:
+                self.__add_handed_over(interaction)
+
+    def __add_handed_over(self, interaction: ChatInteraction):
+        if not self.completed:
+            self.__session.add_interaction(interaction)
+
+    def __close(self):
+        if hasattr(self.__chunks, "close"):
+            self.__chunks.close()
+
+
+class HedgedChatSession(ChatSession):
+    """Session of a `HedgedChatClient`, keeping the histories of both sessions in sync."""
+
+    def __init__(
+        self, client: HedgedChatClient, primary: ChatSession, fallback: ChatSession
+    ):
+        self.__client = client
+        self.__primary = primary
+        self.__fallback = fallback
+        self.__winning_session: ChatSession | None = None
+
+    @property
+    def summary(self) -> ChatSummary | None:
+        return self.__primary.summary
+
+    @property
+    def answered_by(self) -> str | None:
+        return self.__winning_session.answered_by if self.__winning_session else None
+
+    @property
+    def usage(self) -> TokenUsage | None:
+        return self.__winning_session.usage if self.__winning_session else None
+
+    @property
+    def answered_from_cache(self) -> bool:
+        return (
+            self.__winning_session.answered_from_cache
+            if self.__winning_session
+            else False
+        )
+
+    @property
+    def history_size(self) -> int:
+        return self.__primary.history_size + self.__fallback.history_size
+
+    def add_interaction(self, interaction: ChatInteraction):
+        self.__primary.add_interaction(interaction)
+        self.__fallback.add_interaction(interaction)
+
+    def suggest_title(self, question: str) -> str:
+        return self.__primary.suggest_title(question)
+
+    async def asuggest_title(self, question: str) -> str:
+        return await self.__primary.asuggest_title(question)
+
+    def ask(self, question) -> Generator[str, None, None]:
+        started_at = time.monotonic()
+        events = Queue()
+        primary = _StreamWorker(
+            "primary", self.__primary, lambda: self.__primary.ask(question), events
+        )
+        fallback = None
+        winner = None
+        errors = {}
+        while winner is None:
+            timeout = (
+                None
+                if fallback
+                else max(started_at + self.__client.hedge_delay - time.monotonic(), 0)
+            )
+            try:
+                worker, chunk, error = events.get(timeout=timeout)
+            except Empty:
+                fallback = self.__hedge(question, events)
+                continue
+            if error:
+                errors[worker] = error
+                if fallback is None:
+                    # the fallback also takes over when the primary fails early
+                    fallback = self.__hedge(question, events)
+                elif len(errors) == 2:
+                    raise errors[primary]
+                continue
+            winner = worker
+            # replayed answers start right away, which says nothing about the latency
+            if worker is primary and not self.__primary.answered_from_cache:
+                self.__client.record_first_chunk_latency(time.monotonic() - started_at)
+
+        loser = fallback if winner is primary else primary
+        if loser:
+            loser.cancel()
+            if loser is primary and primary not in errors:
+                # the primary was at least this slow, which the percentile should know
+                self.__client.record_first_chunk_latency(time.monotonic() - started_at)
+        self.__winning_session = (
+            self.__primary if winner is primary else self.__fallback
+        )
+
+        answer_chunks = []
+        try:
+            while chunk is not None:
+                answer_chunks.append(chunk)
+                yield chunk
+                worker, chunk, error = events.get()
+                while worker is not winner:
+                    worker, chunk, error = events.get()
+                if error:
+                    raise error
+        finally:
+            winner.cancel()
+
+        interaction = ChatInteraction(question=question, answer="".join(answer_chunks))
+        if loser:
+            # a cancelled answer is not added to the history of its session, which the
+            # loser settles when it stops, as it may complete its answer meanwhile
+            loser.hand_over(interaction)
+        else:
+            self.__fallback.add_interaction(interaction)
+
+    def __hedge(self, question, events: Queue) -> _StreamWorker:
+        self.__log_hedge()
+        return _StreamWorker(
+            "fallback", self.__fallback, lambda: self.__fallback.ask(question), events
+        )
+
+    async def aask(self, question) -> AsyncGenerator[str, None]:
+        started_at = time.monotonic()
+        primary = self.__primary.aask(question)
+        first_chunks = {asyncio.ensure_future(primary.__anext__()): primary}
+        done, _ = await asyncio.wait(first_chunks, timeout=self.__client.hedge_delay)
+        if done and not _failed(next(iter(done))):
+            if not self.__primary.answered_from_cache:
+                self.__client.record_first_chunk_latency(time.monotonic() - started_at)
+        else:
+            self.__log_hedge()
+            fallback = self.__fallback.aask(question)
+            first_chunks[asyncio.ensure_future(fallback.__anext__())] = fallback
+            done, _ = await asyncio.wait(
+                first_chunks, return_when=asyncio.FIRST_COMPLETED
+            )
+            if all(_failed(task) for task in done):
+                # the fallback also takes over when the primary fails early
+                done, _ = await asyncio.wait(first_chunks)
+
+        winner_task = next(
+            (task for task in done if not _failed(task)), next(iter(first_chunks))
+        )
+        winner = first_chunks.pop(winner_task)
+        for task, loser in first_chunks.items():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError, Exception):
+                await task
+            await loser.aclose()
+            if loser is primary and task.cancelled():
+                self.__client.record_first_chunk_latency(time.monotonic() - started_at)
+        self.__winning_session = (
+            self.__primary if winner is primary else self.__fallback
+        )
+
+        answer_chunks = []
+        try:
+            answer_chunks.append(winner_task.result())
+        except StopAsyncIteration:
+            pass
+        if answer_chunks:
+            yield answer_chunks[0]
+            async for chunk in winner:
+                answer_chunks.append(chunk)
+                yield chunk
+
+        other_session = self.__fallback if winner is primary else self.__primary
+        other_session.add_interaction(
+            ChatInteraction(question=question, answer="".join(answer_chunks))
+        )
+
+    def __log_hedge(self):
+        logger.info(
+            f"Hedging a slow answer of '{self.__client.id}' after "
+            f"{self.__client.hedge_delay:.1f}s"
+        )
+
+
+def _failed(task: asyncio.Future) -> bool:
+    error = task.exception()
+    return error is not None and not isinstance(error, StopAsyncIteration)
@@ -1,14 +1,28 @@
 from __future__ import annotations
 
+import asyncio
+import itertools
+import logging
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
 from dataclasses import dataclass
 from datetime import datetime
-from typing import List
+from queue import Queue
+from typing import List, Dict, Tuple, Generator, AsyncGenerator
 
 from boltons.strutils import slugify
 from dependency_injector.wiring import inject, Provide
 
-from askthemall.core.client import ChatClient, ChatInteraction
+from askthemall.core.client import (
+    ChatClient,
+    ChatInteraction,
+    ChatSummary,
+)
 from askthemall.core.persistence import (
+    AnswerStats,
     ChatData,
     InteractionData,
     ChatBotData,
@@ -17,6 +31,10 @@ from askthemall.core.persistence import (
     ChatBotRepository,
 )
 
+logger = logging.getLogger(__name__)
+
+_versions = itertools.count()
+
 
 @dataclass
 class InteractionModel:
@@ -25,14 +43,50 @@ class InteractionModel:
     question: str
     answer: str
     asked_at: datetime
+    answered_by: str = None
+    cached: bool = False
+    first_chunk_latency: float = None
+    duration: float = None
+    chunk_count: int = None
+    input_tokens: int = None
+    output_tokens: int = None
 
-    def get_data(self):
+    @property
+    def tokens_per_second(self) -> float | None:
+        """The output tokens per second streamed after the first chunk.
+
+        Only known when the provider reported its usage, estimates are not mixed in.
+        """
+        if (
+            self.first_chunk_latency is None
+            or self.duration is None
+            or self.output_tokens is None
+        ):
+            return None
+        streaming_time = self.duration - self.first_chunk_latency
+        if streaming_time <= 0:
+            return None
+        return self.output_tokens / streaming_time
+
+    def get_data(self, chat_data: ChatData = None):
         return InteractionData(
             id=self.id,
             chat_id=self.chat_id,
             question=self.question,
             answer=self.answer,
             asked_at=self.asked_at,
+            answered_by=self.answered_by,
+            cached=self.cached,
+            first_chunk_latency=self.first_chunk_latency,
+            duration=self.duration,
+            chunk_count=self.chunk_count,
+            input_tokens=self.input_tokens,
+            output_tokens=self.output_tokens,
+            tokens_per_second=self.tokens_per_second,
+            chat_bot_id=chat_data.chat_bot_id if chat_data else None,
+            chat_slug=chat_data.slug if chat_data else None,
+            chat_title=chat_data.title if chat_data else None,
+            chat_created_at=chat_data.created_at if chat_data else None,
         )
 
     @classmethod
@@ -43,9 +97,35 @@ class InteractionModel:
             question=interaction_data.question,
             answer=interaction_data.answer,
             asked_at=interaction_data.asked_at,
+            answered_by=interaction_data.answered_by,
+            cached=bool(interaction_data.cached),
+            first_chunk_latency=interaction_data.first_chunk_latency,
+            duration=interaction_data.duration,
+            chunk_count=interaction_data.chunk_count,
+            input_tokens=interaction_data.input_tokens,
+            output_tokens=interaction_data.output_tokens,
         )
 
 
+class AnswerTimer:
+    """Measures the time to first chunk and the duration of a streamed answer."""
+
+    def __init__(self):
+        self.asked_at = datetime.now()
+        self.first_chunk_latency: float | None = None
+        self.duration: float | None = None
+        self.chunks: List[str] = []
+        self.__started_at = time.perf_counter()
+
+    def add_chunk(self, chunk: str):
+        if self.first_chunk_latency is None:
+            self.first_chunk_latency = time.perf_counter() - self.__started_at
+        self.chunks.append(chunk)
+
+    def stop(self):
+        self.duration = time.perf_counter() - self.__started_at
+
+
 class ChatModel:
     @inject
     def __init__(
@@ -55,73 +135,259 @@ class ChatModel:
         interaction_repository: InteractionRepository = Provide[
             "interaction_repository"
         ],
+        executor: Executor = Provide["executor"],
     ):
         self.created_at = datetime.now()
         self.id = f"{chat_bot.id}-{datetime.now().timestamp()}"
         self.slug = None
         self.title = f"Chat with {chat_bot.name}"
         self.interactions: list[InteractionModel] = []
+        # changes whenever the interactions change, so views can reuse what they built;
+        # unique across chats, so a chat read again never reuses a stale view
+        self.version = next(_versions)
         self.started = False
+        self.summary: ChatSummary | None = None
+        self.__unsaved_interactions: list[InteractionModel] = []
+        self.__interaction_count = 0
+        self.__earlier_interactions_cursor = None
         self.__session = None
         self.__chat_bot = chat_bot
         self.__chat_client = chat_bot.chat_client
         self.__chat_repository = chat_repository
         self.__interaction_repository = interaction_repository
+        self.__executor = executor
+        self.__title_future: Future | None = None
+        # the detached copies listing this chat, which get its suggested title
+        self.__copies: weakref.WeakSet[ChatModel] = weakref.WeakSet()
+        self.__lock = threading.Lock()
 
     @property
     def assistant_name(self):
         return self.__chat_bot.name
 
+    @property
+    def chat_bot_id(self) -> str:
+        return self.__chat_bot.id
+
     @property
     def enabled(self) -> bool:
         return self.__chat_client is not None
 
+    @property
+    def has_earlier_interactions(self) -> bool:
+        return self.__interaction_count > len(self.interactions)
+
+    @property
+    def size(self) -> int:
+        """The number of characters this chat keeps in memory.
+
+        Counts the questions and answers of the loaded interactions and the history of
+        the session, including its summary. Texts shared by both, e.g. the answers of
+        the current session, are counted twice, so the size is an upper bound.
+        """
+        return sum(
+            len(interaction.question) + len(interaction.answer)
+            for interaction in self.interactions
+        ) + (self.__session.history_size if self.__session else 0)
+
     def ask_question(self, question):
-        answer_generator = self.__session.ask(question)
+        yield from self.answer_question(question)
+        self.__save_unsaved_data()
+
+    async def aask_question(self, question):
+        async for chunk in self.aanswer_question(question):
+            yield chunk
+        await asyncio.to_thread(self.__save_unsaved_data)
+
+    def answer_question(self, question):
+        """Streams the answer and adds the interaction to the chat without saving it.
 
-        full_answer_chunks: List[str] = []
-        for chunk in answer_generator:
-            full_answer_chunks.append(chunk)
+        On the first question, a title is suggested in the background meanwhile.
+        """
+        timer = AnswerTimer()
+        self.__suggest_title(question)
+        for chunk in self.__session.ask(question):
+            timer.add_chunk(chunk)
             yield chunk
 
-        answer = "".join(full_answer_chunks)
-        asked_at = datetime.now()
+        timer.stop()
+        self.__add_interaction(question, timer)
+
+    async def aanswer_question(self, question):
+        """Async variant of `answer_question`."""
+        timer = AnswerTimer()
+        self.__asuggest_title(question)
+        async for chunk in self.__session.aask(question):
+            timer.add_chunk(chunk)
+            yield chunk
+
+        timer.stop()
+        self.__add_interaction(question, timer)
+
+    def __add_interaction(self, question, timer: AnswerTimer):
+        usage = self.__session.usage
         interaction = InteractionModel(
-            id=f"{self.__chat_bot.id}-{asked_at.timestamp()}",
+            id=f"{self.__chat_bot.id}-{timer.asked_at.timestamp()}",
             chat_id=self.id,
             question=question,
-            answer=answer,
-            asked_at=asked_at,
+            answer="".join(timer.chunks),
+            asked_at=timer.asked_at,
+            answered_by=self.__session.answered_by,
+            cached=self.__session.answered_from_cache,
+            first_chunk_latency=timer.first_chunk_latency,
+            duration=timer.duration,
+            chunk_count=len(timer.chunks),
+            input_tokens=usage.input_tokens if usage else None,
+            output_tokens=usage.output_tokens if usage else None,
         )
         self.interactions.append(interaction)
-        if not self.started:
-            self.title = self.__session.suggest_title()
-            self.slug = "-".join(
-                [slugify(self.title, delim="-"), str(int(datetime.now().timestamp()))]
-            )
-            self.__chat_repository.save(self.get_data())
+        self.__unsaved_interactions.append(interaction)
+        self.__interaction_count += 1
+        self.version = next(_versions)
+
+    def __suggest_title(self, question):
+        if self.__title_future or self.started or self.slug:
+            return
+        self.__title_future = self.__executor.submit(
+            self.__session.suggest_title, question
+        )
+
+    def __asuggest_title(self, question):
+        if self.__title_future or self.started or self.slug:
+            return
+        # a concurrent future, so the title can be applied and saved from any thread
+        self.__title_future = asyncio.run_coroutine_threadsafe(
+            self.__session.asuggest_title(question), asyncio.get_running_loop()
+        )
+
+    def save_suggested_title(self):
+        """Saves the suggested title once it arrives, if it was not saved with the chat.
+
+        The chat is saved first under its provisional title, so saving the first answer
+        does not wait for the title. The saved interactions are saved again with the
+        title, which only concerns the interactions of the first answer.
+        """
+        if self.__title_future:
+            self.__title_future.add_done_callback(self.__on_title_suggested)
+
+    def __on_title_suggested(self, future: Future):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.__save_suggested_title(future)
+            return
+        # titles suggested asynchronously arrive on the event loop, which must not wait
+        loop.run_in_executor(self.__executor, self.__save_suggested_title, future)
+
+    def __save_suggested_title(self, future: Future):
+        with self.__lock:
+            if not self.__apply_suggested_title(future):
+                return
+            chat_data = self.get_data()
+            interaction_data_list = [
+                interaction.get_data(chat_data)
+                for interaction in self.interactions
+                if not any(
+                    interaction is unsaved_interaction
+                    for unsaved_interaction in self.__unsaved_interactions
+                )
+            ]
+        self.__chat_repository.save(chat_data)
+        self.__interaction_repository.save_all(interaction_data_list)
+
+    def __apply_suggested_title(self, future: Future) -> bool:
+        if self.__title_future is not future:
+            return False
+        self.__title_future = None
+        try:
+            self.__set_title(future.result())
+        except Exception:
+            logger.exception(f"Failed to suggest a title for chat '{self.id}'")
+            return False
+        return True
+
+    def __set_title(self, title: str):
+        self.title = title
+        self.slug = "-".join(
+            [slugify(self.title, delim="-"), str(int(datetime.now().timestamp()))]
+        )
+        for copy in list(self.__copies):
+            copy.title, copy.slug = self.title, self.slug
+
+    def __save_unsaved_data(self):
+        chat_data, interaction_data_list = self.collect_unsaved_data()
+        if chat_data:
+            self.__chat_repository.save(chat_data)
+        self.__interaction_repository.save_all(interaction_data_list)
+        self.save_suggested_title()
+
+    def collect_unsaved_data(self) -> Tuple[ChatData | None, List[InteractionData]]:
+        """Returns the chat, if it was never saved, and the interactions to save.
+
+        The returned data is considered saved afterwards. A suggested title that has
+        already arrived is included, otherwise the provisional title is.
+        """
+        with self.__lock:
+            if self.__title_future and self.__title_future.done():
+                self.__apply_suggested_title(self.__title_future)
+            chat_data = self.get_data()
+            interaction_data_list = [
+                interaction.get_data(chat_data)
+                for interaction in self.__unsaved_interactions
+            ]
+            self.__unsaved_interactions = []
+            if self.started:
+                return None, interaction_data_list
             self.started = True
-        self.__interaction_repository.save(interaction.get_data())
+            return chat_data, interaction_data_list
 
     def start_chat(self):
         self.__session = self.__chat_client.start_session()
 
-    def restore_chat(self):
-        interaction_data_list = self.__interaction_repository.find_all_by_chat_id(
-            self.id
-        )
-        self.interactions = list(
-            map(lambda i: InteractionModel.from_data(i), interaction_data_list)
-        )
+    def restore_chat(self, window: int = 20):
+        """Loads the latest interactions and restores the session of the chat.
+
+        The session reads the interactions newest first, as far as it needs them, and
+        not further than the interactions its summary already covers.
+        """
+        self.interactions = []
+        self.__earlier_interactions_cursor = None
+        self.__interaction_count = 0
+        self.load_earlier_interactions(window)
         if self.__chat_client:
+            covered = self.summary.interaction_count if self.summary else 0
             self.__session = self.__chat_client.restore_session(
-                list(
+                itertools.islice(
                     map(
                         lambda i: ChatInteraction(question=i.question, answer=i.answer),
-                        self.interactions,
-                    )
-                )
+                        self.__interaction_repository.iter_all_by_chat_id(
+                            self.id, newest_first=True
+                        ),
+                    ),
+                    max(self.__interaction_count - covered, 0),
+                ),
+                summary=self.summary,
+                interaction_count=self.__interaction_count,
             )
+            if self.__session.summary != self.summary:
+                # cache the summary so it is only extended on the next restore
+                self.summary = self.__session.summary
+                self.__chat_repository.save(self.get_data())
+
+    def load_earlier_interactions(self, limit: int = 20):
+        page = self.__interaction_repository.find_page_by_chat_id(
+            self.id,
+            after=self.__earlier_interactions_cursor,
+            limit=limit,
+            newest_first=True,
+        )
+        earlier_interactions = list(
+            map(lambda i: InteractionModel.from_data(i), reversed(page.data))
+        )
+        self.interactions = earlier_interactions + self.interactions
+        self.__earlier_interactions_cursor = page.cursor
+        self.__interaction_count = max(self.__interaction_count, page.total_results)
+        self.version = next(_versions)
 
     def remove(self):
         self.__chat_repository.delete_by_id(self.id)
@@ -134,8 +400,22 @@ class ChatModel:
             slug=self.slug,
             title=self.title,
             created_at=self.created_at,
+            summary=self.summary.text if self.summary else None,
+            summary_interaction_count=(
+                self.summary.interaction_count if self.summary else None
+            ),
         )
 
+    def detach(self) -> ChatModel:
+        """Returns a copy without the interactions and the session, to list the chat.
+
+        The copy gets the title suggested later, but does not keep this chat alive.
+        """
+        with self.__lock:
+            chat = ChatModel.from_data(self.__chat_bot, self.get_data())
+            self.__copies.add(chat)
+        return chat
+
     @classmethod
     def from_data(cls, chat_bot: ChatBotModel, chat_data: ChatData):
         chat = cls(chat_bot)
@@ -143,14 +423,49 @@ class ChatModel:
         chat.slug = chat_data.slug
         chat.title = chat_data.title
         chat.created_at = chat_data.created_at
+        if chat_data.summary:
+            chat.summary = ChatSummary(
+                text=chat_data.summary,
+                interaction_count=chat_data.summary_interaction_count,
+            )
         chat.started = True
         return chat
 
 
 class ChatListModel:
-    def __init__(self, chats: List[ChatModel], total_results: int):
+    def __init__(
+        self,
+        chats: List[ChatModel],
+        total_results: int,
+        highlights: Dict[str, List[str]] = None,
+        cursor=None,
+    ):
         self.chats = chats
         self.total_results = total_results
+        self.highlights = highlights or {}
+        # opaque position after the last chat, to fetch the next page
+        self.cursor = cursor
+
+    def extend(self, page: ChatListModel):
+        """Appends the next page of chats."""
+        self.chats.extend(page.chats)
+        self.highlights.update(page.highlights)
+        self.total_results = page.total_results
+        self.cursor = page.cursor
+
+    def put(self, chat: ChatModel):
+        """Replaces the chat with the same id, or adds a new chat as the newest one."""
+        for i, listed_chat in enumerate(self.chats):
+            if listed_chat.id == chat.id:
+                self.chats[i] = chat
+                return
+        self.chats.insert(0, chat)
+        self.total_results += 1
+
+    def remove(self, chat_id: str):
+        chat_count = len(self.chats)
+        self.chats = [chat for chat in self.chats if chat.id != chat_id]
+        self.total_results -= chat_count - len(self.chats)
 
 
 class ChatBotModel:
@@ -187,15 +502,16 @@ class ChatBotModel:
         chat_data = self.__chat_repository.get_by_id(chat_id)
         return ChatModel.from_data(self, chat_data)
 
-    def get_all_chats(self, max_results: int = 100) -> ChatListModel:
+    def get_all_chats(self, max_results: int = 100, cursor=None) -> ChatListModel:
         chat_data_list_result = self.__chat_repository.find_all_by_chat_bot_id(
-            self.id, max_results=max_results
+            self.id, max_results=max_results, search_after=cursor
         )
         return ChatListModel(
             chats=list(
                 map(lambda c: ChatModel.from_data(self, c), chat_data_list_result.data)
             ),
             total_results=chat_data_list_result.total_results,
+            cursor=chat_data_list_result.cursor,
         )
 
     def new_chat(self) -> ChatModel:
@@ -209,50 +525,272 @@ class ChatBotModel:
         return chat_bot
 
 
-class AskThemAllModel:
+class ChatBotRegistry:
+    """Process-wide, id-indexed cache of the chat bots.
+
+    The chat bots are loaded from the repository at most once per `ttl` seconds, or
+    again after `invalidate`, and shared by all sessions. Before the first load, the
+    configured chat clients are registered as chat bots, writing only those that are
+    new or changed.
+    """
+
     @inject
     def __init__(
         self,
         chat_bot_repository: ChatBotRepository = Provide["chat_bot_repository"],
-        chat_repository: ChatRepository = Provide["chat_repository"],
         chat_clients: List[ChatClient] = Provide["chat_clients"],
+        ttl: float = 300,
     ):
-        self.__chat_clients = chat_clients
         self.__chat_bot_repository = chat_bot_repository
-        self.__chat_repository = chat_repository
-        for chat_client in self.__chat_clients:
-            self.__chat_bot_repository.save(
-                ChatBotData(id=chat_client.id, name=chat_client.name)
+        self.__chat_clients = {
+            chat_client.id: chat_client for chat_client in chat_clients
+        }
+        self.__ttl = ttl
+        self.__lock = threading.Lock()
+        self.__chat_bots: Dict[str, ChatBotModel] = {}
+        self.__sorted_chat_bots: List[ChatBotModel] = []
+        self.__expires_at = 0.0
+        self.__registered = False
+
+    @property
+    def chat_bots(self) -> List[ChatBotModel]:
+        self.__load_if_expired()
+        return list(self.__sorted_chat_bots)
+
+    def get(self, chat_bot_id: str) -> ChatBotModel | None:
+        self.__load_if_expired()
+        return self.__chat_bots.get(chat_bot_id)
+
+    def invalidate(self):
+        with self.__lock:
+            self.__expires_at = 0.0
+
+    def register(self):
+        with self.__lock:
+            self.__register_if_needed()
+
+    def __register_if_needed(self):
+        if self.__registered:
+            return
+        registered_chat_bots = {
+            chat_bot_data.id: chat_bot_data
+            for chat_bot_data in self.__chat_bot_repository.iter_all()
+        }
+        changed_chat_bots = [
+            chat_bot_data
+            for chat_bot_data in [
+                ChatBotData(
+                    id=chat_client.id,
+                    name=chat_client.name,
+                    client_type=chat_client.client_type,
+                    model_name=chat_client.model_name,
+                )
+                for chat_client in self.__chat_clients.values()
+            ]
+            if registered_chat_bots.get(chat_bot_data.id) != chat_bot_data
+        ]
+        if changed_chat_bots:
+            self.__chat_bot_repository.save_all(changed_chat_bots)
+        self.__registered = True
+        self.__expires_at = 0.0
+
+    def __load_if_expired(self):
+        with self.__lock:
+            self.__register_if_needed()
+            if time.monotonic() < self.__expires_at:
+                return
+            chat_bots = {
+                chat_bot_data.id: ChatBotModel.from_data(
+                    chat_bot_data, self.__chat_clients.get(chat_bot_data.id)
+                )
+                for chat_bot_data in self.__chat_bot_repository.iter_all()
+            }
+            self.__chat_bots = chat_bots
+            self.__sorted_chat_bots = sorted(
+                chat_bots.values(), key=lambda c: str(not c.enabled) + c.name
             )
+            self.__expires_at = time.monotonic() + self.__ttl
+
+
+@dataclass
+class FanOutChunk:
+    chat_id: str
+    text: str | None = None
+    error: Exception | None = None
+    done: bool = False
+
+
+class FanOutModel:
+    """Asks the same question to the chats of several chat bots concurrently."""
 
-    def __get_chat_client_by_id(self, chat_client_id: str) -> ChatClient | None:
-        for chat_client in self.__chat_clients:
-            if chat_client.id == chat_client_id:
-                return chat_client
-        return None
+    @inject
+    def __init__(
+        self,
+        chat_bots: List[ChatBotModel],
+        executor: Executor = Provide["executor"],
+        chat_repository: ChatRepository = Provide["chat_repository"],
+        interaction_repository: InteractionRepository = Provide[
+            "interaction_repository"
+        ],
+    ):
+        self.chats = [chat_bot.new_chat() for chat_bot in chat_bots]
+        self.__executor = executor
+        self.__chat_repository = chat_repository
+        self.__interaction_repository = interaction_repository
+
+    def get_chat(self, chat_id: str) -> ChatModel | None:
+        return next((chat for chat in self.chats if chat.id == chat_id), None)
+
+    def ask_question(self, question) -> Generator[FanOutChunk, None, None]:
+        """Yields the chunks of all answers, interleaved in the order they arrive.
+
+        Each answer is saved as soon as its chat bot is done. A chat bot that fails
+        ends with an error chunk and does not affect the others.
+        """
+        chunks = Queue()
+        for chat in self.chats:
+            self.__executor.submit(self.__answer, chat, question, chunks)
+        remaining = len(self.chats)
+        while remaining:
+            chunk = chunks.get()
+            if chunk.done:
+                remaining -= 1
+            yield chunk
+
+    async def aask_question(self, question) -> AsyncGenerator[FanOutChunk, None]:
+        """Async variant of `ask_question`, answering on the running event loop."""
+        chunks = asyncio.Queue()
+        tasks = [
+            asyncio.create_task(self.__aanswer(chat, question, chunks))
+            for chat in self.chats
+        ]
+        remaining = len(tasks)
+        while remaining:
+            chunk = await chunks.get()
+            if chunk.done:
+                remaining -= 1
+            yield chunk
+        await asyncio.gather(*tasks)
+
+    def __save(self, chat: ChatModel):
+        chat_data, interaction_data_list = chat.collect_unsaved_data()
+        if chat_data:
+            self.__chat_repository.save(chat_data)
+        self.__interaction_repository.save_all(interaction_data_list)
+        chat.save_suggested_title()
+
+    def __answer(self, chat: ChatModel, question, chunks: Queue):
+        try:
+            for text in chat.answer_question(question):
+                chunks.put(FanOutChunk(chat_id=chat.id, text=text))
+            self.__save(chat)
+        except Exception as e:
+            logger.exception(f"Chat '{chat.id}' failed to answer")
+            chunks.put(FanOutChunk(chat_id=chat.id, error=e))
+        finally:
+            chunks.put(FanOutChunk(chat_id=chat.id, done=True))
+
+    async def __aanswer(self, chat: ChatModel, question, chunks: asyncio.Queue):
+        try:
+            async for text in chat.aanswer_question(question):
+                chunks.put_nowait(FanOutChunk(chat_id=chat.id, text=text))
+            await asyncio.to_thread(self.__save, chat)
+        except Exception as e:
+            logger.exception(f"Chat '{chat.id}' failed to answer")
+            chunks.put_nowait(FanOutChunk(chat_id=chat.id, error=e))
+        finally:
+            chunks.put_nowait(FanOutChunk(chat_id=chat.id, done=True))
+
+
+class ChatCache:
+    """Bounded LRU of live chats, so switching back to a recent chat needs no I/O.
+
+    Keeps at most `max_chats` chats, and fewer once their sizes, which include the
+    histories of their sessions, exceed `max_size` characters in total. The most
+    recently used chat is always kept. Removed chats are evicted from the caches of
+    all users of the process.
+    """
+
+    __instances: weakref.WeakSet[ChatCache] = weakref.WeakSet()
+    __instances_lock = threading.Lock()
+
+    def __init__(self, max_chats: int = 10, max_size: int = 1_000_000):
+        self.__max_chats = max_chats
+        self.__max_size = max_size
+        self.__chats: OrderedDict[str, ChatModel] = OrderedDict()
+        self.__lock = threading.Lock()
+        with ChatCache.__instances_lock:
+            ChatCache.__instances.add(self)
+
+    def __len__(self):
+        return len(self.__chats)
+
+    def __contains__(self, chat_id: str):
+        return chat_id in self.__chats
+
+    def get(self, chat_id: str) -> ChatModel | None:
+        with self.__lock:
+            chat = self.__chats.get(chat_id)
+            if chat:
+                self.__chats.move_to_end(chat_id)
+            return chat
+
+    def put(self, chat: ChatModel):
+        with self.__lock:
+            self.__chats[chat.id] = chat
+            self.__chats.move_to_end(chat.id)
+            self.__evict()
+
+    def remove(self, chat_id: str):
+        with self.__lock:
+            self.__chats.pop(chat_id, None)
+
+    @classmethod
+    def remove_everywhere(cls, chat_id: str):
+        with cls.__instances_lock:
+            instances = list(cls.__instances)
+        for instance in instances:
+            instance.remove(chat_id)
+
+    def __evict(self):
+        # sizes are measured on eviction, as chats grow while they are cached
+        sizes = {chat_id: chat.size for chat_id, chat in self.__chats.items()}
+        total_size = sum(sizes.values())
+        while len(self.__chats) > 1 and (
+            len(self.__chats) > self.__max_chats or total_size > self.__max_size
+        ):
+            chat_id, _ = self.__chats.popitem(last=False)
+            total_size -= sizes[chat_id]
+
+
+class AskThemAllModel:
+    @inject
+    def __init__(
+        self,
+        chat_repository: ChatRepository = Provide["chat_repository"],
+        chat_bot_registry: ChatBotRegistry = Provide["chat_bot_registry"],
+        interaction_repository: InteractionRepository = Provide[
+            "interaction_repository"
+        ],
+        chat_cache: ChatCache = None,
+    ):
+        self.__chat_repository = chat_repository
+        self.__chat_bot_registry = chat_bot_registry
+        self.__interaction_repository = interaction_repository
+        self.__chat_cache = chat_cache
 
     def __get_chat_bot_by_id(self, chat_bot_id: str) -> ChatBotModel:
-        for chat_bot_data in self.__chat_bot_repository.find_all():
-            if chat_bot_data.id == chat_bot_id:
-                return ChatBotModel.from_data(
-                    chat_bot_data, self.__get_chat_client_by_id(chat_bot_data.id)
-                )
+        return self.__chat_bot_registry.get(chat_bot_id)
 
     @property
     def chat_bots(self) -> List[ChatBotModel]:
-        chat_bots = []
-        for chat_bot_data in self.__chat_bot_repository.find_all():
-            matched_client = None
-            for chat_client in self.__chat_clients:
-                if chat_bot_data.id == chat_client.id:
-                    matched_client = chat_client
-            chat_bots.append(ChatBotModel.from_data(chat_bot_data, matched_client))
-        chat_bots.sort(key=lambda c: str(not c.enabled) + c.name, reverse=False)
-        return chat_bots
-
-    def filter_chats(self, search_filter: str, max_results: int = 100) -> ChatListModel:
+        return self.__chat_bot_registry.chat_bots
+
+    def filter_chats(
+        self, search_filter: str, max_results: int = 100, offset: int = 0
+    ) -> ChatListModel:
         chat_data_list_result = self.__chat_repository.search_chats(
-            search_filter, max_results
+            search_filter, max_results, offset
         )
         return ChatListModel(
             chats=list(
@@ -264,12 +802,31 @@ class AskThemAllModel:
                 )
             ),
             total_results=chat_data_list_result.total_results,
+            highlights=chat_data_list_result.highlights,
+            cursor=offset + len(chat_data_list_result.data),
+        )
+
+    def get_answer_stats(self) -> List[AnswerStats]:
+        return self.__interaction_repository.get_answer_stats()
+
+    def ask_them_all(self) -> FanOutModel:
+        return FanOutModel(
+            [chat_bot for chat_bot in self.chat_bots if chat_bot.enabled]
         )
 
     def switch_chat(self, chat_id) -> ChatModel:
+        chat = self.__chat_cache.get(chat_id) if self.__chat_cache else None
+        if chat:
+            return chat
         chat_data = self.__chat_repository.get_by_id(chat_id)
         chat = ChatModel.from_data(
             self.__get_chat_bot_by_id(chat_data.chat_bot_id), chat_data
         )
         chat.restore_chat()
+        if self.__chat_cache:
+            self.__chat_cache.put(chat)
         return chat
+
+    def remove_chat(self, chat: ChatModel):
+        chat.remove()
+        ChatCache.remove_everywhere(chat.id)
@@ -1,7 +1,7 @@
 from abc import abstractmethod, ABC
 from dataclasses import dataclass
 from datetime import datetime
-from typing import TypeVar, Generic, List
+from typing import TypeVar, Generic, List, Dict, Iterator
 
 
 @dataclass
@@ -15,10 +15,30 @@ class InteractionData(Data):
     answer: str
     asked_at: datetime
     chat_id: str
+    # the id of the client that answered, which differs from the chat bot's when hedged
+    answered_by: str = None
+    # whether the answer was replayed from the response cache instead of generated
+    cached: bool = None
+    # measured while streaming the answer, in seconds from asking the question
+    first_chunk_latency: float = None
+    duration: float = None
+    chunk_count: int = None
+    # as reported by the provider, if it did
+    input_tokens: int = None
+    output_tokens: int = None
+    # only when the provider reported the output tokens
+    tokens_per_second: float = None
+    # denormalized from the chat so chats can be searched with a single query
+    chat_bot_id: str = None
+    chat_slug: str = None
+    chat_title: str = None
+    chat_created_at: datetime = None
 
     def __post_init__(self):
         if isinstance(self.asked_at, str):
             self.asked_at = datetime.fromisoformat(self.asked_at)
+        if isinstance(self.chat_created_at, str):
+            self.chat_created_at = datetime.fromisoformat(self.chat_created_at)
 
 
 @dataclass
@@ -27,6 +47,9 @@ class ChatData(Data):
     title: str
     created_at: datetime
     chat_bot_id: str
+    # rolling summary of the interactions left out of the session history
+    summary: str = None
+    summary_interaction_count: int = None
 
     def __post_init__(self):
         if isinstance(self.created_at, str):
@@ -36,15 +59,36 @@ class ChatData(Data):
 @dataclass
 class ChatBotData(Data):
     name: str
+    client_type: str = None
+    model_name: str = None
+
+
+@dataclass(frozen=True)
+class AnswerStats:
+    """Percentiles of the time to first chunk and the throughput of a chat bot."""
+
+    chat_bot_id: str
+    answer_count: int
+    first_chunk_latency_p50: float | None
+    first_chunk_latency_p95: float | None
+    tokens_per_second_p50: float | None
 
 
 D = TypeVar("D", bound=Data)
 
 
 class DataListResult(Generic[D]):
-    def __init__(self, data: List[D], total_results):
+    def __init__(
+        self,
+        data: List[D],
+        total_results,
+        highlights: Dict[str, List[str]] = None,
+        cursor: list = None,
+    ):
         self.__data = data
         self.__total_results = total_results
+        self.__highlights = highlights or {}
+        self.__cursor = cursor
 
     @property
     def data(self) -> List[D]:
@@ -54,12 +98,26 @@ class DataListResult(Generic[D]):
     def total_results(self) -> int:
         return self.__total_results
 
+    @property
+    def highlights(self) -> Dict[str, List[str]]:
+        """Highlighted snippets of the matching text, keyed by data id."""
+        return self.__highlights
+
+    @property
+    def cursor(self) -> list | None:
+        """Opaque position after the last item, used to request the next page."""
+        return self.__cursor
+
 
 class Repository(ABC, Generic[D]):
     @abstractmethod
     def save(self, data: D):
         pass
 
+    @abstractmethod
+    def save_all(self, data_list: List[D]):
+        pass
+
     @abstractmethod
     def get_by_id(self, data_id) -> D:
         pass
@@ -68,22 +126,41 @@ class Repository(ABC, Generic[D]):
     def find_all(self) -> list[D]:
         pass
 
+    @abstractmethod
+    def iter_all(self, page_size: int = 100, source: List[str] = None) -> Iterator[D]:
+        """Streams all data, loading only the `source` fields if given.
+
+        The fields left out keep their defaults, so `source` must include the fields
+        that have none.
+        """
+        pass
+
     @abstractmethod
     def delete_by_id(self, data_id):
         pass
 
+    @abstractmethod
+    def flush(self):
+        pass
+
 
 class ChatRepository(Repository[ChatData], ABC):
     @abstractmethod
     def find_all_by_chat_bot_id(
-        self, chat_bot_id, max_results
+        self, chat_bot_id, max_results, search_after: list = None
     ) -> DataListResult[ChatData]:
+        """Finds the newest chats of a chat bot, after the cursor of a previous page."""
         pass
 
     @abstractmethod
     def search_chats(
-        self, search_filter: str, max_results=100
+        self, search_filter: str, max_results=100, offset=0
     ) -> DataListResult[ChatData]:
+        """Finds the chats matching the filter, paged by `offset`.
+
+        Implementations may bound how deep results can be paged and may count the
+        matching chats approximately, which they document.
+        """
         pass
 
 
@@ -98,10 +175,28 @@ class InteractionRepository(Repository[InteractionData], ABC):
     def find_all_by_chat_id(self, chat_id: str) -> list[InteractionData]:
         pass
 
+    @abstractmethod
+    def iter_all_by_chat_id(
+        self, chat_id: str, page_size: int = 100, newest_first=False
+    ) -> Iterator[InteractionData]:
+        """Streams the interactions of a chat, fetching a page at a time."""
+        pass
+
+    @abstractmethod
+    def find_page_by_chat_id(
+        self, chat_id: str, after: list = None, limit: int = 50, newest_first=False
+    ) -> DataListResult[InteractionData]:
+        pass
+
     @abstractmethod
     def delete_all_by_chat_id(self, chat_id):
         pass
 
+    @abstractmethod
+    def get_answer_stats(self) -> List[AnswerStats]:
+        """Aggregates the measured answers per chat bot that actually answered them."""
+        pass
+
 
 class DatabaseMigration(ABC):
     @abstractmethod
@@ -0,0 +1,315 @@
+import asyncio
+import contextlib
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Iterator,
+    Generator,
+    TypeVar,
+    AsyncIterator,
+    Set,
+    Tuple,
+)
+
+from askthemall.core.client import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# the number of requests between two log lines with the scheduler stats
+STATS_LOG_INTERVAL = 100
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether an error, or one of its causes, reports that a rate limit was hit."""
+    while error is not None:
+        status_code = getattr(error, "status_code", None) or getattr(
+            getattr(error, "response", None), "status_code", None
+        )
+        if status_code == 429 or type(error).__name__ in (
+            "RateLimitError",
+            "ResourceExhausted",
+            "TooManyRequests",
+        ):
+            return True
+        error = error.__cause__
+    return False
+
+
+class TokenBucket:
+    """Allows `per_minute` units per minute, in bursts of at most `per_minute` units.
+
+    Not thread-safe, the scheduler guards its buckets.
+    """
+
+    def __init__(self, per_minute: int):
+        self.__capacity = float(per_minute)
+        self.__rate = per_minute / 60
+        self.__available = self.__capacity
+        self.__updated_at = time.monotonic()
+
+    def delay(self, amount: float) -> float:
+        """Returns the number of seconds until `amount` units are available."""
+        self.__refill()
+        missing = min(amount, self.__capacity) - self.__available
+        return max(missing, 0) / self.__rate
+
+    def take(self, amount: float):
+        """Takes units, possibly more than are available, delaying later requests."""
+        self.__refill()
+        self.__available -= amount
+
+    def __refill(self):
+        now = time.monotonic()
+        self.__available = min(
+            self.__capacity, self.__available + (now - self.__updated_at) * self.__rate
+        )
+        self.__updated_at = now
+
+
+@dataclass(frozen=True)
+class SchedulerStats:
+    queue_depth: int
+    requests: int
+    retries: int
+    total_wait: float
+    max_wait: float
+
+    @property
+    def average_wait(self) -> float:
+        return self.total_wait / self.requests if self.requests else 0.0
+
+
+class RequestScheduler:
+    """Schedules the requests of all clients of a provider within its rate limits.
+
+    Waiting requests are served round-robin across sessions, so a session sending many
+    requests cannot starve the others. Requests that are rate limited by the provider
+    before the first chunk arrives are retried with a jittered exponential backoff.
+    The stats are logged every `STATS_LOG_INTERVAL` requests.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int = None,
+        tokens_per_minute: int = None,
+        max_retries: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 30.0,
+    ):
+        self.__name = name
+        self.__requests = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.__tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.__max_retries = max_retries
+        self.__backoff = backoff
+        self.__max_backoff = max_backoff
+        self.__condition = threading.Condition()
+        self.__queues: OrderedDict[str, deque] = OrderedDict()
+        self.__async_waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = (
+            set()
+        )
+        self.__request_count = 0
+        self.__retry_count = 0
+        self.__total_wait = 0.0
+        self.__max_wait = 0.0
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def stats(self) -> SchedulerStats:
+        with self.__condition:
+            return SchedulerStats(
+                queue_depth=sum(len(queue) for queue in self.__queues.values()),
+                requests=self.__request_count,
+                retries=self.__retry_count,
+                total_wait=self.__total_wait,
+                max_wait=self.__max_wait,
+            )
+
+    def acquire(self, session_id: str, tokens: int = 0):
+        """Blocks until it is the session's turn and the limits allow the request."""
+        ticket = object()
+        started_at = time.monotonic()
+        with self.__condition:
+            self.__queues.setdefault(session_id, deque()).append(ticket)
+            try:
+                while (delay := self.__take_turn(ticket, tokens)) != 0:
+                    self.__condition.wait(delay)
+            finally:
+                self.__dequeue(session_id, ticket)
+        self.__record_wait(started_at)
+
+    async def aacquire(self, session_id: str, tokens: int = 0):
+        """Async variant of `acquire`, waiting on the event loop instead of a thread."""
+        ticket = object()
+        started_at = time.monotonic()
+        wakeup = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), wakeup)
+        with self.__condition:
+            self.__queues.setdefault(session_id, deque()).append(ticket)
+            self.__async_waiters.add(waiter)
+        try:
+            while True:
+                with self.__condition:
+                    delay = self.__take_turn(ticket, tokens)
+                    if delay == 0:
+                        break
+                    # cleared under the lock, so a wakeup sent after the check is kept
+                    wakeup.clear()
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(wakeup.wait(), delay)
+        finally:
+            with self.__condition:
+                self.__async_waiters.discard(waiter)
+                self.__dequeue(session_id, ticket)
+        self.__record_wait(started_at)
+
+    def charge(self, tokens: int):
+        """Accounts for tokens that were only known after the request, e.g. the answer."""
+        if self.__tokens:
+            with self.__condition:
+                self.__tokens.take(tokens)
+
+    def call(self, session_id: str, tokens: int, request: Callable[[], T]) -> T:
+        for attempt in range(self.__max_retries + 1):
+            self.acquire(session_id, tokens)
+            try:
+                result = request()
+            except Exception as e:
+                self.__retry_or_raise(e, attempt)
+                time.sleep(self.__backoff_delay(attempt))
+                continue
+            if isinstance(result, str):
+                self.charge(estimate_tokens(result))
+            return result
+
+    async def acall(self, session_id: str, tokens: int, request: Callable) -> T:
+        for attempt in range(self.__max_retries + 1):
+            await self.aacquire(session_id, tokens)
+            try:
+                result = await request()
+            except Exception as e:
+                self.__retry_or_raise(e, attempt)
+                await asyncio.sleep(self.__backoff_delay(attempt))
+                continue
+            if isinstance(result, str):
+                self.charge(estimate_tokens(result))
+            return result
+
+    def stream(
+        self, session_id: str, tokens: int, request: Callable[[], Iterator[str]]
+    ) -> Generator[str, None, None]:
+        """Streams the chunks of a request once the limits allow.
+
+        A request is only retried if it fails before its first chunk was streamed.
+        """
+        for attempt in range(self.__max_retries + 1):
+            self.acquire(session_id, tokens)
+            answer_chunks = []
+            try:
+                for chunk in request():
+                    answer_chunks.append(chunk)
+                    yield chunk
+            except Exception as e:
+                if answer_chunks:
+                    raise
+                self.__retry_or_raise(e, attempt)
+                time.sleep(self.__backoff_delay(attempt))
+                continue
+            self.charge(estimate_tokens("".join(answer_chunks)))
+            return
+
+    async def astream(
+        self, session_id: str, tokens: int, request: Callable[[], AsyncIterator[str]]
+    ):
+        """Async variant of `stream`."""
+        for attempt in range(self.__max_retries + 1):
+            await self.aacquire(session_id, tokens)
+            answer_chunks = []
+            try:
+                async for chunk in request():
+                    answer_chunks.append(chunk)
+                    yield chunk
+            except Exception as e:
+                if answer_chunks:
+                    raise
+                self.__retry_or_raise(e, attempt)
+                await asyncio.sleep(self.__backoff_delay(attempt))
+                continue
+            self.charge(estimate_tokens("".join(answer_chunks)))
+            return
+
+    def __retry_or_raise(self, error: Exception, attempt: int):
+        if attempt >= self.__max_retries or not is_rate_limited(error):
+            raise error
+        with self.__condition:
+            self.__retry_count += 1
+        logger.warning(
+            f"Request to '{self.__name}' was rate limited, "
+            f"retry {attempt + 1} of {self.__max_retries}"
+        )
+
+    def __backoff_delay(self, attempt: int) -> float:
+        # full jitter spreads the retries of concurrent sessions
+        return random.uniform(0, min(self.__max_backoff, self.__backoff * 2**attempt))
+
+    def __take_turn(self, ticket, tokens: int) -> float | None:
+        """Takes the units of the request if it is its turn and the limits allow it.
+
+        Returns 0 once they were taken, the number of seconds until the limits allow
+        the request, or None when it is another request's turn.
+        """
+        if next(iter(self.__queues.values()))[0] is not ticket:
+            return None
+        delay = self.__delay(tokens)
+        if delay > 0:
+            return delay
+        if self.__requests:
+            self.__requests.take(1)
+        if self.__tokens:
+            self.__tokens.take(tokens)
+        return 0
+
+    def __record_wait(self, started_at: float):
+        waited = time.monotonic() - started_at
+        with self.__condition:
+            self.__request_count += 1
+            self.__total_wait += waited
+            self.__max_wait = max(self.__max_wait, waited)
+        if waited > 1:
+            logger.info(f"Request to '{self.__name}' waited {waited:.1f}s for its turn")
+        stats = self.stats
+        if stats.requests % STATS_LOG_INTERVAL == 0:
+            logger.info(
+                f"Scheduler '{self.__name}': {stats.requests} requests, "
+                f"{stats.retries} retries, {stats.queue_depth} waiting, "
+                f"{stats.average_wait:.2f}s average and {stats.max_wait:.2f}s "
+                f"maximum wait"
+            )
+
+    def __delay(self, tokens: int) -> float:
+        return max(
+            self.__requests.delay(1) if self.__requests else 0,
+            self.__tokens.delay(tokens) if self.__tokens else 0,
+        )
+
+    def __dequeue(self, session_id: str, ticket):
+        # the session moves to the back of the line, behind the other sessions
+        queue = self.__queues.pop(session_id)
+        queue.remove(ticket)
+        if queue:
+            self.__queues[session_id] = queue
+        self.__condition.notify_all()
+        for loop, wakeup in self.__async_waiters:
+            loop.call_soon_threadsafe(wakeup.set)
@@ -0,0 +1,57 @@
+import time
+from typing import Iterable, Generator
+
+
+class ChunkCoalescer:
+    """Batches the small chunks of a stream, to reduce the number of updates downstream.
+
+    The first chunk passes right away, so the time to first chunk is unchanged. Later
+    chunks are held until `window` seconds passed since the last batch or `max_size`
+    bytes are held. Chunks are pulled from the stream, so held chunks pass when the
+    next chunk arrives or the stream is flushed at its end.
+    """
+
+    def __init__(self, window: float = 0.05, max_size: int = 256):
+        self.__window = window
+        self.__max_size = max_size
+        self.__held: list[str] = []
+        self.__held_size = 0
+        self.__passed_at: float | None = None
+
+    def add(self, chunk: str) -> str | None:
+        """Returns the batch to pass on, if any."""
+        if not chunk:
+            return None
+        self.__held.append(chunk)
+        self.__held_size += len(chunk.encode())
+        if (
+            self.__passed_at is None
+            or self.__held_size >= self.__max_size
+            or time.monotonic() - self.__passed_at >= self.__window
+        ):
+            return self.flush()
+        return None
+
+    def flush(self) -> str | None:
+        """Returns the held chunks as a batch, if there are any."""
+        if not self.__held:
+            return None
+        batch = "".join(self.__held)
+        self.__held = []
+        self.__held_size = 0
+        self.__passed_at = time.monotonic()
+        return batch
+
+
+def coalesce(
+    chunks: Iterable[str], window: float = 0.05, max_size: int = 256
+) -> Generator[str, None, None]:
+    """Streams the chunks batched by a `ChunkCoalescer`."""
+    coalescer = ChunkCoalescer(window, max_size)
+    for chunk in chunks:
+        batch = coalescer.add(chunk)
+        if batch:
+            yield batch
+    batch = coalescer.flush()
+    if batch:
+        yield batch
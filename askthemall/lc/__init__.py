@@ -1,36 +1,85 @@
-from typing import List
+import asyncio
+import importlib
+import logging
+import threading
+import uuid
+from dataclasses import dataclass
+from itertools import chain, islice
+from typing import Iterable, List, Iterator, AsyncIterator, Callable, Awaitable
 
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.chat_history import InMemoryChatMessageHistory
 
+from langchain_core.callbacks import BaseCallbackHandler
 from langchain_core.language_models import BaseChatModel
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
-from langchain_mistralai import ChatMistralAI
+from langchain_core.messages import SystemMessage
+from langchain_core.outputs import LLMResult
 
+from askthemall.core.cache import ResponseCache, cache_key, replay
 from askthemall.core.client import (
     ChatSession,
     ChatClient,
     SUGGEST_TITLE_QUESTION,
+    SUMMARIZE_HISTORY_QUESTION,
     ChatInteraction,
+    ChatSummary,
+    HistoryPolicy,
+    TokenUsage,
+    estimate_tokens,
 )
+from askthemall.core.scheduler import RequestScheduler
+
+logger = logging.getLogger(__name__)
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """Keeps the token usage the provider reported with the last answer."""
+
+    def __init__(self):
+        self.usage: TokenUsage | None = None
+
+    def on_llm_end(self, response: LLMResult, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage_metadata = getattr(message, "usage_metadata", None)
+                if usage_metadata:
+                    self.usage = TokenUsage(
+                        input_tokens=usage_metadata["input_tokens"],
+                        output_tokens=usage_metadata["output_tokens"],
+                    )
 
 
 class LangChainSession(ChatSession):
-    def __init__(self, llm: BaseChatModel, history: List[ChatInteraction] = None):
+    def __init__(
+        self,
+        llm: BaseChatModel,
+        history: Iterable[ChatInteraction] = None,
+        history_count: int = None,
+        policy: HistoryPolicy = None,
+        summary: ChatSummary = None,
+        cache: ResponseCache = None,
+        cache_scope: str = "",
+        scheduler: RequestScheduler = None,
+        client_id: str = None,
+    ):
         self.__llm = llm
+        self.__client_id = client_id
+        self.__scheduler = scheduler
+        # identifies the session in the scheduler's fair queue
+        self.__scheduling_id = uuid.uuid4().hex
+        self.__cache = cache
+        self.__cache_scope = cache_scope
+        self.__usage_handler: UsageCallbackHandler | None = None
+        self.__answered_from_cache = False
+        self.__policy = policy or HistoryPolicy()
         self.__memory = InMemoryChatMessageHistory()
         self.__session_id = (
             "main_chat_session"  # A consistent ID for this session instance
         )
 
-        if history:
-            for interaction in history:
-                self.__memory.add_user_message(interaction.question)
-                self.__memory.add_ai_message(interaction.answer)
-
         # Define the prompt template
         prompt = ChatPromptTemplate.from_messages(
             [
@@ -53,33 +102,269 @@ class LangChainSession(ChatSession):
             history_messages_key="history",
         )
 
+        # Titles are suggested from the initial question alone, outside the history
+        title_prompt = ChatPromptTemplate.from_messages(
+            [("human", " ".join(SUGGEST_TITLE_QUESTION) + "\n\n{question}")]
+        )
+        self.__title_chain = title_prompt | self.__llm | StrOutputParser()
+
+        summary_prompt = ChatPromptTemplate.from_messages(
+            [("human", " ".join(SUMMARIZE_HISTORY_QUESTION) + "\n\n{conversation}")]
+        )
+        self.__summary_chain = summary_prompt | self.__llm | StrOutputParser()
+
+        self.__summary = self.__restore(iter(history or []), history_count, summary)
+
+    @property
+    def summary(self) -> ChatSummary | None:
+        return self.__summary
+
+    @property
+    def answered_by(self) -> str | None:
+        return self.__client_id
+
+    @property
+    def usage(self) -> TokenUsage | None:
+        return self.__usage_handler.usage if self.__usage_handler else None
+
+    @property
+    def answered_from_cache(self) -> bool:
+        return self.__answered_from_cache
+
+    @property
+    def history_size(self) -> int:
+        return sum(len(str(message.content)) for message in self.__memory.messages)
+
+    def __restore(
+        self,
+        latest: Iterator[ChatInteraction],
+        interaction_count: int | None,
+        summary: ChatSummary | None,
+    ) -> ChatSummary | None:
+        """Restores the history from the latest interactions, read newest first.
+
+        Only the window and the left out interactions that the summary does not cover
+        yet are read, so restoring does not depend on the length of the chat.
+        """
+        window = []
+        tokens = 0
+        overflow = []
+        for interaction in latest:
+            tokens += estimate_tokens(interaction.question)
+            tokens += estimate_tokens(interaction.answer)
+            if not self.__policy.fits(len(window) + 1, tokens):
+                overflow.append(interaction)
+                break
+            window.append(interaction)
+        earlier = chain(overflow, latest)
+        if interaction_count is None:
+            earlier = list(earlier)
+            interaction_count = len(window) + len(earlier)
+
+        left_out = interaction_count - len(window)
+        if self.__policy.summarize and left_out:
+            covered = summary.interaction_count if summary else 0
+            if covered > left_out:
+                # the policy changed since the summary was made, which the window then
+                # follows, as the summarized interactions are not read again
+                window = window[: max(interaction_count - covered, 0)]
+            elif covered < left_out:
+                try:
+                    summary = self.__summarize(
+                        summary, list(islice(earlier, left_out - covered))[::-1]
+                    )
+                except Exception:
+                    # the chat opens with the history truncated, and the summary is
+                    # extended the next time the chat is restored
+                    logger.exception("Failed to summarize the history, truncating it")
+        else:
+            summary = None
+
+        if summary:
+            self.__memory.add_message(
+                SystemMessage(f"Summary of the earlier conversation: {summary.text}")
+            )
+        for interaction in reversed(window):
+            self.__memory.add_user_message(interaction.question)
+            self.__memory.add_ai_message(interaction.answer)
+        return summary
+
+    def __summarize(
+        self, summary: ChatSummary | None, interactions: List[ChatInteraction]
+    ) -> ChatSummary:
+        conversation = "\n\n".join(
+            f"User: {interaction.question}\n\nAssistant: {interaction.answer}"
+            for interaction in interactions
+        )
+        if summary:
+            conversation = f"Earlier summary: {summary.text}\n\n{conversation}"
+        text = self.__call(
+            lambda: self.__summary_chain.invoke({"conversation": conversation}),
+            estimate_tokens(conversation),
+        )
+        return ChatSummary(
+            text=text.strip(),
+            interaction_count=len(interactions)
+            + (summary.interaction_count if summary else 0),
+        )
+
+    def __trim(self):
+        # interactions that leave the window during a live session are dropped; they
+        # are summarized when the chat is restored, which keeps summaries off the
+        # critical path of a question
+        messages = self.__memory.messages
+        offset = 1 if self.__summary else 0
+        interactions = [
+            ChatInteraction(question=question.content, answer=answer.content)
+            for question, answer in zip(messages[offset::2], messages[offset + 1 :: 2])
+        ]
+        left_out = len(interactions) - self.__policy.window(interactions)
+        if left_out:
+            del messages[offset : offset + 2 * left_out]
+
     def ask(self, question: str):
-        return self.__chain_with_history.stream(
-            {"input": question},
-            config={"configurable": {"session_id": self.__session_id}},
+        self.__usage_handler = None
+        self.__trim()
+        key = self.__cache_key(question)
+        cached_answer = self.__cache.get(key) if key else None
+        self.__answered_from_cache = cached_answer is not None
+        if cached_answer is not None:
+            self.add_interaction(ChatInteraction(question, cached_answer))
+            return replay(cached_answer)
+        chunks = self.__stream(question)
+        return self.__cache_answer(key, chunks) if key else chunks
+
+    async def aask(self, question: str):
+        self.__usage_handler = None
+        self.__trim()
+        key = self.__cache_key(question)
+        cached_answer = await asyncio.to_thread(self.__cache.get, key) if key else None
+        self.__answered_from_cache = cached_answer is not None
+        if cached_answer is not None:
+            self.add_interaction(ChatInteraction(question, cached_answer))
+            for chunk in replay(cached_answer):
+                yield chunk
+            return
+        answer_chunks = []
+        async for chunk in self.__astream(question):
+            answer_chunks.append(chunk)
+            yield chunk
+        if key:
+            await asyncio.to_thread(self.__cache.put, key, "".join(answer_chunks))
+
+    def __stream(self, question: str) -> Iterator[str]:
+        usage_handler = self.__usage_handler = UsageCallbackHandler()
+
+        def request():
+            return self.__chain_with_history.stream(
+                {"input": question},
+                config={
+                    "configurable": {"session_id": self.__session_id},
+                    "callbacks": [usage_handler],
+                },
+            )
+
+        if not self.__scheduler:
+            return request()
+        return self.__scheduler.stream(
+            self.__scheduling_id, self.__estimate_prompt_tokens(question), request
+        )
+
+    def __astream(self, question: str) -> AsyncIterator[str]:
+        usage_handler = self.__usage_handler = UsageCallbackHandler()
+
+        def request():
+            return self.__chain_with_history.astream(
+                {"input": question},
+                config={
+                    "configurable": {"session_id": self.__session_id},
+                    "callbacks": [usage_handler],
+                },
+            )
+
+        if not self.__scheduler:
+            return request()
+        return self.__scheduler.astream(
+            self.__scheduling_id, self.__estimate_prompt_tokens(question), request
+        )
+
+    def __call(self, request: Callable[[], str], tokens: int) -> str:
+        if not self.__scheduler:
+            return request()
+        return self.__scheduler.call(self.__scheduling_id, tokens, request)
+
+    async def __acall(self, request: Callable[[], Awaitable[str]], tokens: int) -> str:
+        if not self.__scheduler:
+            return await request()
+        return await self.__scheduler.acall(self.__scheduling_id, tokens, request)
+
+    def __estimate_prompt_tokens(self, question: str) -> int:
+        return estimate_tokens(question) + sum(
+            estimate_tokens(str(message.content)) for message in self.__memory.messages
         )
 
-    def suggest_title(self) -> str:
-        answer = self.__chain_with_history.invoke(
-            {"input": " ".join(SUGGEST_TITLE_QUESTION)},
-            config={"configurable": {"session_id": self.__session_id}},
+    def __cache_key(self, question: str) -> str | None:
+        if not self.__cache:
+            return None
+        return cache_key(
+            self.__cache_scope,
+            (str(message.content) for message in self.__memory.messages),
+            question,
         )
 
-        self.__memory.messages.pop()  # Pop AI's response (AIMessage)
-        self.__memory.messages.pop()  # Pop user's input (HumanMessage)
+    def __cache_answer(self, key: str, chunks: Iterator[str]):
+        # only complete answers are cached
+        answer_chunks = []
+        for chunk in chunks:
+            answer_chunks.append(chunk)
+            yield chunk
+        self.__cache.put(key, "".join(answer_chunks))
+
+    def add_interaction(self, interaction: ChatInteraction):
+        self.__memory.add_user_message(interaction.question)
+        self.__memory.add_ai_message(interaction.answer)
+
+    def suggest_title(self, question: str) -> str:
+        answer = self.__call(
+            lambda: self.__title_chain.invoke({"question": question}),
+            estimate_tokens(question),
+        )
+        return self.__clean_title(answer)
 
+    async def asuggest_title(self, question: str) -> str:
+        answer = await self.__acall(
+            lambda: self.__title_chain.ainvoke({"question": question}),
+            estimate_tokens(question),
+        )
+        return self.__clean_title(answer)
+
+    @staticmethod
+    def __clean_title(answer: str) -> str:
         return answer.rstrip().strip('"')
 
 
 class LangChainClient(ChatClient):
     def __init__(
-        self, llm_type: str, api_key: str, client_id: str, model_name: str, name: str
+        self,
+        llm_type: str,
+        api_key: str,
+        client_id: str,
+        model_name: str,
+        name: str,
+        history_policy: HistoryPolicy = None,
+        response_cache: ResponseCache = None,
+        scheduler: RequestScheduler = None,
     ):
         self.__api_key = api_key
+        self.__scheduler = scheduler
+        self.__response_cache = response_cache
+        self.__history_policy = history_policy or HistoryPolicy()
         self.__id = client_id
         self.__model_name = model_name
         self.__name = name
         self.__llm_type = llm_type
+        self.__llm: BaseChatModel | None = None
+        self.__llm_lock = threading.Lock()
 
     @property
     def id(self) -> str:
@@ -89,25 +374,84 @@ class LangChainClient(ChatClient):
     def name(self) -> str:
         return self.__name
 
+    @property
+    def client_type(self) -> str:
+        return self.__llm_type
+
+    @property
+    def model_name(self) -> str:
+        return self.__model_name
+
+    @property
+    def llm(self) -> BaseChatModel:
+        """The LLM shared by all sessions of this client.
+
+        It is created on first use and reused afterwards, so its HTTP connections are
+        kept alive across chats instead of being set up for every session.
+        """
+        if self.__llm is None:
+            with self.__llm_lock:
+                if self.__llm is None:
+                    self.__llm = create_llm(
+                        self.__llm_type, self.__model_name, self.__api_key
+                    )
+        return self.__llm
+
     def start_session(self) -> LangChainSession:
         return LangChainSession(
-            create_llm(self.__llm_type, self.__model_name, self.__api_key)
+            self.llm,
+            policy=self.__history_policy,
+            cache=self.__response_cache,
+            cache_scope=self.__cache_scope,
+            scheduler=self.__scheduler,
+            client_id=self.__id,
         )
 
     def restore_session(
-        self, interaction_data_list: List[ChatInteraction]
+        self,
+        interactions: Iterable[ChatInteraction],
+        summary: ChatSummary = None,
+        interaction_count: int = None,
     ) -> LangChainSession:
         return LangChainSession(
-            create_llm(self.__llm_type, self.__model_name, self.__api_key),
-            history=interaction_data_list,
+            self.llm,
+            history=interactions,
+            history_count=interaction_count,
+            policy=self.__history_policy,
+            summary=summary,
+            cache=self.__response_cache,
+            cache_scope=self.__cache_scope,
+            scheduler=self.__scheduler,
+            client_id=self.__id,
         )
 
+    @property
+    def __cache_scope(self) -> str:
+        return f"{self.__id}:{self.__model_name}"
+
+
+@dataclass(frozen=True)
+class LlmProvider:
+    module_name: str
+    class_name: str
+    api_key_argument: str
+
+
+# provider SDKs are heavy to import, so they are only loaded when a client needs them
+LLM_PROVIDERS = {
+    "mistral": LlmProvider("langchain_mistralai", "ChatMistralAI", "mistral_api_key"),
+    "google": LlmProvider(
+        "langchain_google_genai", "ChatGoogleGenerativeAI", "google_api_key"
+    ),
+    "groq": LlmProvider("langchain_groq", "ChatGroq", "groq_api_key"),
+}
+
 
-def create_llm(llm_type, model_name, api_key):
-    match llm_type:
-        case "mistral":
-            return ChatMistralAI(model=model_name, mistral_api_key=api_key)
-        case "google":
-            return ChatGoogleGenerativeAI(model=model_name, google_api_key=api_key)
-        case "groq":
-            return ChatGroq(model=model_name, groq_api_key=api_key)
+def create_llm(llm_type, model_name, api_key) -> BaseChatModel:
+    if llm_type not in LLM_PROVIDERS:
+        raise ValueError(f"Unsupported LLM type '{llm_type}'")
+    provider = LLM_PROVIDERS[llm_type]
+    llm_class = getattr(
+        importlib.import_module(provider.module_name), provider.class_name
+    )
+    return llm_class(model=model_name, **{provider.api_key_argument: api_key})
@@ -1,10 +1,12 @@
 import logging
+import threading
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Iterator
 
 from opensearchpy import OpenSearch
 
 from askthemall.core.persistence import (
+    AnswerStats,
     DatabaseMigration,
     ChatData,
     InteractionData,
@@ -15,14 +17,68 @@ from askthemall.core.persistence import (
     ChatRepository,
     D,
 )
+from askthemall.opensearch.bulk import OpenSearchBulkWriter
+from askthemall.opensearch.migration import OpenSearchIndexMigrator
 
 logger = logging.getLogger(__name__)
 
+PIT_KEEP_ALIVE = "1m"
+
+FIND_ALL_PAGE_SIZE = 100
+
+DENORMALIZE_CHATS_MIGRATION = "denormalize_chats"
+
+DENORMALIZE_CHATS_BATCH_SIZE = 100
+
+TEXT_ANALYSIS = {
+    "filter": {
+        "prefix_filter": {"type": "edge_ngram", "min_gram": 2, "max_gram": 20},
+    },
+    "analyzer": {
+        "text": {
+            "type": "custom",
+            "tokenizer": "standard",
+            "filter": ["lowercase", "asciifolding"],
+        },
+        "prefix": {
+            "type": "custom",
+            "tokenizer": "standard",
+            "filter": ["lowercase", "asciifolding", "prefix_filter"],
+        },
+    },
+}
+
+KEYWORD_FIELD = {
+    "type": "text",
+    "fields": {"keyword": {"type": "keyword", "ignore_above": 256}},
+}
+
+
+def text_field(index_options: str = None) -> dict:
+    """Analyzed text with a keyword subfield and an edge n-gram subfield for prefix search."""
+    field = {
+        "type": "text",
+        "analyzer": "text",
+        "fields": {
+            "keyword": {"type": "keyword", "ignore_above": 256},
+            "prefix": {
+                "type": "text",
+                "analyzer": "prefix",
+                "search_analyzer": "text",
+            },
+        },
+    }
+    if index_options:
+        field["index_options"] = index_options
+    return field
+
 
 class IndexNames:
     CHAT_BOTS = "chat_bots"
     CHATS = "chats"
     INTERACTIONS = "interactions"
+    MIGRATIONS = "migrations"
+    RESPONSES = "responses"
 
     def __init__(self, prefix):
         self.__prefix = prefix
@@ -39,11 +95,29 @@ class IndexNames:
     def interactions(self):
         return f"{self.__prefix}{self.INTERACTIONS}"
 
+    @property
+    def migrations(self):
+        return f"{self.__prefix}{self.MIGRATIONS}"
+
+    @property
+    def responses(self):
+        return f"{self.__prefix}{self.RESPONSES}"
+
 
 class OpenSearchRepository(Repository[D], ABC):
-    def __init__(self, client: OpenSearch, alias):
+    _schema_version = 1
+
+    def __init__(
+        self,
+        client: OpenSearch,
+        alias,
+        bulk_writer: OpenSearchBulkWriter = None,
+        index_migrator: OpenSearchIndexMigrator = None,
+    ):
         self._client = client
         self._alias = alias
+        self._bulk_writer = bulk_writer
+        self._index_migrator = index_migrator
 
     @abstractmethod
     def _to_data(self, hit):
@@ -53,7 +127,7 @@ class OpenSearchRepository(Repository[D], ABC):
         return {}
 
     def create_index_if_not_exists(self):
-        index_name = f"{self._alias}_v1"
+        index_name = f"{self._alias}_v{self._schema_version}"
         if not self._client.indices.exists(index=self._alias):
             self._client.indices.create(
                 index=index_name, body=self._get_index_creation_body()
@@ -63,7 +137,15 @@ class OpenSearchRepository(Repository[D], ABC):
         else:
             logger.info(f"Index '{index_name}' already exists")
 
+    def upgrade_index(self, index_migrator: OpenSearchIndexMigrator):
+        index_migrator.upgrade(
+            self._alias, self._schema_version, self._get_index_creation_body()
+        )
+
     def save(self, data: D):
+        if self._bulk_writer:
+            self._bulk_writer.index(self._alias, data.id, data.__dict__)
+            return
         self._client.index(
             index=self._alias,
             body=data.__dict__,
@@ -72,134 +154,455 @@ class OpenSearchRepository(Repository[D], ABC):
             op_type="index",
         )
 
+    def save_all(self, data_list: List[D]):
+        if self._bulk_writer:
+            for data in data_list:
+                self._bulk_writer.index(self._alias, data.id, data.__dict__)
+            return
+        if not data_list:
+            return
+        self._client.bulk(
+            body=[
+                line
+                for data in data_list
+                for line in [
+                    {"index": {"_index": self._alias, "_id": data.id}},
+                    data.__dict__,
+                ]
+            ],
+            refresh=True,
+        )
+
     def get_by_id(self, data_id) -> D:
         response = self._client.get(index=self._alias, id=data_id)
         return self._to_data(response["_source"])
 
     def find_all(self) -> List[D]:
+        # small indices fit in a single page, which needs no point in time
         response = self._client.search(
-            index=self._alias, body={"query": {"match_all": {}}, "size": 100}
+            index=self._alias,
+            body={
+                "query": {"match_all": {}},
+                "size": FIND_ALL_PAGE_SIZE,
+                "track_total_hits": FIND_ALL_PAGE_SIZE + 1,
+            },
         )
-        all_data = [self._to_data(hit["_source"]) for hit in response["hits"]["hits"]]
-        return all_data
+        hits = response["hits"]["hits"]
+        if response["hits"]["total"]["value"] <= len(hits):
+            return [self._to_data(hit["_source"]) for hit in hits]
+        return list(self.iter_all())
+
+    def iter_all(self, page_size: int = 100, source: List[str] = None) -> Iterator[D]:
+        for hit in self.iter_sources(page_size=page_size, source=source):
+            yield self._to_data(hit)
+
+    def iter_sources(
+        self, page_size: int = 100, source: List[str] = None, query: dict = None
+    ) -> Iterator[dict]:
+        """Streams the raw documents from a point in time of the index.
+
+        Pages are fetched with search_after, so the results are consistent even when
+        documents are written while iterating. `source` limits the returned fields.
+        """
+        pit_id = self._client.create_pit(index=self._alias, keep_alive=PIT_KEEP_ALIVE)[
+            "pit_id"
+        ]
+        try:
+            body = {
+                "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                "query": query or {"match_all": {}},
+                "sort": [{"id.keyword": {"order": "asc"}}],
+                "size": page_size,
+            }
+            if source is not None:
+                body["_source"] = source
+            while True:
+                response = self._client.search(body=body)
+                hits = response["hits"]["hits"]
+                for hit in hits:
+                    yield hit["_source"]
+                if len(hits) < page_size:
+                    return
+                body["pit"]["id"] = pit_id = response.get("pit_id", pit_id)
+                body["search_after"] = hits[-1]["sort"]
+        finally:
+            self._client.delete_pit(body={"pit_id": [pit_id]})
 
     def delete_by_id(self, data_id):
-        self._client.delete(index=self._alias, id=data_id, refresh=True)
+        if self._bulk_writer:
+            self._bulk_writer.delete(self._alias, data_id)
+        else:
+            self._client.delete(index=self._alias, id=data_id, refresh=True)
+        self._record_deletion({"ids": {"values": [data_id]}})
+
+    def flush(self) -> int:
+        if self._bulk_writer:
+            return self._bulk_writer.flush()
+        return 0
+
+    def _record_deletion(self, query: dict):
+        # a running index migration replays the deletion on the index it copies to
+        if self._index_migrator:
+            self._index_migrator.record_deletion(self._alias, query)
+
+    def _flush_and_refresh(self):
+        # pending writes must be searchable before queries can update or delete them
+        if self.flush():
+            self._client.indices.refresh(index=self._alias)
 
 
 class OpenSearchChatBotRepository(OpenSearchRepository[ChatBotData]):
-    def __init__(self, client: OpenSearch, index_names: IndexNames):
-        super().__init__(client, index_names.chat_bots)
+    def __init__(
+        self,
+        client: OpenSearch,
+        index_names: IndexNames,
+        index_migrator: OpenSearchIndexMigrator = None,
+    ):
+        super().__init__(client, index_names.chat_bots, index_migrator=index_migrator)
 
     def _to_data(self, hit):
         return ChatBotData(**hit)
 
 
 class OpenSearchChatRepository(OpenSearchRepository[ChatData], ChatRepository):
-    def __init__(self, client: OpenSearch, index_names: IndexNames):
-        super().__init__(client, index_names.chats)
+    _schema_version = 3
+
+    def __init__(
+        self,
+        client: OpenSearch,
+        index_names: IndexNames,
+        bulk_writer: OpenSearchBulkWriter = None,
+        index_migrator: OpenSearchIndexMigrator = None,
+    ):
+        super().__init__(client, index_names.chats, bulk_writer, index_migrator)
         self.__index_names = index_names
 
     def _to_data(self, hit):
         return ChatData(**hit)
 
     def _get_index_creation_body(self) -> dict:
-        return {"mappings": {"properties": {"created_at": {"type": "date"}}}}
+        return {
+            "settings": {"analysis": TEXT_ANALYSIS},
+            "mappings": {
+                "properties": {
+                    "id": KEYWORD_FIELD,
+                    "chat_bot_id": KEYWORD_FIELD,
+                    "slug": KEYWORD_FIELD,
+                    "title": text_field(),
+                    "created_at": {"type": "date"},
+                    "summary": {"type": "text", "index": False},
+                    "summary_interaction_count": {"type": "integer"},
+                }
+            },
+        }
 
     def find_all_by_chat_bot_id(
-        self, chat_bot_id, max_results
+        self, chat_bot_id, max_results, search_after: list = None
     ) -> DataListResult[ChatData]:
-        response = self._client.search(
-            index=self._alias,
-            body={
-                "query": {"term": {"chat_bot_id.keyword": chat_bot_id}},
-                "sort": [{"created_at": {"order": "desc"}}],
-                "size": max_results,
-            },
-        )
-        chats = [self._to_data(hit["_source"]) for hit in response["hits"]["hits"]]
+        body = {
+            "query": {"term": {"chat_bot_id.keyword": chat_bot_id}},
+            "sort": [
+                {"created_at": {"order": "desc"}},
+                {"id.keyword": {"order": "desc"}},
+            ],
+            "size": max_results,
+        }
+        if search_after:
+            body["search_after"] = search_after
+        response = self._client.search(index=self._alias, body=body)
+        hits = response["hits"]["hits"]
+        chats = [self._to_data(hit["_source"]) for hit in hits]
         total_results = response["hits"]["total"]["value"]
-        return DataListResult(data=chats, total_results=total_results)
+        return DataListResult(
+            data=chats,
+            total_results=total_results,
+            cursor=hits[-1]["sort"] if hits else search_after,
+        )
 
     def search_chats(
-        self, search_filter: str, max_results=100
+        self, search_filter: str, max_results=100, offset=0
     ) -> DataListResult[ChatData]:
-        # TODO: currently only 1000 distinct chats are supported, should use pagination using composite aggregation to support unlimited results
-        chat_ids_response = self._client.search(
+        """Finds the chats with matching titles or interactions, best matches first.
+
+        Interactions carry a copy of their chat's fields, so collapsing the matching
+        interactions on `chat_id` yields one hit per chat in a single round-trip. This
+        has two limits. Collapsed hits are paged with `from` and `size`, so paging
+        stops at `index.max_result_window` chats, 10,000 by default. `total_results` is
+        a cardinality count, exact up to 40,000 matching chats and approximate above.
+        """
+        response = self._client.search(
             index=self.__index_names.interactions,
             body={
                 "query": {
                     "bool": {
                         "should": [
-                            {"wildcard": {"question": search_filter}},
-                            {"wildcard": {"answer": search_filter}},
-                        ]
+                            {
+                                "multi_match": {
+                                    "query": search_filter,
+                                    "fields": ["chat_title^3", "question^2", "answer"],
+                                    "type": "best_fields",
+                                }
+                            },
+                            {
+                                "multi_match": {
+                                    "query": search_filter,
+                                    "fields": [
+                                        "chat_title.prefix^1.5",
+                                        "question.prefix",
+                                        "answer.prefix^0.5",
+                                    ],
+                                    "type": "best_fields",
+                                }
+                            },
+                        ],
+                        "minimum_should_match": 1,
                     }
                 },
-                "size": 0,
+                "collapse": {"field": "chat_id.keyword"},
+                "sort": [
+                    "_score",
+                    {"chat_created_at": {"order": "desc", "unmapped_type": "date"}},
+                ],
+                "highlight": {
+                    "pre_tags": ["**"],
+                    "post_tags": ["**"],
+                    "fragment_size": 120,
+                    "number_of_fragments": 1,
+                    "fields": {"question": {}, "answer": {}},
+                },
+                "from": offset,
+                "size": max_results,
                 "aggs": {
-                    "distinct_values": {
-                        "terms": {"field": "chat_id.keyword", "size": 1000}
+                    "total_chats": {
+                        "cardinality": {
+                            "field": "chat_id.keyword",
+                            "precision_threshold": 40000,
+                        }
                     }
                 },
-            },
-            _source=["chat_id"],
-        )
-        chat_ids = list(
-            set(
-                [
-                    bucket["key"]
-                    for bucket in chat_ids_response["aggregations"]["distinct_values"][
-                        "buckets"
-                    ]
-                ]
-            )
-        )
-        chats_response = self._client.search(
-            index=self.__index_names.chats,
-            body={
-                "query": {"terms": {"id.keyword": chat_ids}},
-                "sort": [{"created_at": {"order": "desc"}}],
-                "size": max_results,
+                "_source": [
+                    "chat_id",
+                    "chat_bot_id",
+                    "chat_slug",
+                    "chat_title",
+                    "chat_created_at",
+                ],
             },
         )
+        hits = response["hits"]["hits"]
         chats = [
-            self._to_data(hit["_source"]) for hit in chats_response["hits"]["hits"]
+            ChatData(
+                id=hit["_source"]["chat_id"],
+                chat_bot_id=hit["_source"].get("chat_bot_id"),
+                slug=hit["_source"].get("chat_slug"),
+                title=hit["_source"].get("chat_title"),
+                created_at=hit["_source"].get("chat_created_at"),
+            )
+            for hit in hits
         ]
-        total_results = chats_response["hits"]["total"]["value"]
-        return DataListResult(data=chats, total_results=total_results)
+        highlights = {
+            hit["_source"]["chat_id"]: [
+                fragment
+                for field in ["question", "answer"]
+                for fragment in hit.get("highlight", {}).get(field, [])
+            ]
+            for hit in hits
+        }
+        total_results = response["aggregations"]["total_chats"]["value"]
+        return DataListResult(
+            data=chats, total_results=total_results, highlights=highlights
+        )
 
 
 class OpenSearchInteractionRepository(
     OpenSearchRepository[InteractionData], InteractionRepository
 ):
+    _schema_version = 2
+
     def __init__(
         self,
         client: OpenSearch,
         index_names: IndexNames,
+        bulk_writer: OpenSearchBulkWriter = None,
+        index_migrator: OpenSearchIndexMigrator = None,
     ):
-        super().__init__(client, index_names.interactions)
+        super().__init__(client, index_names.interactions, bulk_writer, index_migrator)
 
     def _to_data(self, hit):
         return InteractionData(**hit)
 
     def _get_index_creation_body(self) -> dict:
-        return {"mappings": {"properties": {"asked_at": {"type": "date"}}}}
+        return {
+            "settings": {"analysis": TEXT_ANALYSIS},
+            "mappings": {
+                "properties": {
+                    "id": KEYWORD_FIELD,
+                    "chat_id": KEYWORD_FIELD,
+                    # offsets speed up highlighting of long questions and answers
+                    "question": text_field(index_options="offsets"),
+                    "answer": text_field(index_options="offsets"),
+                    "asked_at": {"type": "date"},
+                    # existing v2 indices map these dynamically, to the same mappings
+                    "answered_by": KEYWORD_FIELD,
+                    "cached": {"type": "boolean"},
+                    "first_chunk_latency": {"type": "float"},
+                    "duration": {"type": "float"},
+                    "chunk_count": {"type": "long"},
+                    "input_tokens": {"type": "long"},
+                    "output_tokens": {"type": "long"},
+                    "tokens_per_second": {"type": "float"},
+                    "chat_bot_id": KEYWORD_FIELD,
+                    "chat_slug": KEYWORD_FIELD,
+                    "chat_title": text_field(),
+                    "chat_created_at": {"type": "date"},
+                }
+            },
+        }
 
     def find_all_by_chat_id(self, chat_id: str) -> list[InteractionData]:
+        return list(self.iter_all_by_chat_id(chat_id))
+
+    def iter_all_by_chat_id(
+        self, chat_id: str, page_size: int = 100, newest_first=False
+    ) -> Iterator[InteractionData]:
+        after = None
+        while True:
+            page = self.find_page_by_chat_id(
+                chat_id, after=after, limit=page_size, newest_first=newest_first
+            )
+            yield from page.data
+            if len(page.data) < page_size:
+                return
+            after = page.cursor
+
+    def find_page_by_chat_id(
+        self, chat_id: str, after: list = None, limit: int = 50, newest_first=False
+    ) -> DataListResult[InteractionData]:
+        order = "desc" if newest_first else "asc"
+        body = {
+            "query": {"term": {"chat_id.keyword": chat_id}},
+            "sort": [{"asked_at": {"order": order}}, {"id.keyword": {"order": order}}],
+            "size": limit,
+            # the total counts the interactions left out of the history of a session
+            "track_total_hits": True,
+        }
+        if after:
+            body["search_after"] = after
+        response = self._client.search(index=self._alias, body=body)
+        hits = response["hits"]["hits"]
+        return DataListResult(
+            data=[self._to_data(hit["_source"]) for hit in hits],
+            total_results=response["hits"]["total"]["value"],
+            cursor=hits[-1]["sort"] if hits else after,
+        )
+
+    def delete_all_by_chat_id(self, chat_id):
+        self._flush_and_refresh()
+        query = {"term": {"chat_id.keyword": chat_id}}
+        self._client.delete_by_query(index=self._alias, body={"query": query})
+        self._record_deletion(query)
+
+    def add_chat_fields(self, chat_data_list: List[ChatData]):
+        """Copies the chat fields onto the interactions of the chats stored without them.
+
+        Updates the interactions of all chats with a single request, without a refresh.
+        """
+        self._client.update_by_query(
+            index=self._alias,
+            body={
+                "query": {
+                    "bool": {
+                        "filter": {
+                            "terms": {
+                                "chat_id.keyword": [
+                                    chat_data.id for chat_data in chat_data_list
+                                ]
+                            }
+                        },
+                        "must_not": {"exists": {"field": "chat_title"}},
+                    }
+                },
+                "script": {
+                    "lang": "painless",
+                    "source": "ctx._source.putAll(params.chats[ctx._source.chat_id])",
+                    "params": {
+                        "chats": {
+                            chat_data.id: self.__get_chat_fields(chat_data)
+                            for chat_data in chat_data_list
+                        }
+                    },
+                },
+            },
+            conflicts="proceed",
+        )
+
+    def get_answer_stats(self) -> List[AnswerStats]:
         response = self._client.search(
             index=self._alias,
             body={
-                "query": {"term": {"chat_id.keyword": chat_id}},
-                "sort": [{"asked_at": {"order": "asc"}}],
+                # replayed answers start right away and stream as fast as possible
+                "query": {
+                    "bool": {
+                        "filter": {"exists": {"field": "first_chunk_latency"}},
+                        "must_not": {"term": {"cached": True}},
+                    }
+                },
+                "size": 0,
+                "aggs": {
+                    "chat_bots": {
+                        "terms": {"field": "answered_by.keyword", "size": 100},
+                        "aggs": {
+                            "first_chunk_latency": {
+                                "percentiles": {
+                                    "field": "first_chunk_latency",
+                                    "percents": [50, 95],
+                                }
+                            },
+                            # earlier interactions stored estimated throughputs
+                            "reported_usage": {
+                                "filter": {"exists": {"field": "output_tokens"}},
+                                "aggs": {
+                                    "tokens_per_second": {
+                                        "percentiles": {
+                                            "field": "tokens_per_second",
+                                            "percents": [50],
+                                        }
+                                    }
+                                },
+                            },
+                        },
+                    }
+                },
             },
         )
-        return [self._to_data(hit["_source"]) for hit in response["hits"]["hits"]]
+        return [
+            AnswerStats(
+                chat_bot_id=bucket["key"],
+                answer_count=bucket["doc_count"],
+                first_chunk_latency_p50=bucket["first_chunk_latency"]["values"]["50.0"],
+                first_chunk_latency_p95=bucket["first_chunk_latency"]["values"]["95.0"],
+                tokens_per_second_p50=bucket["reported_usage"]["tokens_per_second"][
+                    "values"
+                ]["50.0"],
+            )
+            for bucket in response["aggregations"]["chat_bots"]["buckets"]
+        ]
 
-    def delete_all_by_chat_id(self, chat_id):
-        self._client.delete_by_query(
-            index=self._alias, body={"query": {"term": {"chat_id.keyword": chat_id}}}
+    def has_interactions_without_chat(self) -> bool:
+        response = self._client.count(
+            index=self._alias,
+            body={"query": {"bool": {"must_not": {"exists": {"field": "chat_title"}}}}},
         )
+        return response["count"] > 0
+
+    @staticmethod
+    def __get_chat_fields(chat_data: ChatData) -> dict:
+        return {
+            "chat_bot_id": chat_data.chat_bot_id,
+            "chat_slug": chat_data.slug,
+            "chat_title": chat_data.title,
+            "chat_created_at": chat_data.created_at,
+        }
 
 
 class OpenSearchDatabaseMigration(DatabaseMigration):
@@ -208,12 +611,62 @@ class OpenSearchDatabaseMigration(DatabaseMigration):
         chat_bot_repository: OpenSearchChatBotRepository,
         chat_repository: OpenSearchChatRepository,
         interaction_repository: OpenSearchInteractionRepository,
+        index_migrator: OpenSearchIndexMigrator,
+        background: bool = True,
     ):
         self.__chat_bot_repository = chat_bot_repository
         self.__chat_repository = chat_repository
         self.__interaction_repository = interaction_repository
+        self.__index_migrator = index_migrator
+        self.__background = background
+
+    @property
+    def __repositories(self) -> List[OpenSearchRepository]:
+        return [
+            self.__chat_bot_repository,
+            self.__chat_repository,
+            self.__interaction_repository,
+        ]
 
     def migrate(self):
-        self.__chat_bot_repository.create_index_if_not_exists()
-        self.__chat_repository.create_index_if_not_exists()
-        self.__interaction_repository.create_index_if_not_exists()
+        self.__index_migrator.create_migrations_index_if_not_exists()
+        for repository in self.__repositories:
+            repository.create_index_if_not_exists()
+        if self.__background:
+            # existing indices keep serving requests while they are being upgraded
+            threading.Thread(
+                target=self.__upgrade, name="opensearch-migration", daemon=True
+            ).start()
+        else:
+            self.__upgrade()
+
+    def __upgrade(self):
+        try:
+            for repository in self.__repositories:
+                repository.upgrade_index(self.__index_migrator)
+            self.__denormalize_chats()
+        except Exception:
+            if not self.__background:
+                raise
+            logger.exception("Database migration failed")
+
+    def __denormalize_chats(self):
+        """Copies the chat fields onto interactions that were stored without them.
+
+        Runs once: interactions of deleted chats keep matching the query afterwards.
+        """
+        if self.__index_migrator.is_applied(DENORMALIZE_CHATS_MIGRATION):
+            return
+        if self.__interaction_repository.has_interactions_without_chat():
+            logger.info("Copying chat fields onto existing interactions")
+            batch = []
+            for chat_data in self.__chat_repository.iter_all(
+                source=["id", "slug", "title", "created_at", "chat_bot_id"]
+            ):
+                batch.append(chat_data)
+                if len(batch) == DENORMALIZE_CHATS_BATCH_SIZE:
+                    self.__interaction_repository.add_chat_fields(batch)
+                    batch = []
+            if batch:
+                self.__interaction_repository.add_chat_fields(batch)
+        self.__index_migrator.record_applied(DENORMALIZE_CHATS_MIGRATION)
@@ -0,0 +1,217 @@
+import atexit
+import logging
+import threading
+import time
+from typing import List, Literal, Tuple
+
+from opensearchpy import OpenSearch, TransportError
+from opensearchpy.exceptions import ConnectionError as OpenSearchConnectionError
+
+logger = logging.getLogger(__name__)
+
+RefreshPolicy = Literal["false", "wait_for", "true"]
+
+Operation = Tuple[dict, dict | None]
+
+RETRYABLE_STATUSES = (429, 503)
+
+MAX_KEPT_ERRORS = 100
+
+
+class BulkWriteError(Exception):
+    """Raised by `raise_failures` when operations failed, even after retrying them."""
+
+    def __init__(self, failed: int, errors: List[dict]):
+        super().__init__(f"{failed} bulk operations failed, first error: {errors[0]}")
+        self.failed = failed
+        self.errors = errors
+
+
+class OpenSearchBulkWriter:
+    """Write-behind queue that sends index and delete operations as `_bulk` requests.
+
+    Operations are buffered and flushed by a background worker once `flush_size`
+    operations are pending or `flush_interval` seconds have passed since the first
+    pending operation, whichever comes first. Operations are sent in the order they
+    were enqueued.
+
+    Operations rejected with a 429 or 503 status or by an index write block, or sent
+    while OpenSearch could not be reached, are retried up to `max_retries` times with exponential backoff. The
+    operations that still fail are logged, counted in `failed` and raised by the next
+    `raise_failures`, so that flushing before a query is not failed by earlier writes.
+    """
+
+    def __init__(
+        self,
+        client: OpenSearch,
+        flush_size: int = 50,
+        flush_interval: float = 1.0,
+        refresh: RefreshPolicy = "false",
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+    ):
+        self.__client = client
+        self.__flush_size = flush_size
+        self.__flush_interval = flush_interval
+        self.__refresh = refresh
+        self.__max_retries = max_retries
+        self.__retry_backoff = retry_backoff
+        self.__operations: List[Operation] = []
+        self.__failed = 0
+        self.__errors: List[dict] = []
+        self.__unreported_failures = 0
+        self.__pending = threading.Condition()
+        self.__send_lock = threading.Lock()
+        self.__worker: threading.Thread | None = None
+        self.__closed = False
+
+    def index(self, index: str, doc_id: str, document: dict):
+        self.__enqueue({"index": {"_index": index, "_id": doc_id}}, dict(document))
+
+    def delete(self, index: str, doc_id: str):
+        self.__enqueue({"delete": {"_index": index, "_id": doc_id}}, None)
+
+    @property
+    def failed(self) -> int:
+        """The number of operations that failed since the writer was created."""
+        return self.__failed
+
+    def flush(self) -> int:
+        """Synchronously sends all pending operations and returns how many were sent."""
+        return self.__send_pending()
+
+    def raise_failures(self):
+        """Raises a `BulkWriteError` if operations failed since the previous call.
+
+        Includes the operations sent by the background worker.
+        """
+        with self.__send_lock:
+            failed, self.__unreported_failures = self.__unreported_failures, 0
+            errors, self.__errors = self.__errors, []
+        if failed:
+            raise BulkWriteError(failed, errors)
+
+    def close(self):
+        """Stops the background worker after sending all pending operations.
+
+        Raises a `BulkWriteError` if operations failed and were not reported yet.
+        """
+        with self.__pending:
+            self.__closed = True
+            self.__pending.notify_all()
+        if self.__worker and self.__worker is not threading.current_thread():
+            self.__worker.join()
+        self.flush()
+        self.raise_failures()
+
+    def __enqueue(self, action: dict, source: dict | None):
+        with self.__pending:
+            if self.__closed:
+                raise RuntimeError("Bulk writer is closed")
+            self.__operations.append((action, source))
+            self.__start_worker()
+            self.__pending.notify_all()
+
+    def __start_worker(self):
+        if self.__worker is None:
+            self.__worker = threading.Thread(
+                target=self.__run, name="opensearch-bulk-writer", daemon=True
+            )
+            self.__worker.start()
+            atexit.register(self.close)
+
+    def __run(self):
+        while True:
+            with self.__pending:
+                while not self.__operations and not self.__closed:
+                    self.__pending.wait()
+                if self.__closed:
+                    return
+                deadline = time.monotonic() + self.__flush_interval
+                while len(self.__operations) < self.__flush_size and not self.__closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.__pending.wait(remaining)
+            self.__send_pending()
+
+    def __send_pending(self) -> int:
+        with self.__send_lock:
+            with self.__pending:
+                operations, self.__operations = self.__operations, []
+            if operations:
+                self.__send(operations)
+        return len(operations)
+
+    def __send(self, operations: List[Operation]):
+        attempt = 0
+        while True:
+            retryable, errors = self.__try_send(operations)
+            if not retryable or attempt == self.__max_retries:
+                self.__record_failures(errors + [error for _, error in retryable])
+                return
+            self.__record_failures(errors)
+            attempt += 1
+            delay = self.__retry_backoff * 2 ** (attempt - 1)
+            logger.warning(
+                f"Retrying {len(retryable)} bulk operations in {delay:.1f} seconds"
+            )
+            time.sleep(delay)
+            operations = [operation for operation, _ in retryable]
+
+    def __try_send(
+        self, operations: List[Operation]
+    ) -> Tuple[List[Tuple[Operation, dict]], List[dict]]:
+        """Returns the operations to retry with their errors, and the other errors."""
+        body = []
+        for action, source in operations:
+            body.append(action)
+            if source is not None:
+                body.append(source)
+        try:
+            response = self.__client.bulk(body=body, refresh=self.__refresh)
+        except TransportError as e:
+            errors = [_error(operation, str(e)) for operation in operations]
+            if (
+                isinstance(e, OpenSearchConnectionError)
+                or e.status_code in RETRYABLE_STATUSES
+            ):
+                return list(zip(operations, errors)), []
+            logger.exception(f"Bulk request with {len(operations)} operations failed")
+            return [], errors
+        except Exception as e:
+            logger.exception(f"Bulk request with {len(operations)} operations failed")
+            return [], [_error(operation, str(e)) for operation in operations]
+        retryable, errors = [], []
+        if response.get("errors"):
+            for operation, item in zip(operations, response["items"]):
+                result = next(iter(item.values()))
+                if "error" not in result:
+                    continue
+                error = _error(operation, result["error"])
+                if result.get("status") in RETRYABLE_STATUSES or _is_blocked(result):
+                    retryable.append((operation, error))
+                else:
+                    errors.append(error)
+        return retryable, errors
+
+    def __record_failures(self, errors: List[dict]):
+        for error in errors:
+            logger.error(
+                f"Bulk {error['op_type']} of '{error['_id']}' failed: {error['error']}"
+            )
+        self.__failed += len(errors)
+        self.__unreported_failures += len(errors)
+        self.__errors = (self.__errors + errors)[:MAX_KEPT_ERRORS]
+
+
+def _is_blocked(result: dict) -> bool:
+    # indices are write blocked for a short time while they are migrated
+    error = result["error"]
+    return isinstance(error, dict) and error.get("type") == "cluster_block_exception"
+
+
+def _error(operation: Operation, error) -> dict:
+    action, _ = operation
+    op_type, metadata = next(iter(action.items()))
+    return {"op_type": op_type, "_id": metadata["_id"], "error": error}
@@ -0,0 +1,81 @@
+import logging
+import threading
+from datetime import datetime, timedelta, timezone
+
+from opensearchpy import OpenSearch, NotFoundError
+
+from askthemall.core.cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class OpenSearchResponseCache(ResponseCache):
+    """Persistent answer cache shared by all processes using the same index.
+
+    Expired answers are ignored on lookup and purged now and then on put, every
+    `purge_interval` puts.
+    """
+
+    def __init__(
+        self, client: OpenSearch, index: str, ttl: float = 86400, purge_interval=100
+    ):
+        self.__client = client
+        self.__index = index
+        self.__ttl = ttl
+        self.__purge_interval = purge_interval
+        self.__puts = 0
+        self.__index_created = False
+        self.__lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        self.__create_index_if_not_exists()
+        try:
+            document = self.__client.get(index=self.__index, id=key)["_source"]
+        except NotFoundError:
+            return None
+        if datetime.fromisoformat(document["expires_at"]) <= datetime.now(timezone.utc):
+            return None
+        return document["answer"]
+
+    def put(self, key: str, answer: str):
+        self.__create_index_if_not_exists()
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.__ttl)
+        self.__client.index(
+            index=self.__index,
+            id=key,
+            body={"answer": answer, "expires_at": expires_at.isoformat()},
+        )
+        with self.__lock:
+            self.__puts += 1
+            purge = self.__puts % self.__purge_interval == 0
+        if purge:
+            self.__purge_expired()
+
+    def __purge_expired(self):
+        self.__client.delete_by_query(
+            index=self.__index,
+            body={"query": {"range": {"expires_at": {"lte": "now"}}}},
+            conflicts="proceed",
+            wait_for_completion=False,
+        )
+
+    def __create_index_if_not_exists(self):
+        if self.__index_created:
+            return
+        with self.__lock:
+            if self.__index_created:
+                return
+            if not self.__client.indices.exists(index=self.__index):
+                self.__client.indices.create(
+                    index=self.__index,
+                    body={
+                        "mappings": {
+                            "properties": {
+                                "answer": {"type": "text", "index": False},
+                                "expires_at": {"type": "date"},
+                            }
+                        }
+                    },
+                )
+                logger.info(f"Index '{self.__index}' created")
+            self.__index_created = True
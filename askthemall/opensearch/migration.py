@@ -0,0 +1,459 @@
+import json
+import logging
+import re
+import time
+from datetime import datetime, timedelta, timezone
+from typing import List, Tuple
+
+from opensearchpy import OpenSearch, ConflictError, NotFoundError
+from opensearchpy.helpers import scan
+
+logger = logging.getLogger(__name__)
+
+VERSION_PATTERN = re.compile(r"_v(\d+)$")
+
+MIGRATIONS_MAPPING = {
+    "properties": {
+        "alias": {"type": "keyword"},
+        "version": {"type": "integer"},
+        "index": {"type": "keyword"},
+        "source_index": {"type": "keyword"},
+        "status": {"type": "keyword"},
+        "started_at": {"type": "date"},
+        "completed_at": {"type": "date"},
+        "lease_expires_at": {"type": "date"},
+        "deleted_at": {"type": "date"},
+        "query": {"type": "keyword", "index": False, "doc_values": False},
+    }
+}
+
+# catch-up passes run with writes allowed until one reads at most this many documents,
+# the documents written meanwhile are then caught up with while writes are blocked
+BLOCKED_CATCH_UP_SIZE = 1000
+MAX_CATCH_UP_PASSES = 5
+
+# deletions recorded shortly before a copy started are replayed too, as the clocks of
+# the processes differ and the bulk writer sends deletions after they were recorded
+DELETION_REPLAY_MARGIN = timedelta(minutes=1)
+
+WRITES_SETTLE_INTERVAL = 0.1
+
+
+class OpenSearchIndexMigrator:
+    """Moves an alias to a new versioned index without downtime.
+
+    The alias keeps pointing at the current index while its documents are copied to
+    `<alias>_v<version>` with a sliced, asynchronous reindex. The documents written in
+    the meantime are then caught up with, by their sequence numbers, and the deletions
+    recorded with `record_deletion` are replayed. Writes to the current index are only
+    blocked for the last, small catch-up, after which the alias is swapped atomically.
+
+    Applied versions are recorded in the migrations index, which also prevents two
+    processes from running the same migration. A running migration holds a lease of
+    `lease` seconds, renewed while copying, after which another process takes over.
+    """
+
+    def __init__(
+        self,
+        client: OpenSearch,
+        migrations_index: str,
+        reindex_slices: int | str = "auto",
+        poll_interval: float = 5.0,
+        lease: float = 300.0,
+    ):
+        self.__client = client
+        self.__migrations_index = migrations_index
+        self.__reindex_slices = reindex_slices
+        self.__poll_interval = poll_interval
+        self.__lease = lease
+
+    def create_migrations_index_if_not_exists(self):
+        if not self.__client.indices.exists(index=self.__migrations_index):
+            self.__client.indices.create(
+                index=self.__migrations_index, body={"mappings": MIGRATIONS_MAPPING}
+            )
+            logger.info(f"Migrations index '{self.__migrations_index}' created")
+        else:
+            # fields added since the index was created
+            self.__client.indices.put_mapping(
+                index=self.__migrations_index, body=MIGRATIONS_MAPPING
+            )
+
+    def get_current_index(self, alias: str) -> Tuple[str, int] | None:
+        """Returns the index behind the alias and its schema version."""
+        try:
+            response = self.__client.indices.get_alias(name=alias)
+        except NotFoundError:
+            return None
+        return max(
+            [(index_name, self.__get_version(index_name)) for index_name in response],
+            key=lambda index: index[1],
+        )
+
+    @staticmethod
+    def __get_version(index_name: str) -> int:
+        match = VERSION_PATTERN.search(index_name)
+        return int(match.group(1)) if match else 1
+
+    def get_applied_versions(self, alias: str) -> list[int]:
+        response = self.__client.search(
+            index=self.__migrations_index,
+            body={
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"term": {"alias": alias}},
+                            {"term": {"status": "applied"}},
+                        ]
+                    }
+                },
+                "sort": [{"version": {"order": "asc"}}],
+                "size": 1000,
+            },
+        )
+        return [hit["_source"]["version"] for hit in response["hits"]["hits"]]
+
+    def is_applied(self, migration_id: str) -> bool:
+        """Returns whether a data migration was recorded with `record_applied`."""
+        try:
+            response = self.__client.get(index=self.__migrations_index, id=migration_id)
+        except NotFoundError:
+            return False
+        return response["_source"].get("status") == "applied"
+
+    def record_applied(self, migration_id: str):
+        self.__client.index(
+            index=self.__migrations_index,
+            id=migration_id,
+            body={"status": "applied", "completed_at": datetime.now()},
+            refresh=True,
+        )
+
+    def record_deletion(self, alias: str, query: dict):
+        """Records that the documents matching the query were deleted through the alias.
+
+        A running migration replays the deletions on its new index, which spares it
+        from comparing the indices to find the deleted documents.
+        """
+        self.__client.index(
+            index=self.__migrations_index,
+            body={
+                "alias": alias,
+                "query": json.dumps(query),
+                "deleted_at": datetime.now(timezone.utc),
+            },
+        )
+
+    def upgrade(self, alias: str, version: int, body: dict):
+        current = self.get_current_index(alias)
+        if current is None:
+            raise ValueError(f"Alias '{alias}' does not exist")
+        source_index, current_version = current
+        if current_version >= version:
+            self.__record_current(alias, source_index, current_version)
+            self.__prune_deletions(alias)
+            return
+
+        target_index = f"{alias}_v{version}"
+        migration_id = f"{alias}_v{version}"
+        started_at = datetime.now(timezone.utc)
+        if not self.__claim(
+            migration_id,
+            {
+                "alias": alias,
+                "version": version,
+                "index": target_index,
+                "source_index": source_index,
+                "status": "running",
+                "started_at": started_at,
+            },
+        ):
+            return
+
+        try:
+            logger.info(
+                f"Migrating '{alias}' from '{source_index}' to '{target_index}'"
+            )
+            # a process that crashed while holding the lease may have left the block
+            self.__set_write_block(source_index, False)
+            if not self.__client.indices.exists(index=target_index):
+                self.__client.indices.create(index=target_index, body=body)
+            checkpoint = self.__checkpoint(source_index)
+            self.__reindex(source_index, target_index, migration_id)
+            deleted_since = started_at - DELETION_REPLAY_MARGIN
+            for _ in range(MAX_CATCH_UP_PASSES):
+                next_checkpoint = self.__checkpoint(source_index)
+                deleted_since = self.__replay_deletions(
+                    alias, target_index, deleted_since
+                )
+                read = self.__reindex(
+                    source_index, target_index, migration_id, after=checkpoint
+                )
+                checkpoint = next_checkpoint
+                if read <= BLOCKED_CATCH_UP_SIZE:
+                    break
+            # the last catch-up runs with writes blocked, so the new index matches the
+            # old one when the alias is swapped
+            self.__set_write_block(source_index, True)
+            try:
+                self.__wait_for_writes(source_index)
+                self.__replay_deletions(alias, target_index, deleted_since)
+                self.__reindex(
+                    source_index, target_index, migration_id, after=checkpoint
+                )
+                self.__client.indices.update_aliases(
+                    body={
+                        "actions": [
+                            {"remove": {"index": source_index, "alias": alias}},
+                            {"add": {"index": target_index, "alias": alias}},
+                        ]
+                    }
+                )
+            finally:
+                self.__set_write_block(source_index, False)
+        except Exception:
+            logger.exception(f"Migration of '{alias}' to version {version} failed")
+            self.__client.delete(
+                index=self.__migrations_index, id=migration_id, refresh=True
+            )
+            raise
+
+        self.__client.update(
+            index=self.__migrations_index,
+            id=migration_id,
+            body={"doc": {"status": "applied", "completed_at": datetime.now()}},
+            refresh=True,
+        )
+        logger.info(
+            f"Alias '{alias}' moved to '{target_index}', '{source_index}' can be removed"
+        )
+        self.__prune_deletions(alias)
+
+    def __claim(self, migration_id: str, record: dict) -> bool:
+        """Records the migration as running, unless another process holds its lease.
+
+        The lease is renewed while the migration runs, so the record of a process that
+        crashed is taken over once its lease expired.
+        """
+        record = {**record, "lease_expires_at": self.__lease_expiry()}
+        try:
+            self.__client.index(
+                index=self.__migrations_index,
+                id=migration_id,
+                body=record,
+                op_type="create",
+                refresh=True,
+            )
+            return True
+        except ConflictError:
+            pass
+
+        existing = self.__client.get(index=self.__migrations_index, id=migration_id)
+        lease_expires_at = existing["_source"].get("lease_expires_at")
+        if existing["_source"].get("status") != "running" or (
+            lease_expires_at
+            and datetime.fromisoformat(lease_expires_at) > datetime.now(timezone.utc)
+        ):
+            logger.info(f"Migration '{migration_id}' is already running")
+            return False
+        try:
+            self.__client.index(
+                index=self.__migrations_index,
+                id=migration_id,
+                body=record,
+                if_seq_no=existing["_seq_no"],
+                if_primary_term=existing["_primary_term"],
+                refresh=True,
+            )
+        except ConflictError:
+            logger.info(f"Migration '{migration_id}' was taken over by another process")
+            return False
+        logger.warning(f"Taking over migration '{migration_id}', its lease expired")
+        return True
+
+    def __renew_lease(self, migration_id: str):
+        self.__client.update(
+            index=self.__migrations_index,
+            id=migration_id,
+            body={"doc": {"lease_expires_at": self.__lease_expiry()}},
+        )
+
+    def __lease_expiry(self) -> datetime:
+        return datetime.now(timezone.utc) + timedelta(seconds=self.__lease)
+
+    def __set_write_block(self, index_name: str, blocked: bool):
+        self.__client.indices.put_settings(
+            index=index_name, body={"index.blocks.write": True if blocked else None}
+        )
+
+    def __primary_seq_nos(self, index_name: str) -> List[dict]:
+        stats = self.__client.indices.stats(index=index_name, level="shards")
+        return [
+            shard["seq_no"]
+            for shards in stats["indices"][index_name]["shards"].values()
+            for shard in shards
+            if shard["routing"]["primary"]
+        ]
+
+    def __checkpoint(self, index_name: str) -> int:
+        """Returns a sequence number below which a copy started next sees all writes.
+
+        Sequence numbers are counted by shard, so the lowest global checkpoint is used,
+        and the index is refreshed for the writes up to it to be searchable.
+        """
+        checkpoint = min(
+            seq_no["global_checkpoint"] for seq_no in self.__primary_seq_nos(index_name)
+        )
+        self.__client.indices.refresh(index=index_name)
+        return checkpoint
+
+    def __wait_for_writes(self, index_name: str):
+        """Waits until the writes sent before the block are replicated and searchable."""
+        while any(
+            seq_no["global_checkpoint"] < seq_no["max_seq_no"]
+            for seq_no in self.__primary_seq_nos(index_name)
+        ):
+            time.sleep(WRITES_SETTLE_INTERVAL)
+        self.__client.indices.refresh(index=index_name)
+
+    def __replay_deletions(
+        self, alias: str, target_index: str, since: datetime
+    ) -> datetime:
+        """Replays the deletions recorded since the given time on the target index.
+
+        Returns the time to replay the next deletions from.
+        """
+        replayed_at = datetime.now(timezone.utc)
+        self.__client.indices.refresh(index=self.__migrations_index)
+        replayed = 0
+        for hit in scan(
+            self.__client,
+            index=self.__migrations_index,
+            query={
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"term": {"alias": alias}},
+                            {"range": {"deleted_at": {"gte": since}}},
+                        ]
+                    }
+                }
+            },
+            size=1000,
+        ):
+            self.__client.delete_by_query(
+                index=target_index,
+                body={"query": json.loads(hit["_source"]["query"])},
+                conflicts="proceed",
+            )
+            replayed += 1
+        if replayed:
+            self.__client.indices.refresh(index=target_index)
+            logger.info(f"Replayed {replayed} deletions on '{target_index}'")
+        return replayed_at - DELETION_REPLAY_MARGIN
+
+    def __prune_deletions(self, alias: str):
+        """Removes the recorded deletions that no running migration needs to replay."""
+        response = self.__client.search(
+            index=self.__migrations_index,
+            body={
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"term": {"alias": alias}},
+                            {"term": {"status": "running"}},
+                        ]
+                    }
+                },
+                "aggs": {"started_at": {"min": {"field": "started_at"}}},
+                "size": 0,
+            },
+        )
+        oldest_started_at = response["aggregations"]["started_at"]["value"]
+        before = datetime.now(timezone.utc)
+        if oldest_started_at is not None:
+            before = min(
+                before, datetime.fromtimestamp(oldest_started_at / 1000, timezone.utc)
+            )
+        self.__client.delete_by_query(
+            index=self.__migrations_index,
+            body={
+                "query": {
+                    "bool": {
+                        "filter": [
+                            {"term": {"alias": alias}},
+                            {
+                                "range": {
+                                    "deleted_at": {
+                                        "lt": before - DELETION_REPLAY_MARGIN
+                                    }
+                                }
+                            },
+                        ]
+                    }
+                }
+            },
+            conflicts="proceed",
+        )
+
+    def __record_current(self, alias: str, index_name: str, version: int):
+        try:
+            self.__client.index(
+                index=self.__migrations_index,
+                id=f"{alias}_v{version}",
+                body={
+                    "alias": alias,
+                    "version": version,
+                    "index": index_name,
+                    "status": "applied",
+                    "completed_at": datetime.now(),
+                },
+                op_type="create",
+                refresh=True,
+            )
+        except ConflictError:
+            pass
+
+    def __reindex(
+        self,
+        source_index: str,
+        target_index: str,
+        migration_id: str,
+        after: int = None,
+    ) -> int:
+        """Copies the documents with their versions, and returns how many were read.
+
+        Documents already copied are only overwritten by newer versions. With `after`,
+        only the documents written after that sequence number are read.
+        """
+        source = {"index": source_index}
+        if after is not None:
+            source["query"] = {"range": {"_seq_no": {"gt": after}}}
+        response = self.__client.reindex(
+            body={
+                "source": source,
+                "dest": {"index": target_index, "version_type": "external"},
+                "conflicts": "proceed",
+            },
+            slices=self.__reindex_slices,
+            wait_for_completion=False,
+            refresh=True,
+        )
+        task_id = response["task"]
+        while True:
+            task = self.__client.tasks.get(task_id=task_id)
+            if task.get("completed"):
+                break
+            self.__renew_lease(migration_id)
+            time.sleep(self.__poll_interval)
+        if "error" in task:
+            raise RuntimeError(f"Reindex task '{task_id}' failed: {task['error']}")
+        failures = task.get("response", {}).get("failures", [])
+        if failures:
+            raise RuntimeError(f"Reindex task '{task_id}' failed: {failures}")
+        logger.info(
+            f"Copied {task['response'].get('created', 0)} new and "
+            f"{task['response'].get('updated', 0)} updated documents "
+            f"from '{source_index}' to '{target_index}'"
+        )
+        return task["response"].get("total", 0)
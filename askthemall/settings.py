@@ -9,40 +9,109 @@ from pydantic_settings import (
 )
 
 
+class BulkSettings(BaseModel):
+    enabled: bool = Field(True)
+    flush_size: int = Field(50)
+    flush_interval: float = Field(1.0)
+    refresh: Literal["false", "wait_for", "true"] = Field("false")
+    max_retries: int = Field(3)
+    retry_backoff: float = Field(0.5)
+
+
+class MigrationSettings(BaseModel):
+    background: bool = Field(True)
+    reindex_slices: int | Literal["auto"] = Field("auto")
+
+
 class OpenSearchSettings(BaseModel):
     host: str = Field("localhost")
     port: int = Field("9200")
     index_prefix: str = Field("askthemall_")
+    bulk: BulkSettings = Field(default_factory=BulkSettings)
+    migration: MigrationSettings = Field(default_factory=MigrationSettings)
 
 
-class GoogleSettings(BaseModel):
-    api_key: str
+class CacheSettings(BaseModel):
+    enabled: bool = Field(False)
+    max_size: int = Field(1000)
+    ttl: float = Field(3600)
+    persistent: bool = Field(False)
 
 
-class GroqSettings(BaseModel):
-    api_key: str
+class ChatCacheSettings(BaseModel):
+    max_chats: int = Field(10)
+    max_size: int = Field(1_000_000)
+
+
+class StreamingSettings(BaseModel):
+    coalesce_window: float = Field(0.05)
+    coalesce_size: int = Field(256)
 
 
-class MistralSettings(BaseModel):
+class ProviderSettings(BaseModel):
     api_key: str
+    requests_per_minute: int | None = Field(None)
+    tokens_per_minute: int | None = Field(None)
+    max_retries: int = Field(3)
+
+
+class GoogleSettings(ProviderSettings):
+    pass
+
+
+class GroqSettings(ProviderSettings):
+    pass
+
+
+class MistralSettings(ProviderSettings):
+    pass
+
+
+class SyntheticSettings(BaseModel):
+    first_token_delay: float = Field(0.5)
+    tokens_per_second: float = Field(50)
+    answer_tokens_mean: int = Field(200)
+    answer_tokens_stddev: int = Field(50)
+    error_rate: float = Field(0.0)
+    error_status_code: int = Field(503)
+    seed: int = Field(0)
 
 
 class ClientSettings(BaseModel):
-    type: Literal["google", "groq", "mistral"]
+    type: Literal["google", "groq", "mistral", "synthetic"]
     model_name: str
+    synthetic: SyntheticSettings = Field(default_factory=SyntheticSettings)
+
+
+class HistorySettings(BaseModel):
+    max_turns: int | None = Field(None)
+    max_tokens: int | None = Field(None)
+    summarize: bool = Field(False)
+
+
+class HedgingSettings(BaseModel):
+    fallback: str
+    percentile: float = Field(95)
+    min_samples: int = Field(20)
+    initial_delay: float = Field(5.0)
 
 
 class ChatBotSettings(BaseModel):
     name: str
     client: ClientSettings
+    history: HistorySettings = Field(default_factory=HistorySettings)
+    hedging: HedgingSettings | None = Field(None)
 
 
 class Settings(BaseSettings):
     app_name: str = "AskThemAll"
     opensearch: OpenSearchSettings
-    google: GoogleSettings
-    groq: GroqSettings
-    mistral: MistralSettings
+    cache: CacheSettings = Field(default_factory=CacheSettings)
+    chat_cache: ChatCacheSettings = Field(default_factory=ChatCacheSettings)
+    streaming: StreamingSettings = Field(default_factory=StreamingSettings)
+    google: GoogleSettings | None = None
+    groq: GroqSettings | None = None
+    mistral: MistralSettings | None = None
     chat_bots: Dict[str, ChatBotSettings]
 
     model_config = SettingsConfigDict(
@@ -0,0 +1,187 @@
+import asyncio
+import random
+import time
+from typing import Iterable, List, Generator, AsyncGenerator
+
+from askthemall.core.client import (
+    ChatClient,
+    ChatSession,
+    ChatInteraction,
+    ChatSummary,
+    TokenUsage,
+    estimate_tokens,
+)
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi aliquip ex ea commodo consequat"
+).split()
+
+
+class SyntheticError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"Synthetic error with status code {status_code}")
+        self.status_code = status_code
+
+
+class SyntheticAnswer:
+    """The planned timing and words of a synthetic answer, derived from its seed."""
+
+    def __init__(self, seed: str, client: "SyntheticChatClient"):
+        rng = random.Random(seed)
+        self.failed = rng.random() < client.error_rate
+        token_count = max(
+            round(rng.gauss(client.answer_tokens_mean, client.answer_tokens_stddev)), 1
+        )
+        self.tokens = [
+            rng.choice(WORDS) if i else rng.choice(WORDS).capitalize()
+            for i in range(token_count)
+        ]
+        self.token_delay = 1 / client.tokens_per_second
+
+
+class SyntheticChatSession(ChatSession):
+    def __init__(
+        self, client: "SyntheticChatClient", history: List[ChatInteraction] = None
+    ):
+        self.__client = client
+        self.__history = list(history or [])
+        self.__usage: TokenUsage | None = None
+
+    @property
+    def summary(self) -> ChatSummary | None:
+        return None
+
+    @property
+    def answered_by(self) -> str | None:
+        return self.__client.id
+
+    @property
+    def usage(self) -> TokenUsage | None:
+        return self.__usage
+
+    @property
+    def answered_from_cache(self) -> bool:
+        return False
+
+    @property
+    def history_size(self) -> int:
+        return sum(
+            len(interaction.question) + len(interaction.answer)
+            for interaction in self.__history
+        )
+
+    def add_interaction(self, interaction: ChatInteraction):
+        self.__history.append(interaction)
+
+    def ask(self, question) -> Generator[str, None, None]:
+        answer = self.__plan(question)
+        self.__usage = None
+        time.sleep(self.__client.first_token_delay)
+        if answer.failed:
+            raise SyntheticError(self.__client.error_status_code)
+        for i, token in enumerate(answer.tokens):
+            if i:
+                time.sleep(answer.token_delay)
+            yield token if i == 0 else f" {token}"
+        self.__answered(question, answer)
+
+    async def aask(self, question) -> AsyncGenerator[str, None]:
+        answer = self.__plan(question)
+        self.__usage = None
+        await asyncio.sleep(self.__client.first_token_delay)
+        if answer.failed:
+            raise SyntheticError(self.__client.error_status_code)
+        for i, token in enumerate(answer.tokens):
+            if i:
+                await asyncio.sleep(answer.token_delay)
+            yield token if i == 0 else f" {token}"
+        self.__answered(question, answer)
+
+    def __answered(self, question: str, answer: SyntheticAnswer):
+        self.__usage = TokenUsage(
+            input_tokens=sum(
+                estimate_tokens(interaction.question)
+                + estimate_tokens(interaction.answer)
+                for interaction in self.__history
+            )
+            + estimate_tokens(question),
+            output_tokens=len(answer.tokens),
+        )
+        self.add_interaction(ChatInteraction(question, " ".join(answer.tokens)))
+
+    def suggest_title(self, question: str) -> str:
+        return f"Synthetic chat {self.__seed(question)[:8]}"
+
+    async def asuggest_title(self, question: str) -> str:
+        return self.suggest_title(question)
+
+    def __plan(self, question: str) -> SyntheticAnswer:
+        return SyntheticAnswer(self.__seed(question), self.__client)
+
+    def __seed(self, question: str) -> str:
+        # the same question at the same point of a chat always gets the same answer
+        return f"{self.__client.seed}:{len(self.__history)}:{question}".encode().hex()
+
+
+class SyntheticChatClient(ChatClient):
+    """Streams reproducible synthetic answers, to exercise the app without a provider.
+
+    Answers start after `first_token_delay` seconds and stream `tokens_per_second`
+    words per second. Their length is normally distributed, and a share of
+    `error_rate` answers fails before the first word. Answers only depend on the
+    `seed`, the question and the number of earlier interactions of the chat.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        name: str,
+        model_name: str = "synthetic",
+        first_token_delay: float = 0.5,
+        tokens_per_second: float = 50,
+        answer_tokens_mean: int = 200,
+        answer_tokens_stddev: int = 50,
+        error_rate: float = 0.0,
+        error_status_code: int = 503,
+        seed: int = 0,
+    ):
+        self.__id = client_id
+        self.__name = name
+        self.__model_name = model_name
+        self.first_token_delay = first_token_delay
+        self.tokens_per_second = tokens_per_second
+        self.answer_tokens_mean = answer_tokens_mean
+        self.answer_tokens_stddev = answer_tokens_stddev
+        self.error_rate = error_rate
+        self.error_status_code = error_status_code
+        self.seed = seed
+
+    @property
+    def id(self) -> str:
+        return self.__id
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def client_type(self) -> str:
+        return "synthetic"
+
+    @property
+    def model_name(self) -> str:
+        return self.__model_name
+
+    def start_session(self) -> SyntheticChatSession:
+        return SyntheticChatSession(self)
+
+    def restore_session(
+        self,
+        interactions: Iterable[ChatInteraction],
+        summary: ChatSummary = None,
+        interaction_count: int = None,
+    ) -> SyntheticChatSession:
+        # answers depend on the whole history, which is never summarized
+        return SyntheticChatSession(self, history=list(interactions)[::-1])
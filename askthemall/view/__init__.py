@@ -10,11 +10,24 @@ from askthemall.view.helpers import (
     hidden_anchor,
     js_scroll_to,
 )
-from askthemall.view.model import AskThemAllViewModel, ChatListViewModel
+from askthemall.view.model import (
+    AskThemAllViewModel,
+    ChatInteractionViewModel,
+    ChatListViewModel,
+    FanOutViewModel,
+)
 
 logger = logging.getLogger(__name__)
 
 
+def write_interaction(interaction: ChatInteractionViewModel):
+    with st.chat_message("user", avatar=":material/face:"):
+        st.markdown(interaction.question)
+        st.caption(interaction.caption)
+    with st.chat_message("assistant", avatar=":material/smart_toy:"):
+        st.markdown(interaction.answer)
+
+
 def render_chat_list(chat_list: ChatListViewModel):
     with st.expander(chat_list.title, icon=chat_list.icon, expanded=chat_list.expanded):
         if chat_list.new_chat_enabled:
@@ -37,7 +50,7 @@ def render_chat_list(chat_list: ChatListViewModel):
                 if st.button(
                     chat.title,
                     type="tertiary",
-                    help=chat.title,
+                    help=chat.description,
                     use_container_width=True,
                     key=f"view-chat-{chat.chat_id}",
                 ):
@@ -64,6 +77,45 @@ def render_chat_list(chat_list: ChatListViewModel):
                     chat_list.load_more_chats()
 
 
+def render_fan_out(fan_out: FanOutViewModel):
+    st.title(":material/forum: Ask them all")
+
+    chats = fan_out.chats
+    columns = st.columns(len(chats))
+    for column, chat in zip(columns, chats):
+        with column:
+            st.subheader(chat.assistant_name)
+            for interaction in chat.interactions:
+                write_interaction(interaction)
+            if chat.interactions:
+                st.button(
+                    "Continue this chat",
+                    icon=":material/arrow_forward:",
+                    type="tertiary",
+                    key=f"continue-chat-{chat.chat_id}",
+                    on_click=fan_out.continue_chat,
+                    args=(chat.chat_id,),
+                )
+
+    question = st.chat_input("Ask them all")
+    if question:
+        placeholders = {}
+        for column, chat in zip(columns, chats):
+            with column:
+                with st.chat_message("user", avatar=":material/face:"):
+                    st.write(question)
+                    st.caption(format_datetime(datetime.now()))
+                with st.chat_message("assistant", avatar=":material/smart_toy:"):
+                    placeholders[chat.chat_id] = st.empty()
+        answers = {chat.chat_id: "" for chat in chats}
+        for chunk in fan_out.ask_question(question):
+            if chunk.error:
+                placeholders[chunk.chat_id].error(str(chunk.error))
+            elif chunk.text:
+                answers[chunk.chat_id] += chunk.text
+                placeholders[chunk.chat_id].markdown(answers[chunk.chat_id])
+
+
 def render():
     view_model = AskThemAllViewModel()
 
@@ -95,6 +147,15 @@ def render():
         with st.container(key="sidebar-chats"):
             st.title(":material/Chat: Chats")
 
+            if view_model.fan_out_enabled:
+                st.button(
+                    "Ask them all",
+                    icon=":material/forum:",
+                    type="tertiary",
+                    key="ask-them-all",
+                    on_click=view_model.ask_them_all,
+                )
+
             search_col1, search_col2 = st.columns([10, 1])
             with search_col1:
                 search = st.text_input(
@@ -103,7 +164,7 @@ def render():
                     placeholder="Search...",
                     key="search-chats",
                     label_visibility="collapsed",
-                    on_change=view_model.reset_max_results,
+                    on_change=view_model.reset_search_results,
                 )
                 if search:
                     view_model.search_filter = search
@@ -122,20 +183,39 @@ def render():
                 for chat_list in view_model.chat_lists:
                     render_chat_list(chat_list)
 
+        with st.container(key="sidebar-stats"):
+            st.title(":material/speed: Stats")
+
+            # only queried when shown, the aggregation scans all interactions
+            if st.toggle("Show answer stats", key="show-answer-stats"):
+                st.dataframe(
+                    [stats.as_row() for stats in view_model.answer_stats],
+                    hide_index=True,
+                    use_container_width=True,
+                )
+
+    if view_model.fan_out:
+        render_fan_out(view_model.fan_out)
+
     if view_model.current_chat:
         st.title(view_model.current_chat.title)
         if view_model.current_chat.slug:
             st.caption(view_model.current_chat.slug)
 
+        if view_model.current_chat.has_earlier_interactions:
+            st.button(
+                "Load earlier",
+                icon=":material/keyboard_arrow_up:",
+                type="tertiary",
+                key="load-earlier-interactions",
+                on_click=view_model.current_chat.load_earlier_interactions,
+            )
+
         for interaction in view_model.current_chat.interactions:
             st.markdown(
                 hidden_anchor(interaction.interaction_id), unsafe_allow_html=True
             )
-            with st.chat_message("user", avatar=":material/face:"):
-                st.write(interaction.question)
-                st.caption(format_datetime(interaction.asked_at))
-            with st.chat_message("assistant", avatar=":material/smart_toy:"):
-                st.write(interaction.answer)
+            write_interaction(interaction)
 
         if view_model.current_chat.chat_enabled:
             question = st.chat_input(f"Ask {view_model.current_chat.assistant_name}")
@@ -1,20 +1,31 @@
 from abc import ABC, abstractmethod
+from collections import OrderedDict
 from dataclasses import dataclass
 from datetime import datetime
+from functools import cached_property
+from typing import Generator, Callable, Dict
 
 import streamlit as st
-from dependency_injector.wiring import inject, Provide
+from dependency_injector.wiring import inject, Provide, Provider
 
 from askthemall.core.model import (
     ChatModel,
     ChatBotModel,
     AskThemAllModel,
+    ChatCache,
     ChatListModel,
+    FanOutModel,
+    FanOutChunk,
 )
-from askthemall.view.helpers import ScrollIntoView
+from askthemall.core.streaming import ChunkCoalescer, coalesce
+from askthemall.view.helpers import ScrollIntoView, format_datetime
 from askthemall.view.settings import ViewSettings
 
 
+# the number of chats whose interaction windows are kept in the session state
+MAX_CHATS_IN_SESSION_STATE = 32
+
+
 class ChatHubViewModelListener(ABC):
     @abstractmethod
     def on_new_chat_started(self, chat: ChatModel):
@@ -32,15 +43,31 @@ class ChatHubViewModelListener(ABC):
     def on_question_answered(self, chat: ChatModel):
         pass
 
+    @abstractmethod
+    def on_fan_out_answered(self, fan_out: FanOutModel):
+        pass
+
     @abstractmethod
     def on_goto_interaction(self, interaction_id: str):
         pass
 
+    @abstractmethod
+    def on_fan_out_started(self, fan_out: FanOutModel):
+        pass
+
 
 class ChatListItemViewModel:
-    def __init__(self, chat: ChatModel, chat_hub_listener: ChatHubViewModelListener):
+    def __init__(
+        self,
+        chat: ChatModel,
+        ask_them_all_model: AskThemAllModel,
+        chat_hub_listener: ChatHubViewModelListener,
+        snippets: list[str] = None,
+    ):
         self.__chat = chat
+        self.__ask_them_all_model = ask_them_all_model
         self.__chat_hub_listener = chat_hub_listener
+        self.__snippets = snippets or []
 
     @property
     def chat_id(self) -> str:
@@ -50,8 +77,12 @@ class ChatListItemViewModel:
     def title(self) -> str:
         return self.__chat.title
 
+    @property
+    def description(self) -> str:
+        return "\n\n".join([self.title, *self.__snippets])
+
     def remove(self):
-        self.__chat.remove()
+        self.__ask_them_all_model.remove_chat(self.__chat)
         self.__chat_hub_listener.on_chat_removed(self.chat_id)
         st.rerun()
 
@@ -64,21 +95,17 @@ class ChatListViewModel(ABC):
     ):
         self.__ask_them_all_model = ask_them_all_model
         self.__chat_hub_listener = chat_hub_listener
-        if self.id not in st.session_state.chat_lists_config:
-            st.session_state.chat_lists_config[self.id] = {
-                "max_results": self.chats_per_page
-            }
-        max_results = st.session_state.chat_lists_config[self.id]["max_results"]
-        chat_list = self.fetch_chats(max_results)
-        self.__total_results = chat_list.total_results
-        self.__chats = chat_list.chats
+        # loaded pages are kept across reruns, until the list is reset
+        if self.id not in st.session_state.chat_lists:
+            st.session_state.chat_lists[self.id] = self.fetch_chats(self.chats_per_page)
+        self.__chat_list: ChatListModel = st.session_state.chat_lists[self.id]
 
     @property
     def chats_per_page(self) -> int:
         return 5
 
     @abstractmethod
-    def fetch_chats(self, max_results) -> ChatListModel:
+    def fetch_chats(self, max_results, cursor=None) -> ChatListModel:
         pass
 
     @property
@@ -111,14 +138,19 @@ class ChatListViewModel(ABC):
     def chats(self) -> list[ChatListItemViewModel]:
         return list(
             map(
-                lambda c: ChatListItemViewModel(c, self.__chat_hub_listener),
-                self.__chats,
+                lambda c: ChatListItemViewModel(
+                    c,
+                    self.__ask_them_all_model,
+                    self.__chat_hub_listener,
+                    self.__chat_list.highlights.get(c.id),
+                ),
+                self.__chat_list.chats,
             )
         )
 
     @property
     def total_results(self) -> int:
-        return self.__total_results
+        return self.__chat_list.total_results
 
     def switch_chat(self, chat_id: str):
         chat = self.__ask_them_all_model.switch_chat(chat_id)
@@ -127,11 +159,11 @@ class ChatListViewModel(ABC):
 
     @property
     def has_more_chats(self):
-        return self.total_results > len(self.chats)
+        return self.total_results > len(self.__chat_list.chats)
 
     def load_more_chats(self):
-        st.session_state.chat_lists_config[self.id]["max_results"] += (
-            self.chats_per_page
+        self.__chat_list.extend(
+            self.fetch_chats(self.chats_per_page, self.__chat_list.cursor)
         )
         st.rerun()
 
@@ -148,9 +180,8 @@ class ChatBotViewModel(ChatListViewModel):
         self.__chat_bot = chat_bot
         super().__init__(ask_them_all_model, chat_hub_listener)
 
-    def fetch_chats(self, max_results) -> ChatListModel:
-        chat_list = self.__chat_bot.get_all_chats(max_results=max_results)
-        return chat_list
+    def fetch_chats(self, max_results, cursor=None) -> ChatListModel:
+        return self.__chat_bot.get_all_chats(max_results=max_results, cursor=cursor)
 
     @property
     def id(self) -> str:
@@ -178,6 +209,8 @@ class ChatBotViewModel(ChatListViewModel):
 
 
 class ChatSearchResultViewModel(ChatListViewModel):
+    ID = "search-results"
+
     def __init__(
         self,
         search_filter: str,
@@ -189,8 +222,10 @@ class ChatSearchResultViewModel(ChatListViewModel):
         self.__search_filter = search_filter
         super().__init__(ask_them_all_model, chat_hub_listener)
 
-    def fetch_chats(self, max_results) -> ChatListModel:
-        return self.__ask_them_all_model.filter_chats(self.__search_filter, max_results)
+    def fetch_chats(self, max_results, cursor=None) -> ChatListModel:
+        return self.__ask_them_all_model.filter_chats(
+            self.__search_filter, max_results, offset=cursor or 0
+        )
 
     @property
     def title(self) -> str:
@@ -198,7 +233,7 @@ class ChatSearchResultViewModel(ChatListViewModel):
 
     @property
     def id(self) -> str:
-        return "search-results"
+        return self.ID
 
     @property
     def icon(self) -> str:
@@ -220,15 +255,59 @@ class ChatInteractionViewModel:
     answer: str
     asked_at: datetime
 
+    @cached_property
+    def caption(self) -> str:
+        # formatted once, as the interactions of a chat are kept across reruns
+        return format_datetime(self.asked_at)
+
     @property
     def question_as_title(self):
         return self.question.splitlines()[0].strip()
 
 
+@dataclass
+class AnswerStatsViewModel:
+    chat_bot_name: str
+    answer_count: int
+    first_chunk_latency_p50: float | None
+    first_chunk_latency_p95: float | None
+    tokens_per_second_p50: float | None
+
+    def as_row(self) -> dict:
+        return {
+            "Chat bot": self.chat_bot_name,
+            "Answers": self.answer_count,
+            "First chunk p50 (s)": _round(self.first_chunk_latency_p50, 2),
+            "First chunk p95 (s)": _round(self.first_chunk_latency_p95, 2),
+            "Tokens/s p50": _round(self.tokens_per_second_p50, 0),
+        }
+
+
+def _round(value: float | None, digits: int) -> float | None:
+    return round(value, digits) if value is not None else None
+
+
+def _chat_state(name: str) -> OrderedDict:
+    return st.session_state.setdefault(name, OrderedDict())
+
+
+def _put_chat_state(state: OrderedDict, chat_id: str, value):
+    state[chat_id] = value
+    state.move_to_end(chat_id)
+    while len(state) > MAX_CHATS_IN_SESSION_STATE:
+        state.popitem(last=False)
+
+
 class ChatViewModel:
-    def __init__(self, chat: ChatModel, chat_hub_listener: ChatHubViewModelListener):
+    def __init__(
+        self,
+        chat: ChatModel,
+        chat_hub_listener: ChatHubViewModelListener,
+        view_settings: ViewSettings,
+    ):
         self.__chat = chat
         self.__chat_hub_listener = chat_hub_listener
+        self.__view_settings = view_settings
 
     @property
     def chat_enabled(self):
@@ -250,23 +329,57 @@ class ChatViewModel:
     def assistant_name(self) -> str:
         return self.__chat.assistant_name
 
+    @property
+    def interactions_per_page(self) -> int:
+        return 20
+
     @property
     def interactions(self) -> list[ChatInteractionViewModel]:
-        return list(
-            map(
-                lambda i: ChatInteractionViewModel(
-                    interaction_id=i.id,
-                    question=i.question,
-                    answer=i.answer,
-                    asked_at=i.asked_at,
-                ),
-                self.__chat.interactions,
+        """The window of the latest interactions, built once per version of the chat."""
+        key = (self.__chat.version, self.__window)
+        memos = _chat_state("chat_interactions")
+        memo = memos.get(self.chat_id)
+        if memo is None or memo[0] != key:
+            memo = (
+                key,
+                [
+                    ChatInteractionViewModel(
+                        interaction_id=i.id,
+                        question=i.question,
+                        answer=i.answer,
+                        asked_at=i.asked_at,
+                    )
+                    for i in self.__chat.interactions[-self.__window :]
+                ],
             )
+            _put_chat_state(memos, self.chat_id, memo)
+        return memo[1]
+
+    @property
+    def __window(self) -> int:
+        return _chat_state("chat_windows").get(self.chat_id, self.interactions_per_page)
+
+    @property
+    def has_earlier_interactions(self) -> bool:
+        return (
+            len(self.__chat.interactions) > self.__window
+            or self.__chat.has_earlier_interactions
         )
 
+    def load_earlier_interactions(self):
+        """Shows a page of earlier interactions, reading them from the chat if needed."""
+        window = self.__window + self.interactions_per_page
+        missing = window - len(self.__chat.interactions)
+        if missing > 0 and self.__chat.has_earlier_interactions:
+            self.__chat.load_earlier_interactions(missing)
+        _put_chat_state(_chat_state("chat_windows"), self.chat_id, window)
+
     def ask_question(self, question):
-        for chunk in self.__chat.ask_question(question):
-            yield chunk
+        yield from coalesce(
+            self.__chat.ask_question(question),
+            window=self.__view_settings.coalesce_window,
+            max_size=self.__view_settings.coalesce_size,
+        )
         self.__chat_hub_listener.on_question_answered(self.__chat)
         st.rerun()
 
@@ -274,16 +387,72 @@ class ChatViewModel:
         self.__chat_hub_listener.on_goto_interaction(interaction.interaction_id)
 
 
+class FanOutViewModel:
+    def __init__(
+        self,
+        fan_out: FanOutModel,
+        chat_hub_listener: ChatHubViewModelListener,
+        view_settings: ViewSettings,
+    ):
+        self.__fan_out = fan_out
+        self.__chat_hub_listener = chat_hub_listener
+        self.__view_settings = view_settings
+
+    @property
+    def chats(self) -> list[ChatViewModel]:
+        return list(
+            map(
+                lambda c: ChatViewModel(
+                    c, self.__chat_hub_listener, self.__view_settings
+                ),
+                self.__fan_out.chats,
+            )
+        )
+
+    def ask_question(self, question) -> Generator[FanOutChunk, None, None]:
+        """Streams the answers, with the chunks of each answer coalesced."""
+        coalescers: Dict[str, ChunkCoalescer] = {}
+        for chunk in self.__fan_out.ask_question(question):
+            coalescer = coalescers.setdefault(
+                chunk.chat_id,
+                ChunkCoalescer(
+                    window=self.__view_settings.coalesce_window,
+                    max_size=self.__view_settings.coalesce_size,
+                ),
+            )
+            text = coalescer.add(chunk.text) if chunk.text else coalescer.flush()
+            if text:
+                yield FanOutChunk(chat_id=chunk.chat_id, text=text)
+            if not chunk.text:
+                yield chunk
+        self.__chat_hub_listener.on_fan_out_answered(self.__fan_out)
+        st.rerun()
+
+    def continue_chat(self, chat_id: str):
+        chat = self.__fan_out.get_chat(chat_id)
+        if chat and chat.started:
+            self.__chat_hub_listener.on_chat_switched(chat)
+
+
 class AskThemAllViewModel(ChatHubViewModelListener):
     @inject
-    def __init__(self, view_settings: ViewSettings = Provide["view_settings"]):
+    def __init__(
+        self,
+        view_settings: ViewSettings = Provide["view_settings"],
+        chat_cache_factory: Callable[[], ChatCache] = Provider["chat_cache"],
+    ):
         self.__app_title = view_settings.app_title
-        self.__ask_them_all_model = AskThemAllModel()
+        self.__view_settings = view_settings
+        # live chats are kept per user, across reruns
+        if "chat_cache" not in st.session_state:
+            st.session_state.chat_cache = chat_cache_factory()
+        self.__chat_cache: ChatCache = st.session_state.chat_cache
+        self.__ask_them_all_model = AskThemAllModel(chat_cache=self.__chat_cache)
         self.__chat_bots = self.__ask_them_all_model.chat_bots
         self.__search_filter = None
         if "initialized" not in st.session_state:
             st.session_state.initialized = True
-            st.session_state.chat_lists_config = {}
+            st.session_state.chat_lists = {}
 
     @property
     def __chat(self):
@@ -328,12 +497,47 @@ class AskThemAllViewModel(ChatHubViewModelListener):
             chat_lists.append(chat_list)
         return chat_lists
 
+    @property
+    def answer_stats(self) -> list[AnswerStatsViewModel]:
+        chat_bot_names = {chat_bot.id: chat_bot.name for chat_bot in self.__chat_bots}
+        return [
+            AnswerStatsViewModel(
+                chat_bot_name=chat_bot_names.get(stats.chat_bot_id, stats.chat_bot_id),
+                answer_count=stats.answer_count,
+                first_chunk_latency_p50=stats.first_chunk_latency_p50,
+                first_chunk_latency_p95=stats.first_chunk_latency_p95,
+                tokens_per_second_p50=stats.tokens_per_second_p50,
+            )
+            for stats in self.__ask_them_all_model.get_answer_stats()
+        ]
+
     @property
     def current_chat(self):
         if self.__chat:
-            return ChatViewModel(self.__chat, self)
+            return ChatViewModel(self.__chat, self, self.__view_settings)
         return None
 
+    @property
+    def __fan_out(self) -> FanOutModel | None:
+        return st.session_state.fan_out if "fan_out" in st.session_state else None
+
+    @__fan_out.setter
+    def __fan_out(self, fan_out: FanOutModel | None):
+        st.session_state.fan_out = fan_out
+
+    @property
+    def fan_out(self) -> FanOutViewModel | None:
+        if self.__fan_out:
+            return FanOutViewModel(self.__fan_out, self, self.__view_settings)
+        return None
+
+    @property
+    def fan_out_enabled(self) -> bool:
+        return any(chat_bot.enabled for chat_bot in self.__chat_bots)
+
+    def ask_them_all(self):
+        self.on_fan_out_started(self.__ask_them_all_model.ask_them_all())
+
     @property
     def scroll_to(self):
         return self.__scroll_to
@@ -343,18 +547,30 @@ class AskThemAllViewModel(ChatHubViewModelListener):
 
     def on_new_chat_started(self, chat: ChatModel):
         self.__chat = chat
+        self.__chat_cache.put(chat)
+        self.__fan_out = None
 
     def on_chat_removed(self, chat_id: str):
+        for chat_list in st.session_state.chat_lists.values():
+            chat_list.remove(chat_id)
         if self.__chat and self.__chat.id == chat_id:
             self.__chat = None
+        if self.__fan_out and self.__fan_out.get_chat(chat_id):
+            self.__fan_out.chats.remove(self.__fan_out.get_chat(chat_id))
+            # a fan-out without chats has no columns to render
+            if not self.__fan_out.chats:
+                self.__fan_out = None
 
     def on_chat_switched(self, chat: ChatModel):
         self.__chat = chat
+        self.__chat_cache.put(chat)
+        self.__fan_out = None
         st.session_state.scroll_to = ScrollIntoView(
             id=chat.interactions[-1].id, behavior="instant"
         )
 
     def on_question_answered(self, chat: ChatModel):
+        self.__put_in_chat_list(chat)
         self.__scroll_to = ScrollIntoView(
             id=chat.interactions[-1].id, behavior="instant"
         )
@@ -364,6 +580,22 @@ class AskThemAllViewModel(ChatHubViewModelListener):
             id=interaction_id, behavior="smooth", delay=100
         )
 
+    def on_fan_out_answered(self, fan_out: FanOutModel):
+        for chat in fan_out.chats:
+            self.__put_in_chat_list(chat)
+
+    @staticmethod
+    def __put_in_chat_list(chat: ChatModel):
+        # updated locally, as the chat may not be searchable yet; a detached copy is
+        # listed, so the chat cache alone decides which chats stay in memory
+        chat_list = st.session_state.chat_lists.get(chat.chat_bot_id)
+        if chat_list is not None:
+            chat_list.put(chat.detach())
+
+    def on_fan_out_started(self, fan_out: FanOutModel):
+        self.__fan_out = fan_out
+        self.__chat = None
+
     @property
     def search_filter(self):
         return self.__search_filter
@@ -373,8 +605,8 @@ class AskThemAllViewModel(ChatHubViewModelListener):
         self.__search_filter = search
 
     @staticmethod
-    def reset_max_results():
-        st.session_state.chat_lists_config = {}
+    def reset_search_results():
+        st.session_state.chat_lists.pop(ChatSearchResultViewModel.ID, None)
 
     @search_filter.setter
     def search_filter(self, search):
@@ -383,4 +615,4 @@ class AskThemAllViewModel(ChatHubViewModelListener):
     def clear_search_filter(self):
         st.session_state["search-chats"] = None
         self.__search_filter = None
-        self.reset_max_results()
+        self.reset_search_results()
@@ -4,3 +4,6 @@ from dataclasses import dataclass
 @dataclass
 class ViewSettings:
     app_title: str
+    # answers are streamed to the browser in batches of chunks
+    coalesce_window: float = 0.05
+    coalesce_size: int = 256
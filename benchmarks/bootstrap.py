@@ -0,0 +1,64 @@
+"""Measures the per-rerun startup overhead of the application.
+
+Compares rebuilding the container and migrating the database on every rerun, as
+main.py used to do, with the process-wide bootstrap. Uses the regular settings, so
+OpenSearch must be reachable.
+
+    python -m benchmarks.bootstrap [reruns]
+"""
+
+import sys
+import time
+
+from opensearchpy import Transport
+
+from askthemall import containers
+from askthemall.app import Bootstrap
+
+
+class RequestCounter:
+    def __init__(self):
+        self.count = 0
+        self.__perform_request = Transport.perform_request
+
+    def __enter__(self):
+        counter = self
+
+        def perform_request(transport, *args, **kwargs):
+            counter.count += 1
+            return counter.__perform_request(transport, *args, **kwargs)
+
+        Transport.perform_request = perform_request
+        return self
+
+    def __exit__(self, *args):
+        Transport.perform_request = self.__perform_request
+
+
+def measure(name, rerun, reruns):
+    with RequestCounter() as counter:
+        start = time.perf_counter()
+        for _ in range(reruns):
+            rerun()
+        elapsed = time.perf_counter() - start
+    print(
+        f"{name}: {elapsed / reruns * 1000:.2f} ms "
+        f"and {counter.count / reruns:.1f} OpenSearch requests per rerun"
+    )
+
+
+def rerun_without_bootstrap():
+    container = containers.init()
+    container.database_migration().migrate()
+
+
+def main():
+    reruns = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    measure("container and migration per rerun", rerun_without_bootstrap, reruns)
+    bootstrap = Bootstrap()
+    bootstrap.start()
+    measure("process-wide bootstrap", bootstrap.start, reruns)
+
+
+if __name__ == "__main__":
+    main()
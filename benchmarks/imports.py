@@ -0,0 +1,58 @@
+"""Measures the import cost of the LLM client module and of each provider SDK.
+
+Every measurement runs in a fresh interpreter, so nothing is cached between them.
+
+    python -m benchmarks.imports [runs]
+"""
+
+import subprocess
+import sys
+
+from askthemall.lc import LLM_PROVIDERS
+
+MEASURE = """
+import sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+providers = [m for m in {provider_modules!r} if m in sys.modules]
+print(elapsed, len(sys.modules), ",".join(providers))
+"""
+
+
+def measure(name, statement, runs):
+    provider_modules = [provider.module_name for provider in LLM_PROVIDERS.values()]
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                MEASURE.format(statement=statement, provider_modules=provider_modules),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.split()
+        timings.append(float(output[0]))
+    loaded = output[2] if len(output) > 2 else "none"
+    print(
+        f"{name}: {min(timings) * 1000:.0f} ms, {output[1]} modules, "
+        f"provider SDKs loaded: {loaded}"
+    )
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    measure("import askthemall.lc", "import askthemall.lc", runs)
+    for llm_type, provider in LLM_PROVIDERS.items():
+        measure(
+            f"create a {llm_type} client",
+            "from askthemall.lc import create_llm\n"
+            f"create_llm({llm_type!r}, 'some-model', 'some-api-key')",
+            runs,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Load tests the ask, stream and persist path with a synthetic chat bot.
+
+Every user asks a number of questions in a new chat, concurrently with the other
+users. Uses the regular settings for OpenSearch, so it must be reachable, but no LLM
+provider is called.
+
+    python -m benchmarks.load [users] [questions]
+"""
+
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from askthemall import containers
+from askthemall.core.model import ChatBotModel
+from askthemall.synthetic import SyntheticChatClient
+
+
+def ask_questions(chat_bot: ChatBotModel, user: int, questions: int):
+    chat = chat_bot.new_chat()
+    first_chunk_latencies = []
+    failures = 0
+    for question in range(questions):
+        started_at = time.perf_counter()
+        try:
+            for i, _ in enumerate(chat.ask_question(f"Question {question} of {user}")):
+                if i == 0:
+                    first_chunk_latencies.append(time.perf_counter() - started_at)
+        except Exception:
+            failures += 1
+    return chat.id, first_chunk_latencies, failures
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    questions = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    container = containers.init()
+    container.database_migration().migrate()
+    chat_bot = ChatBotModel(
+        "synthetic-load",
+        "Synthetic load",
+        SyntheticChatClient(
+            "synthetic-load",
+            "Synthetic load",
+            first_token_delay=0.2,
+            tokens_per_second=200,
+            answer_tokens_mean=100,
+            error_rate=0.01,
+        ),
+    )
+
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as executor:
+        results = list(
+            executor.map(
+                lambda user: ask_questions(chat_bot, user, questions), range(users)
+            )
+        )
+    container.chat_repository().flush()
+    container.interaction_repository().flush()
+    elapsed = time.perf_counter() - started_at
+
+    latencies = sorted(
+        latency for _, user_latencies, _ in results for latency in user_latencies
+    )
+    failures = sum(user_failures for _, _, user_failures in results)
+    print(
+        f"{users} users asked {users * questions} questions in {elapsed:.2f}s "
+        f"({users * questions / elapsed:.1f} questions/s), {failures} failed"
+    )
+    print(
+        f"time to first chunk: median {statistics.median(latencies) * 1000:.0f} ms, "
+        f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.0f} ms"
+    )
+
+    for chat_id, _, _ in results:
+        container.chat_repository().delete_by_id(chat_id)
+        container.interaction_repository().delete_all_by_chat_id(chat_id)
+    container.chat_repository().flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Measures the rerun time of a long chat, step by step.
+
+Renders a chat of synthetic interactions with Streamlit's app testing framework, so no
+browser or OpenSearch is needed. The time spent rendering markdown in the browser is
+not included. Each step changes one thing over the previous one:
+
+- `st.write`: writes the interactions with `st.write` and formats each timestamp.
+- `st.markdown`: writes them with `st.markdown` instead.
+- `cached captions`: also keeps the interactions, and their formatted timestamps,
+  across reruns, as the chat view does.
+
+    python -m benchmarks.rendering [interactions] [reruns]
+"""
+
+import statistics
+import sys
+import time
+
+from streamlit.testing.v1 import AppTest
+
+
+def write_chat(interaction_count: int):
+    from datetime import datetime, timedelta
+
+    import streamlit as st
+
+    from askthemall.view.helpers import format_datetime
+
+    answer = "\n".join(
+        ["Some **answer**, with a list:", ""]
+        + [f"- item {i} with `code`" for i in range(20)]
+    )
+    for i in range(interaction_count):
+        with st.chat_message("user", avatar=":material/face:"):
+            st.write(f"Question {i}")
+            st.caption(format_datetime(datetime(2025, 1, 1) + timedelta(minutes=i)))
+        with st.chat_message("assistant", avatar=":material/smart_toy:"):
+            st.write(answer)
+
+
+def markdown_chat(interaction_count: int):
+    from datetime import datetime, timedelta
+
+    import streamlit as st
+
+    from askthemall.view.helpers import format_datetime
+
+    answer = "\n".join(
+        ["Some **answer**, with a list:", ""]
+        + [f"- item {i} with `code`" for i in range(20)]
+    )
+    for i in range(interaction_count):
+        with st.chat_message("user", avatar=":material/face:"):
+            st.markdown(f"Question {i}")
+            st.caption(format_datetime(datetime(2025, 1, 1) + timedelta(minutes=i)))
+        with st.chat_message("assistant", avatar=":material/smart_toy:"):
+            st.markdown(answer)
+
+
+def cached_caption_chat(interaction_count: int):
+    from datetime import datetime, timedelta
+
+    import streamlit as st
+
+    from askthemall.view import write_interaction
+    from askthemall.view.model import ChatInteractionViewModel
+
+    if "interactions" not in st.session_state:
+        answer = "\n".join(
+            ["Some **answer**, with a list:", ""]
+            + [f"- item {i} with `code`" for i in range(20)]
+        )
+        st.session_state.interactions = [
+            ChatInteractionViewModel(
+                interaction_id=f"interaction-{i}",
+                question=f"Question {i}",
+                answer=answer,
+                asked_at=datetime(2025, 1, 1) + timedelta(minutes=i),
+            )
+            for i in range(interaction_count)
+        ]
+    for interaction in st.session_state.interactions:
+        write_interaction(interaction)
+
+
+def measure(name, script, interaction_count, reruns):
+    app = AppTest.from_function(script, args=(interaction_count,), default_timeout=60)
+    app.run()
+    timings = []
+    for _ in range(reruns):
+        started_at = time.perf_counter()
+        app.run()
+        timings.append(time.perf_counter() - started_at)
+    print(
+        f"{name}: median {statistics.median(timings) * 1000:.1f} ms, "
+        f"min {min(timings) * 1000:.1f} ms per rerun"
+    )
+
+
+def main():
+    interaction_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    reruns = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    print(f"{interaction_count} interactions, {reruns} reruns")
+    measure("st.write", write_chat, interaction_count, reruns)
+    measure("st.markdown", markdown_chat, interaction_count, reruns)
+    measure("cached captions", cached_caption_chat, interaction_count, reruns)
+
+
+if __name__ == "__main__":
+    main()
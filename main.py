@@ -1,4 +1,3 @@
-from askthemall import containers, app
+from askthemall import app
 
-container = containers.init()
 app.run()
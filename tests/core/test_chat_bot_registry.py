@@ -0,0 +1,136 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from askthemall.core.model import ChatBotRegistry
+from askthemall.core.persistence import ChatBotData
+
+
+@pytest.fixture
+def chat_bot_repository():
+    repository = MagicMock()
+    repository.iter_all.side_effect = lambda: iter(
+        [
+            ChatBotData(id="archived", name="Archived"),
+            ChatBotData(id="gemini", name="Gemini"),
+            ChatBotData(id="groq", name="Groq"),
+        ]
+    )
+    return repository
+
+
+def chat_client(chat_client_id, name, client_type, model_name):
+    client = MagicMock()
+    client.id = chat_client_id
+    client.name = name
+    client.client_type = client_type
+    client.model_name = model_name
+    return client
+
+
+@pytest.fixture
+def chat_clients():
+    return [
+        chat_client("groq", "Groq", "groq", "llama3"),
+        chat_client("gemini", "Gemini", "google", "gemini-2.0-flash"),
+    ]
+
+
+@pytest.fixture
+def registry(chat_bot_repository, chat_clients):
+    return ChatBotRegistry(
+        chat_bot_repository=chat_bot_repository, chat_clients=chat_clients
+    )
+
+
+def test_get(registry, chat_clients):
+    chat_bot = registry.get("groq")
+    assert chat_bot.name == "Groq"
+    assert chat_bot.chat_client is chat_clients[0]
+
+
+def test_get_unknown_chat_bot(registry):
+    assert registry.get("unknown") is None
+
+
+def test_get_chat_bot_without_client(registry):
+    assert not registry.get("archived").enabled
+
+
+def test_chat_bots_are_sorted_enabled_first(registry):
+    assert [c.id for c in registry.chat_bots] == ["gemini", "groq", "archived"]
+
+
+def test_chat_bots_are_loaded_once(registry, chat_bot_repository):
+    registry.register()
+    chat_bot_repository.iter_all.reset_mock()
+    for chat_bot_id in ["gemini", "groq", "archived", "unknown"]:
+        registry.get(chat_bot_id)
+    registry.chat_bots
+    chat_bot_repository.iter_all.assert_called_once()
+
+
+def test_invalidate(registry, chat_bot_repository):
+    registry.get("gemini")
+    chat_bot_repository.iter_all.reset_mock()
+    registry.invalidate()
+    registry.get("gemini")
+    chat_bot_repository.iter_all.assert_called_once()
+
+
+def test_register_saves_only_changed_chat_bots(registry, chat_bot_repository):
+    chat_bot_repository.iter_all.side_effect = lambda: iter(
+        [
+            ChatBotData(
+                id="groq", name="Groq", client_type="groq", model_name="llama3"
+            ),
+            ChatBotData(id="gemini", name="Old name"),
+        ]
+    )
+    registry.register()
+    chat_bot_repository.save_all.assert_called_once_with(
+        [
+            ChatBotData(
+                id="gemini",
+                name="Gemini",
+                client_type="google",
+                model_name="gemini-2.0-flash",
+            )
+        ]
+    )
+
+
+def test_register_without_changes(registry, chat_bot_repository):
+    chat_bot_repository.iter_all.side_effect = lambda: iter(
+        [
+            ChatBotData(
+                id="groq", name="Groq", client_type="groq", model_name="llama3"
+            ),
+            ChatBotData(
+                id="gemini",
+                name="Gemini",
+                client_type="google",
+                model_name="gemini-2.0-flash",
+            ),
+        ]
+    )
+    registry.register()
+    chat_bot_repository.save_all.assert_not_called()
+
+
+def test_register_once(registry, chat_bot_repository):
+    registry.register()
+    registry.register()
+    registry.chat_bots
+    chat_bot_repository.save_all.assert_called_once()
+
+
+def test_chat_bots_are_reloaded_after_ttl(chat_bot_repository, chat_clients):
+    registry = ChatBotRegistry(
+        chat_bot_repository=chat_bot_repository, chat_clients=chat_clients, ttl=0
+    )
+    registry.register()
+    chat_bot_repository.iter_all.reset_mock()
+    registry.get("gemini")
+    registry.get("gemini")
+    assert chat_bot_repository.iter_all.call_count == 2
@@ -0,0 +1,105 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from askthemall.core.model import AskThemAllModel, ChatCache
+from askthemall.core.persistence import ChatData
+
+
+def chat(chat_id, size=0):
+    chat = MagicMock()
+    chat.id = chat_id
+    chat.size = size
+    return chat
+
+
+def test_get_and_put():
+    cache = ChatCache()
+    some_chat = chat("a")
+    assert cache.get("a") is None
+    cache.put(some_chat)
+    assert cache.get("a") is some_chat
+    assert "a" in cache
+
+
+def test_least_recently_used_chat_is_evicted():
+    cache = ChatCache(max_chats=2)
+    cache.put(chat("a"))
+    cache.put(chat("b"))
+    cache.get("a")
+    cache.put(chat("c"))
+    assert "b" not in cache
+    assert "a" in cache
+    assert "c" in cache
+
+
+def test_chats_are_evicted_by_size():
+    cache = ChatCache(max_size=100)
+    cache.put(chat("a", size=60))
+    cache.put(chat("b", size=30))
+    assert len(cache) == 2
+    cache.put(chat("c", size=30))
+    assert "a" not in cache
+    assert len(cache) == 2
+
+
+def test_most_recent_chat_is_kept_when_too_large():
+    cache = ChatCache(max_size=10)
+    cache.put(chat("a", size=5))
+    cache.put(chat("b", size=50))
+    assert "a" not in cache
+    assert "b" in cache
+
+
+def test_remove_everywhere():
+    cache = ChatCache()
+    other_cache = ChatCache()
+    cache.put(chat("a"))
+    other_cache.put(chat("a"))
+    other_cache.put(chat("b"))
+
+    ChatCache.remove_everywhere("a")
+
+    assert "a" not in cache
+    assert "a" not in other_cache
+    assert "b" in other_cache
+
+
+@pytest.fixture
+def chat_repository():
+    repository = MagicMock()
+    repository.get_by_id.return_value = ChatData(
+        id="a", slug=None, title="Some title", created_at=None, chat_bot_id="groq"
+    )
+    return repository
+
+
+def test_switch_chat_uses_cache(chat_repository):
+    chat_bot_registry = MagicMock()
+    cache = ChatCache()
+    model = AskThemAllModel(
+        chat_repository=chat_repository,
+        chat_bot_registry=chat_bot_registry,
+        chat_cache=cache,
+    )
+    some_chat = chat("a")
+    cache.put(some_chat)
+
+    assert model.switch_chat("a") is some_chat
+    chat_repository.get_by_id.assert_not_called()
+
+
+def test_remove_chat_evicts_chat(chat_repository):
+    cache = ChatCache()
+    model = AskThemAllModel(
+        chat_repository=chat_repository,
+        chat_bot_registry=MagicMock(),
+        chat_cache=cache,
+    )
+    some_chat = chat("a")
+    cache.put(some_chat)
+
+    model.remove_chat(some_chat)
+
+    some_chat.remove.assert_called_once()
+    assert "a" not in cache
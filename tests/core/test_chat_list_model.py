@@ -0,0 +1,73 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+from askthemall.core.model import ChatBotModel, ChatListModel
+from askthemall.core.persistence import ChatData, DataListResult
+
+
+def chat_data(chat_id):
+    return ChatData(
+        id=chat_id,
+        slug=chat_id,
+        title=f"Chat {chat_id}",
+        created_at=datetime(2025, 1, 1),
+        chat_bot_id="some_chat_bot_id",
+    )
+
+
+def test_get_all_chats_pages_with_cursor():
+    chat_repository = MagicMock()
+    chat_repository.find_all_by_chat_bot_id.side_effect = [
+        DataListResult(
+            data=[chat_data("a"), chat_data("b")], total_results=3, cursor=[2]
+        ),
+        DataListResult(data=[chat_data("c")], total_results=3, cursor=[3]),
+    ]
+    chat_bot = ChatBotModel(
+        "some_chat_bot_id", "Some name", None, chat_repository=chat_repository
+    )
+
+    chat_list = chat_bot.get_all_chats(max_results=2)
+    chat_list.extend(chat_bot.get_all_chats(max_results=2, cursor=chat_list.cursor))
+
+    assert [chat.id for chat in chat_list.chats] == ["a", "b", "c"]
+    assert chat_list.total_results == 3
+    assert chat_list.cursor == [3]
+    chat_repository.find_all_by_chat_bot_id.assert_called_with(
+        "some_chat_bot_id", max_results=2, search_after=[2]
+    )
+
+
+def test_remove():
+    chats = [MagicMock(id="a"), MagicMock(id="b")]
+    chat_list = ChatListModel(chats=chats, total_results=5)
+
+    chat_list.remove("a")
+    chat_list.remove("unknown")
+
+    assert chat_list.chats == chats[1:]
+    assert chat_list.total_results == 4
+
+
+def test_put_replaces_listed_chat():
+    chats = [MagicMock(id="a"), MagicMock(id="b")]
+    chat_list = ChatListModel(chats=list(chats), total_results=5, cursor=[2])
+    answered_chat = MagicMock(id="b")
+
+    chat_list.put(answered_chat)
+
+    assert chat_list.chats == [chats[0], answered_chat]
+    assert chat_list.total_results == 5
+    assert chat_list.cursor == [2]
+
+
+def test_put_adds_new_chat_first():
+    chats = [MagicMock(id="a"), MagicMock(id="b")]
+    chat_list = ChatListModel(chats=list(chats), total_results=5, cursor=[2])
+    new_chat = MagicMock(id="c")
+
+    chat_list.put(new_chat)
+
+    assert chat_list.chats == [new_chat, *chats]
+    assert chat_list.total_results == 6
+    assert chat_list.cursor == [2]
@@ -0,0 +1,305 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+from askthemall.core.client import ChatSummary, TokenUsage
+from askthemall.core.model import ChatModel
+from askthemall.core.persistence import DataListResult
+
+
+@pytest.fixture
+def session():
+    session = MagicMock()
+    session.ask.side_effect = lambda question: iter(["some ", "answer"])
+    session.suggest_title.return_value = "Some title"
+    session.asuggest_title = AsyncMock(return_value="Some title")
+    session.answered_by = "some_fallback_id"
+    session.answered_from_cache = False
+    session.usage = TokenUsage(input_tokens=10, output_tokens=2)
+    session.aask.side_effect = lambda question: async_iter(["some ", "answer"])
+    return session
+
+
+class InlineExecutor(Executor):
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+async def async_iter(items):
+    for item in items:
+        yield item
+
+
+async def collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+@pytest.fixture
+def chat_bot(session):
+    chat_bot = MagicMock()
+    chat_bot.id = "some_chat_bot_id"
+    chat_bot.name = "Some name"
+    chat_bot.chat_client.start_session.return_value = session
+    return chat_bot
+
+
+@pytest.fixture
+def chat_repository():
+    return MagicMock()
+
+
+@pytest.fixture
+def interaction_repository():
+    return MagicMock()
+
+
+def create_chat(chat_bot, chat_repository, interaction_repository, executor):
+    chat = ChatModel(
+        chat_bot,
+        chat_repository=chat_repository,
+        interaction_repository=interaction_repository,
+        executor=executor,
+    )
+    chat.start_chat()
+    return chat
+
+
+@pytest.fixture
+def chat(chat_bot, chat_repository, interaction_repository):
+    return create_chat(
+        chat_bot, chat_repository, interaction_repository, InlineExecutor()
+    )
+
+
+def test_ask_question(chat, chat_repository, interaction_repository):
+    assert "".join(chat.ask_question("some question")) == "some answer"
+
+    assert chat.title == "Some title"
+    assert chat.started
+    chat_repository.save.assert_called_once_with(chat.get_data())
+    interaction_data_list = interaction_repository.save_all.call_args.args[0]
+    assert len(interaction_data_list) == 1
+    assert interaction_data_list[0].answer == "some answer"
+    assert interaction_data_list[0].chat_title == "Some title"
+    assert interaction_data_list[0].answered_by == "some_fallback_id"
+
+
+def test_ask_question_measures_answer(chat, session, interaction_repository):
+    def slow_answer(question):
+        time.sleep(0.05)
+        yield "some "
+        time.sleep(0.05)
+        yield "answer"
+
+    session.ask.side_effect = slow_answer
+    list(chat.ask_question("some question"))
+
+    interaction_data = interaction_repository.save_all.call_args.args[0][0]
+    assert interaction_data.first_chunk_latency == pytest.approx(0.05, abs=0.04)
+    assert interaction_data.duration == pytest.approx(0.1, abs=0.04)
+    assert interaction_data.chunk_count == 2
+    assert interaction_data.input_tokens == 10
+    assert interaction_data.output_tokens == 2
+    assert interaction_data.tokens_per_second == pytest.approx(
+        2 / (interaction_data.duration - interaction_data.first_chunk_latency)
+    )
+
+
+def test_ask_question_without_usage_has_no_throughput(
+    chat, session, interaction_repository
+):
+    session.usage = None
+    list(chat.ask_question("some question"))
+
+    interaction_data = interaction_repository.save_all.call_args.args[0][0]
+    assert interaction_data.duration is not None
+    assert interaction_data.tokens_per_second is None
+
+
+def test_ask_question_flags_cached_answer(chat, session, interaction_repository):
+    session.answered_from_cache = True
+    list(chat.ask_question("some question"))
+
+    assert interaction_repository.save_all.call_args.args[0][0].cached
+
+
+def test_ask_question_saves_chat_once(
+    chat, session, chat_repository, interaction_repository
+):
+    list(chat.ask_question("some question"))
+    list(chat.ask_question("other question"))
+
+    chat_repository.save.assert_called_once()
+    session.suggest_title.assert_called_once_with("some question")
+    assert interaction_repository.save_all.call_count == 2
+
+
+def test_answer_question_does_not_save(chat, chat_repository, interaction_repository):
+    list(chat.answer_question("some question"))
+
+    chat_repository.save.assert_not_called()
+    interaction_repository.save_all.assert_not_called()
+    chat_data, interaction_data_list = chat.collect_unsaved_data()
+    assert chat_data.title == "Some title"
+    assert len(interaction_data_list) == 1
+    assert chat.collect_unsaved_data() == (None, [])
+
+
+def test_aask_question(chat, session, chat_repository, interaction_repository):
+    chunks = asyncio.run(collect(chat.aask_question("some question")))
+
+    assert "".join(chunks) == "some answer"
+    assert chat.title == "Some title"
+    session.ask.assert_not_called()
+    session.suggest_title.assert_not_called()
+    session.asuggest_title.assert_awaited_once_with("some question")
+    assert chat_repository.save.call_args.args[0] == chat.get_data()
+    interaction_data_list = interaction_repository.save_all.call_args.args[0]
+    assert interaction_data_list[0].answer == "some answer"
+    assert interaction_data_list[0].chat_title == "Some title"
+
+
+def test_ask_question_does_not_wait_for_title(
+    chat_bot, session, chat_repository, interaction_repository
+):
+    title_requested = threading.Event()
+    title_released = threading.Event()
+
+    def suggest_title(question):
+        title_requested.set()
+        title_released.wait(5)
+        return "Some title"
+
+    session.suggest_title.side_effect = suggest_title
+    with ThreadPoolExecutor() as executor:
+        chat = create_chat(chat_bot, chat_repository, interaction_repository, executor)
+
+        list(chat.ask_question("some question"))
+
+        assert title_requested.wait(5)
+        chat_repository.save.assert_called_once()
+        assert chat_repository.save.call_args.args[0].title == "Chat with Some name"
+        interaction_repository.save_all.assert_called_once()
+        title_released.set()
+
+    assert chat.title == "Some title"
+    assert chat_repository.save.call_count == 2
+    assert chat_repository.save.call_args.args[0].title == "Some title"
+    assert interaction_repository.save_all.call_count == 2
+    interaction_data_list = interaction_repository.save_all.call_args.args[0]
+    assert [i.chat_title for i in interaction_data_list] == ["Some title"]
+
+
+def test_detached_chat_gets_suggested_title(
+    chat_bot, session, chat_repository, interaction_repository
+):
+    title_released = threading.Event()
+    session.suggest_title.side_effect = lambda question: (
+        title_released.wait(5) and "Some title"
+    )
+    with ThreadPoolExecutor() as executor:
+        chat = create_chat(chat_bot, chat_repository, interaction_repository, executor)
+        list(chat.ask_question("some question"))
+
+        detached_chat = chat.detach()
+        assert detached_chat.id == chat.id
+        assert detached_chat.title == "Chat with Some name"
+        assert detached_chat.interactions == []
+        title_released.set()
+
+    assert detached_chat.title == "Some title"
+    assert detached_chat.slug == chat.slug
+
+
+def test_ask_question_keeps_provisional_title_on_failure(
+    chat, session, chat_repository, interaction_repository
+):
+    session.suggest_title.side_effect = RuntimeError("some error")
+
+    list(chat.ask_question("some question"))
+
+    assert chat.title == "Chat with Some name"
+    chat_repository.save.assert_called_once()
+    interaction_repository.save_all.assert_called_once()
+
+
+def test_restore_chat_caches_summary(chat_bot, chat_repository, interaction_repository):
+    summary = ChatSummary(text="some summary", interaction_count=3)
+    chat_bot.chat_client.restore_session.return_value.summary = summary
+    interaction_repository.find_page_by_chat_id.return_value = DataListResult(
+        data=[], total_results=0
+    )
+    chat = create_chat(
+        chat_bot, chat_repository, interaction_repository, InlineExecutor()
+    )
+
+    chat.restore_chat()
+
+    assert chat.summary == summary
+    chat_repository.save.assert_called_once()
+    assert chat_repository.save.call_args.args[0].summary == "some summary"
+    assert chat_repository.save.call_args.args[0].summary_interaction_count == 3
+
+
+def test_restore_chat_reads_interactions_not_covered_by_summary(
+    chat_bot, chat_repository, interaction_repository
+):
+    summary = ChatSummary(text="some summary", interaction_count=97)
+    chat_bot.chat_client.restore_session.return_value.summary = summary
+    interaction_repository.find_page_by_chat_id.return_value = DataListResult(
+        data=[], total_results=100
+    )
+    interaction_repository.iter_all_by_chat_id.return_value = iter(
+        MagicMock(question=f"question {i}", answer=f"answer {i}")
+        for i in reversed(range(100))
+    )
+    chat = create_chat(
+        chat_bot, chat_repository, interaction_repository, InlineExecutor()
+    )
+    chat.summary = summary
+
+    chat.restore_chat()
+
+    interaction_repository.iter_all_by_chat_id.assert_called_once_with(
+        chat.id, newest_first=True
+    )
+    restore_call = chat_bot.chat_client.restore_session.call_args
+    assert [i.question for i in restore_call.args[0]] == [
+        "question 99",
+        "question 98",
+        "question 97",
+    ]
+    assert restore_call.kwargs == {"summary": summary, "interaction_count": 100}
+
+
+def test_version_changes_with_interactions(chat, interaction_repository):
+    interaction_repository.find_page_by_chat_id.return_value = DataListResult(
+        data=[], total_results=0
+    )
+    versions = [chat.version]
+
+    list(chat.ask_question("some question"))
+    versions.append(chat.version)
+    chat.load_earlier_interactions()
+    versions.append(chat.version)
+    chat.get_data()
+    versions.append(chat.version)
+
+    assert versions[0] < versions[1] < versions[2] == versions[3]
+
+
+def test_size_includes_session_history(chat, session):
+    session.history_size = 100
+
+    list(chat.ask_question("some question"))
+
+    assert chat.size == len("some question") + len("some answer") + 100
@@ -0,0 +1,163 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+import pytest
+
+from askthemall.core.model import FanOutModel
+from askthemall.core.persistence import ChatData, InteractionData
+
+
+def chat_bot(chat_id, answer, error=None):
+    def answer_question(question):
+        for word in answer.split():
+            yield word
+        if error:
+            raise error
+
+    async def aanswer_question(question):
+        for word in answer.split():
+            await asyncio.sleep(0)
+            yield word
+        if error:
+            raise error
+
+    chat = MagicMock()
+    chat.id = chat_id
+    chat.answer_question.side_effect = answer_question
+    chat.aanswer_question.side_effect = aanswer_question
+    chat.collect_unsaved_data.return_value = (
+        MagicMock(spec=ChatData),
+        [MagicMock(spec=InteractionData)],
+    )
+    bot = MagicMock()
+    bot.new_chat.return_value = chat
+    return bot
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor() as executor:
+        yield executor
+
+
+@pytest.fixture
+def chat_repository():
+    return MagicMock()
+
+
+@pytest.fixture
+def interaction_repository():
+    return MagicMock()
+
+
+def create_fan_out(chat_bots, executor, chat_repository, interaction_repository):
+    return FanOutModel(
+        chat_bots,
+        executor=executor,
+        chat_repository=chat_repository,
+        interaction_repository=interaction_repository,
+    )
+
+
+def test_ask_question_streams_all_answers(
+    executor, chat_repository, interaction_repository
+):
+    fan_out = create_fan_out(
+        [chat_bot("a", "some answer"), chat_bot("b", "other longer answer")],
+        executor,
+        chat_repository,
+        interaction_repository,
+    )
+
+    chunks = list(fan_out.ask_question("some question"))
+
+    assert [c.text for c in chunks if c.chat_id == "a" and c.text] == ["some", "answer"]
+    assert [c.text for c in chunks if c.chat_id == "b" and c.text] == [
+        "other",
+        "longer",
+        "answer",
+    ]
+    assert len([c for c in chunks if c.done]) == 2
+
+
+def test_ask_question_saves_each_answer(
+    executor, chat_repository, interaction_repository
+):
+    chat_bots = [chat_bot("a", "some answer"), chat_bot("b", "other answer")]
+    fan_out = create_fan_out(
+        chat_bots, executor, chat_repository, interaction_repository
+    )
+
+    list(fan_out.ask_question("some question"))
+
+    assert chat_repository.save.call_count == 2
+    assert interaction_repository.save_all.call_count == 2
+    for bot in chat_bots:
+        bot.new_chat.return_value.save_suggested_title.assert_called_once()
+
+
+def test_ask_question_saves_answer_before_it_is_done(
+    executor, chat_repository, interaction_repository
+):
+    fan_out = create_fan_out(
+        [chat_bot("a", "some answer"), chat_bot("b", "other longer answer")],
+        executor,
+        chat_repository,
+        interaction_repository,
+    )
+
+    chunks = fan_out.ask_question("some question")
+    first_done = next(chunk for chunk in chunks if chunk.done)
+
+    fan_out.get_chat(first_done.chat_id).collect_unsaved_data.assert_called_once()
+    list(chunks)
+
+
+def test_ask_question_with_failing_chat_bot(
+    executor, chat_repository, interaction_repository
+):
+    error = RuntimeError("some error")
+    fan_out = create_fan_out(
+        [chat_bot("a", "some answer"), chat_bot("b", "partial", error=error)],
+        executor,
+        chat_repository,
+        interaction_repository,
+    )
+
+    chunks = list(fan_out.ask_question("some question"))
+
+    assert [c.error for c in chunks if c.error] == [error]
+    interaction_repository.save_all.assert_called_once()
+
+
+def test_aask_question(executor, chat_repository, interaction_repository):
+    error = RuntimeError("some error")
+    fan_out = create_fan_out(
+        [chat_bot("a", "some answer"), chat_bot("b", "partial", error=error)],
+        executor,
+        chat_repository,
+        interaction_repository,
+    )
+
+    async def collect():
+        return [chunk async for chunk in fan_out.aask_question("some question")]
+
+    chunks = asyncio.run(collect())
+
+    assert [c.text for c in chunks if c.chat_id == "a" and c.text] == ["some", "answer"]
+    assert [c.error for c in chunks if c.error] == [error]
+    assert len([c for c in chunks if c.done]) == 2
+    chat_repository.save.assert_called_once()
+    interaction_repository.save_all.assert_called_once()
+
+
+def test_get_chat(executor, chat_repository, interaction_repository):
+    fan_out = create_fan_out(
+        [chat_bot("a", "some answer")],
+        executor,
+        chat_repository,
+        interaction_repository,
+    )
+    assert fan_out.get_chat("a") is fan_out.chats[0]
+    assert fan_out.get_chat("b") is None
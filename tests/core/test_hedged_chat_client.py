@@ -0,0 +1,246 @@
+import asyncio
+import re
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from askthemall.core.client import (
+    ChatSession,
+    ChatInteraction,
+    ChatSummary,
+    TokenUsage,
+)
+from askthemall.core.hedging import HedgedChatClient, LatencyTracker
+
+
+def chunks(answer):
+    return re.findall(r"\s*\S+", answer)
+
+
+class FakeSession(ChatSession):
+    def __init__(self, client_id, answer, delay=0.0, error=None):
+        self.interactions = []
+        self.__client_id = client_id
+        self.__answer = answer
+        self.__delay = delay
+        self.__error = error
+
+    @property
+    def summary(self):
+        return None
+
+    @property
+    def answered_by(self):
+        return self.__client_id
+
+    @property
+    def usage(self):
+        return TokenUsage(input_tokens=1, output_tokens=len(chunks(self.__answer)))
+
+    @property
+    def answered_from_cache(self):
+        return False
+
+    @property
+    def history_size(self):
+        return sum(len(i.question) + len(i.answer) for i in self.interactions)
+
+    def add_interaction(self, interaction: ChatInteraction):
+        self.interactions.append(interaction)
+
+    def ask(self, question):
+        time.sleep(self.__delay)
+        if self.__error:
+            raise self.__error
+        yield from chunks(self.__answer)
+        self.interactions.append(ChatInteraction(question, self.__answer))
+
+    async def aask(self, question):
+        await asyncio.sleep(self.__delay)
+        if self.__error:
+            raise self.__error
+        for chunk in chunks(self.__answer):
+            yield chunk
+        self.interactions.append(ChatInteraction(question, self.__answer))
+
+    def suggest_title(self, question):
+        return "Some title"
+
+    async def asuggest_title(self, question):
+        return "Some title"
+
+
+def client(primary_session, fallback_session, initial_delay=0.05):
+    primary = MagicMock()
+    primary.id = "primary"
+    primary.start_session.return_value = primary_session
+    fallback = MagicMock()
+    fallback.start_session.return_value = fallback_session
+    return HedgedChatClient(primary, fallback, initial_delay=initial_delay)
+
+
+def ask(session, question, use_async):
+    if not use_async:
+        return list(session.ask(question))
+
+    async def collect():
+        return [chunk async for chunk in session.aask(question)]
+
+    return asyncio.run(collect())
+
+
+def eventually(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture(params=[False, True], ids=["sync", "async"])
+def use_async(request):
+    return request.param
+
+
+def test_fast_primary_is_not_hedged(use_async):
+    primary = FakeSession("primary", "primary answer")
+    fallback = FakeSession("fallback", "fallback answer")
+    session = client(primary, fallback).start_session()
+
+    assert ask(session, "some question", use_async) == ["primary", " answer"]
+    assert session.answered_by == "primary"
+    assert primary.interactions == [ChatInteraction("some question", "primary answer")]
+    assert fallback.interactions == [ChatInteraction("some question", "primary answer")]
+
+
+def test_slow_primary_is_hedged(use_async):
+    primary = FakeSession("primary", "primary answer", delay=1)
+    fallback = FakeSession("fallback", "fallback answer")
+    session = client(primary, fallback).start_session()
+
+    assert ask(session, "some question", use_async) == ["fallback", " answer"]
+    assert session.answered_by == "fallback"
+    assert session.usage == fallback.usage
+    # the cancelled primary adds the answer once its slow first chunk arrives
+    assert eventually(lambda: primary.interactions)
+    assert primary.interactions == [ChatInteraction("some question", "fallback answer")]
+    assert fallback.interactions == [
+        ChatInteraction("some question", "fallback answer")
+    ]
+
+
+def test_cancelled_primary_is_closed_before_answer_is_added():
+    class ClosingSession(FakeSession):
+        closed = False
+
+        def ask(self, question):
+            try:
+                yield from super().ask(question)
+            finally:
+                self.closed = True
+
+    primary = ClosingSession("primary", "primary answer", delay=0.2)
+    fallback = FakeSession("fallback", "fallback answer")
+    session = client(primary, fallback).start_session()
+
+    assert list(session.ask("some question")) == ["fallback", " answer"]
+    assert eventually(lambda: primary.interactions)
+    assert primary.closed
+    assert primary.interactions == [ChatInteraction("some question", "fallback answer")]
+
+
+def test_slow_primary_does_not_delay_answer():
+    primary = FakeSession("primary", "primary answer", delay=2)
+    fallback = FakeSession("fallback", "fallback answer", delay=0.05)
+    session = client(primary, fallback, initial_delay=0.1).start_session()
+
+    started_at = time.monotonic()
+    answer = list(session.ask("some question"))
+
+    assert answer == ["fallback", " answer"]
+    assert time.monotonic() - started_at < 1
+    assert primary.interactions == []
+
+
+def test_primary_completing_while_cancelled_keeps_its_answer():
+    class BlockingSession(FakeSession):
+        def ask(self, question):
+            time.sleep(0.2)
+            self.interactions.append(ChatInteraction(question, "primary answer"))
+            return
+            yield
+
+    primary = BlockingSession("primary", "primary answer")
+    fallback = FakeSession("fallback", "fallback answer")
+    session = client(primary, fallback).start_session()
+
+    assert list(session.ask("some question")) == ["fallback", " answer"]
+    time.sleep(0.4)
+    assert primary.interactions == [ChatInteraction("some question", "primary answer")]
+
+
+def test_slow_primary_still_wins_from_slower_fallback(use_async):
+    primary = FakeSession("primary", "primary answer", delay=0.1)
+    fallback = FakeSession("fallback", "fallback answer", delay=1)
+    session = client(primary, fallback).start_session()
+
+    assert ask(session, "some question", use_async) == ["primary", " answer"]
+    assert session.answered_by == "primary"
+
+
+def test_failing_primary_falls_back(use_async):
+    primary = FakeSession("primary", "", error=RuntimeError("some error"))
+    fallback = FakeSession("fallback", "fallback answer")
+    session = client(primary, fallback, initial_delay=10).start_session()
+
+    assert ask(session, "some question", use_async) == ["fallback", " answer"]
+    assert session.answered_by == "fallback"
+
+
+def test_failing_primary_and_fallback(use_async):
+    error = RuntimeError("some error")
+    primary = FakeSession("primary", "", error=error)
+    fallback = FakeSession("fallback", "", error=RuntimeError("other error"))
+    session = client(primary, fallback).start_session()
+
+    with pytest.raises(RuntimeError, match="error"):
+        ask(session, "some question", use_async)
+
+
+def test_restore_session_shares_summary():
+    summary = ChatSummary(text="some summary", interaction_count=3)
+    primary = MagicMock()
+    primary.restore_session.return_value.summary = summary
+    fallback = MagicMock()
+    hedged_client = HedgedChatClient(primary, fallback)
+    history = [ChatInteraction(question="question", answer="answer")] * 5
+
+    session = hedged_client.restore_session(history, interaction_count=5)
+
+    assert session.summary == summary
+    primary_call = primary.restore_session.call_args
+    fallback_call = fallback.restore_session.call_args
+    assert list(primary_call.args[0]) == history
+    assert list(fallback_call.args[0]) == history
+    assert primary_call.kwargs == {"summary": None, "interaction_count": 5}
+    assert fallback_call.kwargs == {"summary": summary, "interaction_count": 5}
+
+
+def test_hedge_delay_follows_percentile():
+    hedged_client = client(None, None, initial_delay=5)
+    for i in range(19):
+        hedged_client.record_first_chunk_latency(i / 10)
+    assert hedged_client.hedge_delay == 5
+    hedged_client.record_first_chunk_latency(1.9)
+    assert hedged_client.hedge_delay == pytest.approx(1.8)
+
+
+def test_latency_tracker_percentile():
+    tracker = LatencyTracker(window=3)
+    assert tracker.percentile(50) is None
+    for latency in [4, 1, 2, 3]:
+        tracker.record(latency)
+    assert len(tracker) == 3
+    assert tracker.percentile(50) == 2
+    assert tracker.percentile(100) == 3
+    assert tracker.percentile(0) == 1
@@ -0,0 +1,33 @@
+from askthemall.core.client import ChatInteraction, HistoryPolicy, estimate_tokens
+
+
+def interactions(count, length=40):
+    return [
+        ChatInteraction(question="q" * length, answer="a" * length)
+        for _ in range(count)
+    ]
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("a" * 40) == 11
+
+
+def test_window_without_limits():
+    assert HistoryPolicy().window(interactions(50)) == 50
+
+
+def test_window_with_max_turns():
+    assert HistoryPolicy(max_turns=3).window(interactions(10)) == 3
+    assert HistoryPolicy(max_turns=3).window(interactions(2)) == 2
+
+
+def test_window_with_max_tokens():
+    # every interaction is estimated at 22 tokens
+    assert HistoryPolicy(max_tokens=50).window(interactions(10)) == 2
+    assert HistoryPolicy(max_tokens=10).window(interactions(10)) == 0
+
+
+def test_window_with_max_turns_and_max_tokens():
+    policy = HistoryPolicy(max_turns=1, max_tokens=1000)
+    assert policy.window(interactions(10)) == 1
@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from askthemall.core.scheduler import (
+    STATS_LOG_INTERVAL,
+    RequestScheduler,
+    TokenBucket,
+    is_rate_limited,
+)
+
+
+class RateLimitError(Exception):
+    status_code = 429
+
+
+@pytest.fixture(autouse=True)
+def no_backoff():
+    with patch("askthemall.core.scheduler.random.uniform", return_value=0):
+        yield
+
+
+def test_is_rate_limited():
+    assert is_rate_limited(RateLimitError())
+    assert not is_rate_limited(ValueError())
+    try:
+        try:
+            raise RateLimitError()
+        except RateLimitError as e:
+            raise RuntimeError("some error") from e
+    except RuntimeError as e:
+        assert is_rate_limited(e)
+
+
+def test_token_bucket():
+    bucket = TokenBucket(60)
+    assert bucket.delay(60) == 0
+    bucket.take(60)
+    assert bucket.delay(1) == pytest.approx(1, abs=0.05)
+    assert bucket.delay(1000) == pytest.approx(60, abs=0.05)
+
+
+def test_acquire_within_limits():
+    scheduler = RequestScheduler("some", requests_per_minute=60)
+    scheduler.acquire("a")
+    assert scheduler.stats.requests == 1
+    assert scheduler.stats.queue_depth == 0
+
+
+def test_acquire_waits_for_request_limit():
+    scheduler = RequestScheduler("some", requests_per_minute=600)
+    for _ in range(600):
+        scheduler.acquire("a")
+    started_at = time.monotonic()
+    scheduler.acquire("a")
+    assert time.monotonic() - started_at == pytest.approx(0.1, abs=0.05)
+    assert scheduler.stats.max_wait == pytest.approx(0.1, abs=0.05)
+
+
+def test_sessions_take_turns():
+    scheduler = RequestScheduler("some", requests_per_minute=600)
+    for _ in range(600):
+        scheduler.acquire("warm-up")
+    served = []
+
+    def acquire(session_id):
+        scheduler.acquire(session_id)
+        served.append(session_id)
+
+    threads = [threading.Thread(target=acquire, args=("a",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while scheduler.stats.queue_depth < 3:
+        time.sleep(0.001)
+    threads.append(threading.Thread(target=acquire, args=("b",)))
+    threads[-1].start()
+    for thread in threads:
+        thread.join()
+
+    assert served.index("b") < 3
+
+
+def test_aacquire_waits_on_event_loop():
+    scheduler = RequestScheduler("some", requests_per_minute=600)
+    for _ in range(600):
+        scheduler.acquire("a")
+    ticks = []
+
+    async def tick():
+        while True:
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def acquire():
+        ticker = asyncio.create_task(tick())
+        started_at = time.monotonic()
+        await scheduler.aacquire("a")
+        ticker.cancel()
+        return time.monotonic() - started_at
+
+    with patch("asyncio.to_thread", side_effect=AssertionError):
+        assert asyncio.run(acquire()) == pytest.approx(0.1, abs=0.05)
+    assert len(ticks) > 5
+
+
+def test_async_and_sync_sessions_take_turns():
+    scheduler = RequestScheduler("some", requests_per_minute=600)
+    for _ in range(600):
+        scheduler.acquire("warm-up")
+    served = []
+
+    def acquire(session_id):
+        scheduler.acquire(session_id)
+        served.append(session_id)
+
+    async def aacquire(session_id):
+        await scheduler.aacquire(session_id)
+        served.append(session_id)
+
+    threads = [threading.Thread(target=acquire, args=("a",)) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    while scheduler.stats.queue_depth < 3:
+        time.sleep(0.001)
+    asyncio.run(aacquire("b"))
+    for thread in threads:
+        thread.join()
+
+    assert served.index("b") < 3
+
+
+def test_stats_are_logged(caplog):
+    scheduler = RequestScheduler("some")
+    with caplog.at_level(logging.INFO, logger="askthemall.core.scheduler"):
+        for _ in range(STATS_LOG_INTERVAL):
+            scheduler.acquire("a")
+    assert len(caplog.messages) == 1
+    assert caplog.messages[0].startswith("Scheduler 'some': 100 requests, 0 retries")
+
+
+def test_stream_retries_rate_limited_request():
+    scheduler = RequestScheduler("some")
+    attempts = []
+
+    def request():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise RateLimitError()
+        yield from ["some ", "answer"]
+
+    assert "".join(scheduler.stream("a", 10, request)) == "some answer"
+    assert scheduler.stats.retries == 2
+    assert scheduler.stats.requests == 3
+
+
+def test_stream_gives_up_after_max_retries():
+    scheduler = RequestScheduler("some", max_retries=1)
+
+    def request():
+        raise RateLimitError()
+        yield
+
+    with pytest.raises(RateLimitError):
+        list(scheduler.stream("a", 10, request))
+    assert scheduler.stats.requests == 2
+
+
+def test_stream_does_not_retry_other_errors():
+    scheduler = RequestScheduler("some")
+
+    def request():
+        raise ValueError()
+        yield
+
+    with pytest.raises(ValueError):
+        list(scheduler.stream("a", 10, request))
+    assert scheduler.stats.requests == 1
+
+
+def test_stream_does_not_retry_started_answer():
+    scheduler = RequestScheduler("some")
+
+    def request():
+        yield "some"
+        raise RateLimitError()
+
+    with pytest.raises(RateLimitError):
+        list(scheduler.stream("a", 10, request))
+    assert scheduler.stats.requests == 1
+
+
+def test_call_retries_rate_limited_request():
+    scheduler = RequestScheduler("some")
+    results = iter([RateLimitError(), "some title"])
+
+    def request():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert scheduler.call("a", 10, request) == "some title"
+    assert scheduler.stats.retries == 1
@@ -0,0 +1,105 @@
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+
+from askthemall.core.cache import (
+    STATS_LOG_INTERVAL,
+    LruResponseCache,
+    cache_key,
+    replay,
+)
+
+
+def test_cache_key_ignores_case_and_whitespace():
+    assert cache_key("groq:llama3", ["Some  question"], "What is it?") == cache_key(
+        "groq:llama3", ["some question "], " what is\nit?"
+    )
+
+
+def test_cache_key_depends_on_scope_history_and_question():
+    key = cache_key("groq:llama3", ["some question", "some answer"], "what is it?")
+    assert key != cache_key("groq:gemma", ["some question", "some answer"], "what?")
+    assert key != cache_key("groq:llama3", ["some question"], "what is it?")
+    assert key != cache_key("groq:llama3", ["some questionsome answer"], "what is it?")
+    assert key != cache_key("groq:llama3", ["some question", "some answer"], "what?")
+
+
+@pytest.mark.parametrize(
+    "answer", ["some answer", "  some\n\nlonger answer \n", "", "single"]
+)
+def test_replay(answer):
+    assert "".join(replay(answer)) == answer
+
+
+def test_replay_streams_words():
+    assert list(replay("some longer answer")) == ["some", " longer", " answer"]
+
+
+def test_get_and_put():
+    cache = LruResponseCache()
+    assert cache.get("some key") is None
+    cache.put("some key", "some answer")
+    assert cache.get("some key") == "some answer"
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.size == 1
+
+
+def test_least_recently_used_answer_is_evicted():
+    cache = LruResponseCache(max_size=2)
+    cache.put("a", "answer a")
+    cache.put("b", "answer b")
+    cache.get("a")
+    cache.put("c", "answer c")
+    assert cache.get("b") is None
+    assert cache.get("a") == "answer a"
+    assert cache.get("c") == "answer c"
+
+
+def test_expired_answer_is_a_miss():
+    cache = LruResponseCache(ttl=0)
+    cache.put("some key", "some answer")
+    assert cache.get("some key") is None
+    assert cache.stats.size == 0
+
+
+def test_backend_is_used_on_miss():
+    backend = MagicMock()
+    backend.get.return_value = "some answer"
+    cache = LruResponseCache(backend=backend)
+
+    assert cache.get("some key") == "some answer"
+    assert cache.get("some key") == "some answer"
+
+    backend.get.assert_called_once_with("some key")
+    assert cache.stats.hits == 2
+
+
+def test_put_writes_through_to_backend():
+    backend = MagicMock()
+    cache = LruResponseCache(backend=backend)
+    cache.put("some key", "some answer")
+    backend.put.assert_called_once_with("some key", "some answer")
+
+
+def test_failing_backend_is_a_miss():
+    backend = MagicMock()
+    backend.get.side_effect = ConnectionError("OpenSearch is down")
+    backend.put.side_effect = ConnectionError("OpenSearch is down")
+    cache = LruResponseCache(backend=backend)
+
+    assert cache.get("some key") is None
+    cache.put("some key", "some answer")
+    assert cache.get("some key") == "some answer"
+
+
+def test_stats_are_logged(caplog):
+    cache = LruResponseCache()
+    cache.put("some key", "some answer")
+    with caplog.at_level(logging.INFO, logger="askthemall.core.cache"):
+        for _ in range(STATS_LOG_INTERVAL - 1):
+            cache.get("some key")
+        assert caplog.messages == []
+        cache.get("other key")
+    assert caplog.messages == ["Response cache: 99 hits, 1 misses, 1 answers cached"]
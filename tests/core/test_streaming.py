@@ -0,0 +1,49 @@
+import time
+
+from askthemall.core.streaming import ChunkCoalescer, coalesce
+
+
+def slow(chunks, delay):
+    for chunk in chunks:
+        time.sleep(delay)
+        yield chunk
+
+
+def test_coalesce_passes_first_chunk_right_away():
+    batches = coalesce(["some", " answer", " in", " chunks"], window=10)
+    assert next(batches) == "some"
+    assert list(batches) == [" answer in chunks"]
+
+
+def test_coalesce_skips_empty_chunks():
+    assert list(coalesce(["", "some", "", " answer"], window=10)) == [
+        "some",
+        " answer",
+    ]
+
+
+def test_coalesce_by_size():
+    batches = list(coalesce(["a"] + ["bb"] * 6, window=10, max_size=4))
+    assert batches == ["a", "bbbb", "bbbb", "bbbb"]
+
+
+def test_coalesce_by_size_counts_bytes():
+    assert list(coalesce(["a", "é", "é", "é"], window=10, max_size=4)) == [
+        "a",
+        "éé",
+        "é",
+    ]
+
+
+def test_coalesce_by_window():
+    batches = list(coalesce(slow(["a"] * 10, 0.01), window=0.025, max_size=1000))
+    assert "".join(batches) == "a" * 10
+    assert 3 <= len(batches) <= 6
+
+
+def test_coalescer_flush():
+    coalescer = ChunkCoalescer(window=10)
+    assert coalescer.add("some") == "some"
+    assert coalescer.add(" answer") is None
+    assert coalescer.flush() == " answer"
+    assert coalescer.flush() is None
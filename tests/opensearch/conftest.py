@@ -8,6 +8,7 @@ from askthemall.opensearch import (
     OpenSearchInteractionRepository,
     IndexNames,
 )
+from askthemall.opensearch.migration import OpenSearchIndexMigrator
 
 
 @pytest.fixture(scope="session")
@@ -35,26 +36,39 @@ def index_names():
 
 
 @pytest.fixture(scope="session")
-def chat_bot_repository(client, index_names):
-    return OpenSearchChatBotRepository(client, index_names)
+def chat_bot_repository(client, index_names, index_migrator):
+    return OpenSearchChatBotRepository(
+        client, index_names, index_migrator=index_migrator
+    )
+
+
+@pytest.fixture(scope="session")
+def interaction_repository(client, index_names, index_migrator):
+    return OpenSearchInteractionRepository(
+        client, index_names, index_migrator=index_migrator
+    )
 
 
 @pytest.fixture(scope="session")
-def interaction_repository(client, index_names):
-    return OpenSearchInteractionRepository(client, index_names)
+def chat_repository(client, index_names, index_migrator):
+    return OpenSearchChatRepository(client, index_names, index_migrator=index_migrator)
 
 
 @pytest.fixture(scope="session")
-def chat_repository(client, index_names):
-    return OpenSearchChatRepository(client, index_names)
+def index_migrator(client, index_names):
+    return OpenSearchIndexMigrator(client, index_names.migrations, poll_interval=0.1)
 
 
 @pytest.fixture(scope="session", autouse=True)
-def migration(chat_bot_repository, chat_repository, interaction_repository):
+def migration(
+    chat_bot_repository, chat_repository, interaction_repository, index_migrator
+):
     client = OpenSearchDatabaseMigration(
         chat_bot_repository=chat_bot_repository,
         chat_repository=chat_repository,
         interaction_repository=interaction_repository,
+        index_migrator=index_migrator,
+        background=False,
     )
     client.migrate()
     yield client
@@ -28,3 +28,9 @@ def test_data(opensearch, index_names):
 def test_find_all(chat_bot_repository):
     chat_bots = chat_bot_repository.find_all()
     assert len(chat_bots) == 5
+
+
+def test_save_all(chat_bot_repository):
+    chat_bot_data_list = ChatBotDataFactory.create_batch(3)
+    chat_bot_repository.save_all(chat_bot_data_list)
+    assert len(chat_bot_repository.find_all()) == 8
@@ -0,0 +1,97 @@
+import pytest
+
+from tests.core.persistence import ChatDataFactory, InteractionDataFactory
+
+
+@pytest.fixture(autouse=True)
+def cleanup(client, index_names):
+    yield
+    for index_name in [index_names.chats, index_names.interactions]:
+        client.delete_by_query(index=index_name, body={"query": {"match_all": {}}})
+    client.indices.refresh()
+
+
+@pytest.fixture
+def chats(chat_repository, interaction_repository):
+    chat_data_list = ChatDataFactory.create_batch(15)
+    for chat_data in chat_data_list:
+        chat_repository.save(chat_data)
+        for _ in range(3):
+            interaction_repository.save(
+                InteractionDataFactory.create(
+                    chat_id=chat_data.id,
+                    question="what is opensearch",
+                    chat_bot_id=chat_data.chat_bot_id,
+                    chat_slug=chat_data.slug,
+                    chat_title=chat_data.title,
+                    chat_created_at=chat_data.created_at,
+                )
+            )
+    return sorted(chat_data_list, key=lambda c: c.created_at, reverse=True)
+
+
+def test_search_chats_returns_one_result_per_chat(chat_repository, chats):
+    result = chat_repository.search_chats("opensearch", max_results=10)
+    assert result.total_results == 15
+    assert [c.id for c in result.data] == [c.id for c in chats[:10]]
+
+
+def test_search_chats_paginates(chat_repository, chats):
+    result = chat_repository.search_chats("opensearch", max_results=10, offset=10)
+    assert result.total_results == 15
+    assert [c.id for c in result.data] == [c.id for c in chats[10:]]
+
+
+def test_search_chats_without_matches(chat_repository, chats):
+    result = chat_repository.search_chats("elasticsearch")
+    assert result.total_results == 0
+    assert result.data == []
+
+
+def test_search_chats_matches_prefix(chat_repository, chats):
+    result = chat_repository.search_chats("opens")
+    assert result.total_results == 15
+
+
+def test_search_chats_returns_highlights(chat_repository, chats):
+    result = chat_repository.search_chats("opensearch", max_results=1)
+    chat_id = result.data[0].id
+    assert result.highlights[chat_id] == ["what is **opensearch**"]
+
+
+def test_find_all_by_chat_bot_id_pages_with_cursor(chat_repository):
+    chat_data_list = ChatDataFactory.create_batch(12, chat_bot_id="some_chat_bot_id")
+    chat_repository.save_all(chat_data_list)
+    chat_repository.save(ChatDataFactory.create(chat_bot_id="other_chat_bot_id"))
+    chat_data_list.sort(key=lambda c: (c.created_at, c.id), reverse=True)
+
+    first_page = chat_repository.find_all_by_chat_bot_id(
+        "some_chat_bot_id", max_results=5
+    )
+    second_page = chat_repository.find_all_by_chat_bot_id(
+        "some_chat_bot_id", max_results=5, search_after=first_page.cursor
+    )
+    last_page = chat_repository.find_all_by_chat_bot_id(
+        "some_chat_bot_id", max_results=5, search_after=second_page.cursor
+    )
+
+    assert first_page.total_results == 12
+    assert [c.id for c in first_page.data] == [c.id for c in chat_data_list[:5]]
+    assert [c.id for c in second_page.data] == [c.id for c in chat_data_list[5:10]]
+    assert [c.id for c in last_page.data] == [c.id for c in chat_data_list[10:]]
+
+
+def test_iter_all_with_source_filter(chat_repository):
+    chat_data = ChatDataFactory.create(summary="some summary")
+    chat_repository.save(chat_data)
+    result = [
+        c
+        for c in chat_repository.iter_all(
+            source=["id", "slug", "title", "created_at", "chat_bot_id"]
+        )
+        if c.id == chat_data.id
+    ]
+    assert len(result) == 1
+    assert result[0].title == chat_data.title
+    assert result[0].summary is None
+    chat_repository.delete_by_id(chat_data.id)
@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+ALIAS = "askthemall_test_migrated"
+
+
+@pytest.fixture
+def legacy_index(client):
+    client.indices.create(index=f"{ALIAS}_v1", body={})
+    client.indices.put_alias(index=f"{ALIAS}_v1", name=ALIAS)
+    for i in range(25):
+        client.index(index=ALIAS, id=str(i), body={"id": str(i), "name": f"doc {i}"})
+    client.indices.refresh(index=ALIAS)
+    yield
+    client.indices.delete(index=f"{ALIAS}_v*")
+    client.delete_by_query(
+        index="askthemall_test_migrations",
+        body={"query": {"term": {"alias": ALIAS}}},
+        refresh=True,
+    )
+
+
+def test_get_current_index(index_migrator, legacy_index):
+    assert index_migrator.get_current_index(ALIAS) == (f"{ALIAS}_v1", 1)
+
+
+def test_upgrade_moves_alias_to_new_version(client, index_migrator, legacy_index):
+    body = {"mappings": {"properties": {"name": {"type": "keyword"}}}}
+
+    index_migrator.upgrade(ALIAS, 2, body)
+
+    assert list(client.indices.get_alias(name=ALIAS).keys()) == [f"{ALIAS}_v2"]
+    assert client.count(index=ALIAS)["count"] == 25
+    mapping = client.indices.get_mapping(index=f"{ALIAS}_v2")
+    assert mapping[f"{ALIAS}_v2"]["mappings"]["properties"]["name"] == {
+        "type": "keyword"
+    }
+    assert index_migrator.get_applied_versions(ALIAS) == [2]
+
+
+def test_upgrade_records_current_version(index_migrator, legacy_index):
+    index_migrator.upgrade(ALIAS, 1, {})
+    index_migrator.upgrade(ALIAS, 1, {})
+    assert index_migrator.get_applied_versions(ALIAS) == [1]
+
+
+def test_record_applied(client, index_migrator):
+    assert not index_migrator.is_applied("askthemall_test_data_migration")
+
+    index_migrator.record_applied("askthemall_test_data_migration")
+
+    assert index_migrator.is_applied("askthemall_test_data_migration")
+    client.delete(
+        index="askthemall_test_migrations",
+        id="askthemall_test_data_migration",
+        refresh=True,
+    )
+
+
+def test_upgrade_takes_over_expired_migration(client, index_migrator, legacy_index):
+    client.index(
+        index="askthemall_test_migrations",
+        id=f"{ALIAS}_v2",
+        body={
+            "alias": ALIAS,
+            "version": 2,
+            "status": "running",
+            "lease_expires_at": datetime.now(timezone.utc) - timedelta(minutes=1),
+        },
+        refresh=True,
+    )
+
+    index_migrator.upgrade(ALIAS, 2, {})
+
+    assert list(client.indices.get_alias(name=ALIAS).keys()) == [f"{ALIAS}_v2"]
+    assert index_migrator.get_applied_versions(ALIAS) == [2]
+
+
+def test_upgrade_skips_running_migration(client, index_migrator, legacy_index):
+    client.index(
+        index="askthemall_test_migrations",
+        id=f"{ALIAS}_v2",
+        body={
+            "alias": ALIAS,
+            "version": 2,
+            "status": "running",
+            "lease_expires_at": datetime.now(timezone.utc) + timedelta(minutes=1),
+        },
+        refresh=True,
+    )
+
+    index_migrator.upgrade(ALIAS, 2, {})
+
+    assert list(client.indices.get_alias(name=ALIAS).keys()) == [f"{ALIAS}_v1"]
+
+
+def test_upgrade_unblocks_writes(client, index_migrator, legacy_index):
+    index_migrator.upgrade(ALIAS, 2, {})
+
+    settings = client.indices.get_settings(index=f"{ALIAS}_v1")
+    assert "blocks" not in settings[f"{ALIAS}_v1"]["settings"]["index"]
+
+
+def test_upgrade_replays_recorded_deletions(client, index_migrator, legacy_index):
+    # as if the document was copied before it was deleted
+    client.indices.create(index=f"{ALIAS}_v2", body={})
+    client.index(index=f"{ALIAS}_v2", id="0", body={"id": "0", "name": "doc 0"})
+    client.delete(index=ALIAS, id="0", refresh=True)
+    index_migrator.record_deletion(ALIAS, {"ids": {"values": ["0"]}})
+
+    index_migrator.upgrade(ALIAS, 2, {})
+
+    assert client.count(index=ALIAS)["count"] == 24
+    assert not client.exists(index=ALIAS, id="0")
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from tests.core.persistence import InteractionDataFactory
+
+
+@pytest.fixture(autouse=True)
+def cleanup(client, index_names):
+    yield
+    client.delete_by_query(
+        index=index_names.interactions, body={"query": {"match_all": {}}}
+    )
+    client.indices.refresh()
+
+
+@pytest.fixture
+def interactions(interaction_repository):
+    asked_at = datetime(2025, 1, 1)
+    interaction_data_list = [
+        InteractionDataFactory.create(
+            chat_id="some_chat_id", asked_at=asked_at + timedelta(minutes=i)
+        )
+        for i in range(25)
+    ]
+    for interaction_data in interaction_data_list:
+        interaction_repository.save(interaction_data)
+    interaction_repository.save(InteractionDataFactory.create(chat_id="other_chat_id"))
+    return interaction_data_list
+
+
+def test_find_all_by_chat_id_is_not_limited_to_first_page(
+    interaction_repository, interactions
+):
+    result = interaction_repository.find_all_by_chat_id("some_chat_id")
+    assert [i.id for i in result] == [i.id for i in interactions]
+
+
+def test_iter_all_by_chat_id(interaction_repository, interactions):
+    result = interaction_repository.iter_all_by_chat_id("some_chat_id", page_size=10)
+    assert [i.id for i in result] == [i.id for i in interactions]
+
+
+def test_iter_all_by_chat_id_newest_first(interaction_repository, interactions):
+    result = interaction_repository.iter_all_by_chat_id(
+        "some_chat_id", page_size=10, newest_first=True
+    )
+    assert [i.id for i in result] == [i.id for i in reversed(interactions)]
+
+
+def test_find_page_by_chat_id(interaction_repository, interactions):
+    first_page = interaction_repository.find_page_by_chat_id("some_chat_id", limit=10)
+    second_page = interaction_repository.find_page_by_chat_id(
+        "some_chat_id", after=first_page.cursor, limit=10
+    )
+    assert first_page.total_results == 25
+    assert [i.id for i in first_page.data] == [i.id for i in interactions[:10]]
+    assert [i.id for i in second_page.data] == [i.id for i in interactions[10:20]]
+
+
+def test_find_page_by_chat_id_newest_first(interaction_repository, interactions):
+    page = interaction_repository.find_page_by_chat_id(
+        "some_chat_id", limit=5, newest_first=True
+    )
+    assert [i.id for i in page.data] == [i.id for i in reversed(interactions[20:])]
+
+
+def test_get_answer_stats(interaction_repository, interactions):
+    interaction_repository.save_all(
+        [
+            InteractionDataFactory.create(
+                answered_by="some_chat_bot_id",
+                first_chunk_latency=float(i),
+                output_tokens=100,
+                tokens_per_second=10.0,
+            )
+            for i in range(1, 11)
+        ]
+        + [
+            InteractionDataFactory.create(
+                answered_by="some_chat_bot_id",
+                first_chunk_latency=0.0,
+                output_tokens=100,
+                tokens_per_second=1000.0,
+                cached=True,
+            ),
+            InteractionDataFactory.create(
+                answered_by="some_chat_bot_id",
+                first_chunk_latency=5.5,
+                tokens_per_second=1000.0,
+            ),
+        ]
+    )
+
+    stats = interaction_repository.get_answer_stats()
+
+    assert len(stats) == 1
+    assert stats[0].chat_bot_id == "some_chat_bot_id"
+    assert stats[0].answer_count == 11
+    assert stats[0].first_chunk_latency_p50 == pytest.approx(5.5, abs=0.5)
+    assert stats[0].first_chunk_latency_p95 == pytest.approx(9.5, abs=0.5)
+    assert stats[0].tokens_per_second_p50 == pytest.approx(10.0)
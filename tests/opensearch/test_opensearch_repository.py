@@ -6,6 +6,7 @@ from _pytest.fixtures import fixture
 from opensearchpy import NotFoundError
 
 from askthemall.opensearch import OpenSearchRepository
+from askthemall.opensearch.bulk import OpenSearchBulkWriter
 
 
 @dataclass
@@ -15,8 +16,8 @@ class DummyData:
 
 
 class DummyRepository(OpenSearchRepository[DummyData]):
-    def __init__(self, client):
-        super().__init__(client, "test")
+    def __init__(self, client, bulk_writer=None):
+        super().__init__(client, "test", bulk_writer)
 
     def _to_data(self, hit):
         return DummyData(**hit)
@@ -49,6 +50,25 @@ def test_save(client, dummy_repository):
     assert doc["_source"]["name"] == test_data.name
 
 
+def test_save_with_bulk_writer(client, dummy_repository):
+    repository = DummyRepository(client, OpenSearchBulkWriter(client, refresh="true"))
+    test_data = DummyDataFactory.create_batch(3)
+    for test in test_data:
+        repository.save(test)
+    assert repository.flush() == 3
+    assert len(dummy_repository.find_all()) == 3
+
+
+def test_delete_by_id_with_bulk_writer(client, dummy_repository):
+    repository = DummyRepository(client, OpenSearchBulkWriter(client, refresh="true"))
+    test_data = DummyDataFactory.create()
+    repository.save(test_data)
+    repository.delete_by_id(test_data.id)
+    repository.flush()
+    with pytest.raises(NotFoundError):
+        client.get(index="test", id=test_data.id)
+
+
 def test_get_by_id(client, dummy_repository):
     test_data = DummyDataFactory.create()
     client.index(index="test", body=test_data.__dict__, id=test_data.id, refresh=True)
@@ -62,6 +82,37 @@ def test_find_all(client, dummy_repository):
     assert len(dummy_repository.find_all()) == 5
 
 
+def test_find_all_is_not_limited_to_first_page(client, dummy_repository):
+    test_data = DummyDataFactory.create_batch(150)
+    client.bulk(
+        body=[
+            line
+            for test in test_data
+            for line in [{"index": {"_index": "test", "_id": test.id}}, test.__dict__]
+        ],
+        refresh=True,
+    )
+    assert len(dummy_repository.find_all()) == 150
+
+
+def test_iter_all(client, dummy_repository):
+    test_data = DummyDataFactory.create_batch(5)
+    for test in test_data:
+        client.index(index="test", body=test.__dict__, id=test.id, refresh=True)
+    result = list(dummy_repository.iter_all(page_size=2))
+    assert sorted(result, key=lambda d: d.id) == sorted(test_data, key=lambda d: d.id)
+
+
+def test_iter_sources_with_source_filter(client, dummy_repository):
+    test_data = DummyDataFactory.create_batch(3)
+    for test in test_data:
+        client.index(index="test", body=test.__dict__, id=test.id, refresh=True)
+    result = list(dummy_repository.iter_sources(page_size=2, source=["id"]))
+    assert sorted(result, key=lambda d: d["id"]) == sorted(
+        [{"id": test.id} for test in test_data], key=lambda d: d["id"]
+    )
+
+
 def test_delete_by_id(client, dummy_repository):
     test_data = DummyDataFactory.create()
     client.index(index="test", body=test_data.__dict__, id=test_data.id, refresh=True)
@@ -69,3 +120,11 @@ def test_delete_by_id(client, dummy_repository):
     dummy_repository.delete_by_id(test_data.id)
     with pytest.raises(NotFoundError):
         client.get(index="test", id=test_data.id)
+
+
+def test_find_all_in_single_page(client, dummy_repository):
+    test_data = DummyDataFactory.create_batch(3)
+    for test in test_data:
+        client.index(index="test", body=test.__dict__, id=test.id, refresh=True)
+    result = dummy_repository.find_all()
+    assert sorted(result, key=lambda d: d.id) == sorted(test_data, key=lambda d: d.id)
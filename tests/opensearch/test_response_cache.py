@@ -0,0 +1,24 @@
+import pytest
+
+from askthemall.opensearch.cache import OpenSearchResponseCache
+
+
+@pytest.fixture
+def response_cache(client, index_names):
+    yield OpenSearchResponseCache(client, index_names.responses)
+    client.indices.delete(index=index_names.responses)
+
+
+def test_get_and_put(response_cache):
+    assert response_cache.get("some key") is None
+    response_cache.put("some key", "some answer")
+    assert response_cache.get("some key") == "some answer"
+
+
+def test_expired_answer_is_a_miss(client, index_names):
+    response_cache = OpenSearchResponseCache(client, index_names.responses, ttl=0)
+    try:
+        response_cache.put("some key", "some answer")
+        assert response_cache.get("some key") is None
+    finally:
+        client.indices.delete(index=index_names.responses)
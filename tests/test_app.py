@@ -0,0 +1,43 @@
+from unittest.mock import patch, MagicMock
+
+import pytest
+
+from askthemall.app import Bootstrap, Readiness
+
+
+@pytest.fixture
+def container():
+    return MagicMock()
+
+
+@pytest.fixture
+def init_mock(container):
+    with patch("askthemall.app.containers.init") as init_mock:
+        init_mock.return_value = container
+        yield init_mock
+
+
+def test_start_once(init_mock, container):
+    bootstrap = Bootstrap()
+
+    assert bootstrap.start() is Readiness.READY
+    assert bootstrap.start() is Readiness.READY
+
+    init_mock.assert_called_once()
+    container.database_migration.return_value.migrate.assert_called_once()
+    container.chat_bot_registry.return_value.register.assert_called_once()
+    assert bootstrap.container is container
+
+
+def test_start_failure_is_retried(init_mock, container):
+    migrate = container.database_migration.return_value.migrate
+    migrate.side_effect = [ConnectionError("OpenSearch is down"), None]
+    bootstrap = Bootstrap()
+
+    assert bootstrap.start() is Readiness.FAILED
+    assert isinstance(bootstrap.error, ConnectionError)
+    assert bootstrap.start() is Readiness.READY
+    assert bootstrap.error is None
+
+    init_mock.assert_called_once()
+    assert migrate.call_count == 2
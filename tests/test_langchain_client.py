@@ -1,9 +1,24 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest.mock import patch, MagicMock
 
 import pytest
-
-from askthemall.core.client import ChatInteraction
-from askthemall.lc import LangChainClient, LangChainSession
+from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+from askthemall.core.cache import LruResponseCache
+from askthemall.core.client import (
+    ChatInteraction,
+    ChatSummary,
+    HistoryPolicy,
+    TokenUsage,
+)
+from askthemall.core.scheduler import RequestScheduler
+from askthemall.lc import LangChainClient, LangChainSession, create_llm
 
 
 @pytest.fixture
@@ -74,6 +89,14 @@ def test_client_name_property(client):
     assert client.name == "Some name"
 
 
+def test_client_type_property(client):
+    assert client.client_type == "some_llm_type"
+
+
+def test_client_model_name_property(client):
+    assert client.model_name == "some_model_name"
+
+
 def test_client_start_session(
     client, memory_mock, llm_factory_mock, llm_mock, conversation_chain_class_mock
 ):
@@ -132,3 +155,346 @@ def test_ask_question(session, memory_mock, conversation_chain_mock):
     answer = session.ask("some_question")
     conversation_chain_mock.predict.assert_called_once_with(input="some_question")
     assert answer == "some_answer"
+
+
+def test_client_sessions_share_llm(client, llm_factory_mock, llm_mock):
+    client.start_session()
+    client.restore_session([])
+
+    assert client.llm is llm_mock
+    llm_factory_mock.assert_called_once_with(
+        "some_llm_type", "some_model_name", "some_api_key"
+    )
+
+
+def test_client_llm_is_created_once_across_threads(client, llm_factory_mock):
+    llm_factory_mock.side_effect = lambda *args: time.sleep(0.01) or MagicMock()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        llms = list(executor.map(lambda _: client.llm, range(8)))
+
+    assert all(llm is llms[0] for llm in llms)
+    llm_factory_mock.assert_called_once()
+
+
+def test_create_llm():
+    llm = create_llm("groq", "some_model_name", "some_api_key")
+    assert type(llm).__name__ == "ChatGroq"
+    assert llm.model_name == "some_model_name"
+
+
+def test_create_llm_with_unsupported_type():
+    with pytest.raises(ValueError):
+        create_llm("some_llm_type", "some_model_name", "some_api_key")
+
+
+def test_aask_streams_answer():
+    llm = FakeListChatModel(responses=["some answer", '"Some title"'])
+    session = LangChainSession(llm)
+
+    async def ask():
+        chunks = [chunk async for chunk in session.aask("some question")]
+        return "".join(chunks), await session.asuggest_title("some question")
+
+    answer, title = asyncio.run(ask())
+
+    assert answer == "some answer"
+    assert title == "Some title"
+
+
+def test_suggest_title_does_not_use_history():
+    prompts = []
+
+    def llm(prompt_value):
+        prompts.append(prompt_value.to_messages())
+        return '"Some title"'
+
+    session = LangChainSession(
+        RunnableLambda(llm),
+        history=[ChatInteraction(question="some question", answer="some answer")],
+    )
+
+    assert session.suggest_title("other question") == "Some title"
+    list(session.ask("other question"))
+
+    assert len(prompts[0]) == 1
+    assert prompts[0][0].content.endswith("other question")
+    assert len(prompts[1]) == 3
+
+
+class RecordingLlm:
+    def __init__(self, answer="some answer"):
+        self.prompts = []
+        self.__answer = answer
+
+    def __call__(self, prompt_value):
+        self.prompts.append(prompt_value.to_messages())
+        return self.__answer
+
+
+def history(count):
+    """The interactions of a chat, newest first, as sessions are restored from."""
+    return [
+        ChatInteraction(question=f"question {i}", answer=f"answer {i}")
+        for i in reversed(range(count))
+    ]
+
+
+class CountingHistory:
+    def __init__(self, interactions):
+        self.read = 0
+        self.__interactions = interactions
+
+    def __iter__(self):
+        for interaction in self.__interactions:
+            self.read += 1
+            yield interaction
+
+
+def test_restore_session_keeps_latest_turns():
+    llm = RecordingLlm()
+    session = LangChainSession(
+        RunnableLambda(llm), history=history(5), policy=HistoryPolicy(max_turns=2)
+    )
+
+    list(session.ask("other question"))
+
+    assert [m.content for m in llm.prompts[0]] == [
+        "question 3",
+        "answer 3",
+        "question 4",
+        "answer 4",
+        "other question",
+    ]
+    assert session.summary is None
+
+
+def test_ask_trims_history():
+    llm = RecordingLlm()
+    session = LangChainSession(RunnableLambda(llm), policy=HistoryPolicy(max_turns=1))
+
+    list(session.ask("question 1"))
+    list(session.ask("question 2"))
+    list(session.ask("question 3"))
+
+    assert [m.content for m in llm.prompts[2]] == [
+        "question 2",
+        "some answer",
+        "question 3",
+    ]
+
+
+def test_history_size_includes_summary():
+    session = LangChainSession(
+        RunnableLambda(RecordingLlm()),
+        history=history(5),
+        policy=HistoryPolicy(max_turns=2, summarize=True),
+        summary=ChatSummary(text="some summary", interaction_count=3),
+    )
+
+    assert session.history_size == len(
+        "Summary of the earlier conversation: some summary"
+    ) + len("question 3answer 3question 4answer 4")
+
+
+def test_restore_session_summarizes_left_out_turns():
+    llm = RecordingLlm("some summary")
+    session = LangChainSession(
+        RunnableLambda(llm),
+        history=history(5),
+        policy=HistoryPolicy(max_turns=2, summarize=True),
+    )
+
+    assert session.summary == ChatSummary(text="some summary", interaction_count=3)
+    assert "question 2" in llm.prompts[0][0].content
+    assert "question 3" not in llm.prompts[0][0].content
+    list(session.ask("other question"))
+    assert llm.prompts[1][0].content.endswith("some summary")
+    assert len(llm.prompts[1]) == 6
+
+
+def test_restore_session_reuses_summary():
+    llm = RecordingLlm()
+    summary = ChatSummary(text="some summary", interaction_count=3)
+    session = LangChainSession(
+        RunnableLambda(llm),
+        history=history(5),
+        policy=HistoryPolicy(max_turns=2, summarize=True),
+        summary=summary,
+    )
+
+    assert session.summary is summary
+    assert llm.prompts == []
+
+
+def test_restore_session_extends_summary():
+    llm = RecordingLlm("new summary")
+    session = LangChainSession(
+        RunnableLambda(llm),
+        history=history(6),
+        policy=HistoryPolicy(max_turns=2, summarize=True),
+        summary=ChatSummary(text="some summary", interaction_count=3),
+    )
+
+    assert session.summary == ChatSummary(text="new summary", interaction_count=4)
+    prompt = llm.prompts[0][0].content
+    assert "some summary" in prompt
+    assert "question 3" in prompt
+    assert "question 2" not in prompt
+
+
+def test_restore_session_reads_only_window_and_unsummarized_turns():
+    latest = CountingHistory(history(100))
+    session = LangChainSession(
+        RunnableLambda(RecordingLlm("new summary")),
+        history=latest,
+        history_count=100,
+        policy=HistoryPolicy(max_turns=2, summarize=True),
+        summary=ChatSummary(text="some summary", interaction_count=97),
+    )
+
+    assert session.summary == ChatSummary(text="new summary", interaction_count=98)
+    assert latest.read == 3
+
+
+def test_restore_session_without_summary_reads_only_window():
+    latest = CountingHistory(history(100))
+    llm = RecordingLlm()
+    session = LangChainSession(
+        RunnableLambda(llm),
+        history=latest,
+        history_count=100,
+        policy=HistoryPolicy(max_turns=2),
+    )
+
+    list(session.ask("other question"))
+
+    assert latest.read == 3
+    assert [m.content for m in llm.prompts[0]][:2] == ["question 98", "answer 98"]
+
+
+def test_restore_session_follows_narrower_window_than_summary():
+    llm = RecordingLlm()
+    session = LangChainSession(
+        RunnableLambda(llm),
+        history=history(5)[:1],
+        history_count=5,
+        policy=HistoryPolicy(max_turns=2, summarize=True),
+        summary=ChatSummary(text="some summary", interaction_count=4),
+    )
+
+    list(session.ask("other question"))
+
+    assert llm.prompts[0][0].content.endswith("some summary")
+    assert [m.content for m in llm.prompts[0][1:]] == [
+        "question 4",
+        "answer 4",
+        "other question",
+    ]
+
+
+def test_restore_session_truncates_when_summary_fails():
+    def failing_llm(prompt_value):
+        raise RuntimeError("some error")
+
+    session = LangChainSession(
+        RunnableLambda(failing_llm),
+        history=history(6),
+        policy=HistoryPolicy(max_turns=2, summarize=True),
+        summary=ChatSummary(text="some summary", interaction_count=3),
+    )
+
+    assert session.summary == ChatSummary(text="some summary", interaction_count=3)
+
+
+def test_restore_session_without_summary_when_summary_fails():
+    def failing_llm(prompt_value):
+        raise RuntimeError("some error")
+
+    session = LangChainSession(
+        RunnableLambda(failing_llm),
+        history=history(5),
+        policy=HistoryPolicy(max_turns=2, summarize=True),
+    )
+
+    assert session.summary is None
+
+
+def test_ask_replays_cached_answer():
+    llm = RecordingLlm()
+    cache = LruResponseCache()
+    first_session = LangChainSession(
+        RunnableLambda(llm), cache=cache, cache_scope="some_id:some_model"
+    )
+    second_session = LangChainSession(
+        RunnableLambda(llm), cache=cache, cache_scope="some_id:some_model"
+    )
+
+    assert "".join(first_session.ask("Some question")) == "some answer"
+    assert not first_session.answered_from_cache
+    assert list(second_session.ask("some  question")) == ["some", " answer"]
+    assert second_session.answered_from_cache
+    list(second_session.ask("other question"))
+    assert not second_session.answered_from_cache
+
+    assert len(llm.prompts) == 2
+    # the cached interaction is part of the history of the second session
+    assert [m.content for m in llm.prompts[1]] == [
+        "some  question",
+        "some answer",
+        "other question",
+    ]
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 2
+
+
+def test_aask_replays_cached_answer():
+    llm = RecordingLlm()
+    cache = LruResponseCache()
+
+    async def ask():
+        session = LangChainSession(RunnableLambda(llm), cache=cache)
+        return "".join([chunk async for chunk in session.aask("some question")])
+
+    assert asyncio.run(ask()) == "some answer"
+    assert asyncio.run(ask()) == "some answer"
+    assert len(llm.prompts) == 1
+
+
+def test_ask_is_scheduled():
+    scheduler = RequestScheduler("some", max_retries=1)
+    session = LangChainSession(RunnableLambda(RecordingLlm()), scheduler=scheduler)
+
+    assert "".join(session.ask("some question")) == "some answer"
+    assert session.suggest_title("some question") == "some answer"
+    assert scheduler.stats.requests == 2
+
+
+class UsageReportingLlm(BaseChatModel):
+    @property
+    def _llm_type(self) -> str:
+        return "usage-reporting"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        return ChatResult(generations=[ChatGeneration(message=AIMessage("answer"))])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        yield ChatGenerationChunk(message=AIMessageChunk(content="some "))
+        yield ChatGenerationChunk(
+            message=AIMessageChunk(
+                content="answer",
+                usage_metadata={
+                    "input_tokens": 10,
+                    "output_tokens": 2,
+                    "total_tokens": 12,
+                },
+            )
+        )
+
+
+def test_ask_reports_usage():
+    session = LangChainSession(UsageReportingLlm())
+    assert session.usage is None
+
+    assert "".join(session.ask("some question")) == "some answer"
+    assert session.usage == TokenUsage(input_tokens=10, output_tokens=2)
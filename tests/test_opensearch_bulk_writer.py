@@ -0,0 +1,215 @@
+import time
+from unittest.mock import MagicMock
+
+import pytest
+from opensearchpy import TransportError
+
+from askthemall.opensearch.bulk import BulkWriteError, OpenSearchBulkWriter
+
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+    client.bulk.return_value = {"errors": False, "items": []}
+    return client
+
+
+@pytest.fixture
+def writer(client):
+    writer = OpenSearchBulkWriter(
+        client, flush_size=3, flush_interval=60, refresh="wait_for"
+    )
+    yield writer
+    writer.close()
+
+
+def test_flush_sends_pending_operations_in_order(client, writer):
+    writer.index("chats", "1", {"id": "1"})
+    writer.delete("chats", "2")
+
+    assert writer.flush() == 2
+
+    client.bulk.assert_called_once_with(
+        body=[
+            {"index": {"_index": "chats", "_id": "1"}},
+            {"id": "1"},
+            {"delete": {"_index": "chats", "_id": "2"}},
+        ],
+        refresh="wait_for",
+    )
+
+
+def test_flush_without_pending_operations(client, writer):
+    assert writer.flush() == 0
+    client.bulk.assert_not_called()
+
+
+def test_index_copies_document(client, writer):
+    document = {"id": "1", "title": "some title"}
+    writer.index("chats", "1", document)
+    document["title"] = "other title"
+
+    writer.flush()
+
+    assert client.bulk.call_args.kwargs["body"][1] == {
+        "id": "1",
+        "title": "some title",
+    }
+
+
+def test_worker_flushes_when_flush_size_is_reached(client, writer):
+    for doc_id in ["1", "2", "3"]:
+        writer.index("interactions", doc_id, {"id": doc_id})
+
+    deadline = time.monotonic() + 5
+    while not client.bulk.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert len(client.bulk.call_args.kwargs["body"]) == 6
+
+
+def test_worker_flushes_after_flush_interval(client):
+    writer = OpenSearchBulkWriter(client, flush_size=100, flush_interval=0.05)
+    writer.index("interactions", "1", {"id": "1"})
+
+    deadline = time.monotonic() + 5
+    while not client.bulk.called and time.monotonic() < deadline:
+        time.sleep(0.01)
+    writer.close()
+
+    client.bulk.assert_called_once()
+
+
+def test_close_flushes_and_rejects_new_operations(client, writer):
+    writer.index("chats", "1", {"id": "1"})
+    writer.close()
+
+    client.bulk.assert_called_once()
+    with pytest.raises(RuntimeError):
+        writer.index("chats", "2", {"id": "2"})
+
+
+def test_flush_retries_rejected_operations(client):
+    client.bulk.side_effect = [
+        {
+            "errors": True,
+            "items": [
+                {"index": {"_id": "1", "status": 201}},
+                {"index": {"_id": "2", "status": 429, "error": "rejected"}},
+            ],
+        },
+        {"errors": False, "items": [{"index": {"_id": "2", "status": 201}}]},
+    ]
+    writer = OpenSearchBulkWriter(client, flush_interval=60, retry_backoff=0)
+    writer.index("chats", "1", {"id": "1"})
+    writer.index("chats", "2", {"id": "2"})
+
+    assert writer.flush() == 2
+
+    assert client.bulk.call_args.kwargs["body"] == [
+        {"index": {"_index": "chats", "_id": "2"}},
+        {"id": "2"},
+    ]
+    assert writer.failed == 0
+    writer.close()
+
+
+def test_flush_retries_unavailable_cluster(client):
+    client.bulk.side_effect = [
+        TransportError(503, "unavailable"),
+        {"errors": False, "items": []},
+    ]
+    writer = OpenSearchBulkWriter(client, flush_interval=60, retry_backoff=0)
+    writer.index("chats", "1", {"id": "1"})
+
+    assert writer.flush() == 1
+
+    assert client.bulk.call_count == 2
+    writer.close()
+
+
+def test_raise_failures_reports_persistent_failures(client):
+    client.bulk.return_value = {
+        "errors": True,
+        "items": [{"index": {"_id": "1", "status": 429, "error": "rejected"}}],
+    }
+    writer = OpenSearchBulkWriter(
+        client, flush_interval=60, max_retries=2, retry_backoff=0
+    )
+    writer.index("chats", "1", {"id": "1"})
+
+    assert writer.flush() == 1
+    with pytest.raises(BulkWriteError) as e:
+        writer.raise_failures()
+
+    assert client.bulk.call_count == 3
+    assert e.value.failed == 1
+    assert e.value.errors == [{"op_type": "index", "_id": "1", "error": "rejected"}]
+    assert writer.failed == 1
+    writer.raise_failures()
+    writer.close()
+
+
+def test_flush_is_not_failed_by_earlier_failures(client):
+    client.bulk.side_effect = [
+        {
+            "errors": True,
+            "items": [{"index": {"_id": "1", "status": 400, "error": "mapping"}}],
+        },
+        {"errors": False, "items": [{"delete": {"_id": "2", "status": 200}}]},
+    ]
+    writer = OpenSearchBulkWriter(client, flush_interval=60, retry_backoff=0)
+    writer.index("chats", "1", {"id": "1"})
+    writer.flush()
+    writer.delete("chats", "2")
+
+    assert writer.flush() == 1
+
+    with pytest.raises(BulkWriteError):
+        writer.close()
+
+
+def test_close_raises_unreported_failures(client):
+    client.bulk.return_value = {
+        "errors": True,
+        "items": [{"index": {"_id": "1", "status": 400, "error": "mapping"}}],
+    }
+    writer = OpenSearchBulkWriter(client, flush_interval=60, retry_backoff=0)
+    writer.index("chats", "1", {"id": "1"})
+
+    with pytest.raises(BulkWriteError):
+        writer.close()
+
+
+def test_flush_does_not_retry_invalid_operations(client):
+    client.bulk.return_value = {
+        "errors": True,
+        "items": [{"index": {"_id": "1", "status": 400, "error": "mapping"}}],
+    }
+    writer = OpenSearchBulkWriter(client, flush_interval=60, retry_backoff=0)
+    writer.index("chats", "1", {"id": "1"})
+    writer.flush()
+
+    with pytest.raises(BulkWriteError):
+        writer.raise_failures()
+
+    client.bulk.assert_called_once()
+    writer.close()
+
+
+def test_flush_retries_blocked_operations(client):
+    blocked = {"type": "cluster_block_exception", "reason": "index write (api)"}
+    client.bulk.side_effect = [
+        {
+            "errors": True,
+            "items": [{"index": {"_id": "1", "status": 403, "error": blocked}}],
+        },
+        {"errors": False, "items": [{"index": {"_id": "1", "status": 201}}]},
+    ]
+    writer = OpenSearchBulkWriter(client, flush_interval=60, retry_backoff=0)
+    writer.index("chats", "1", {"id": "1"})
+
+    assert writer.flush() == 1
+
+    assert client.bulk.call_count == 2
+    writer.close()
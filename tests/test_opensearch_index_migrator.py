@@ -0,0 +1,117 @@
+import json
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from askthemall.opensearch.migration import OpenSearchIndexMigrator
+
+
+def stats(global_checkpoints):
+    return {
+        "indices": {
+            "chats_v1": {
+                "shards": {
+                    str(shard): [
+                        {
+                            "routing": {"primary": True},
+                            "seq_no": {
+                                "global_checkpoint": checkpoint,
+                                "max_seq_no": checkpoint,
+                            },
+                        },
+                        {
+                            "routing": {"primary": False},
+                            "seq_no": {"global_checkpoint": 0, "max_seq_no": 0},
+                        },
+                    ]
+                    for shard, checkpoint in enumerate(global_checkpoints)
+                }
+            }
+        }
+    }
+
+
+@pytest.fixture
+def client():
+    client = MagicMock()
+    client.indices.get_alias.return_value = {"chats_v1": {}}
+    client.indices.exists.return_value = False
+    client.indices.stats.side_effect = [
+        stats([10, 12]),
+        stats([20, 25]),
+        stats([30, 31]),
+        stats([40, 40]),
+    ]
+    client.reindex.return_value = {"task": "some_task"}
+    client.search.return_value = {"aggregations": {"started_at": {"value": None}}}
+    return client
+
+
+def reindex_queries(client):
+    return [
+        reindex.kwargs["body"]["source"].get("query")
+        for reindex in client.reindex.call_args_list
+    ]
+
+
+def completed(total):
+    return {"completed": True, "response": {"total": total}}
+
+
+@patch("askthemall.opensearch.migration.scan", return_value=[])
+def test_upgrade_catches_up_by_sequence_number(scan, client):
+    client.tasks.get.side_effect = [
+        completed(5000),
+        completed(3000),
+        completed(10),
+        completed(2),
+    ]
+    OpenSearchIndexMigrator(client, "migrations").upgrade("chats", 2, {})
+
+    assert reindex_queries(client) == [
+        None,
+        {"range": {"_seq_no": {"gt": 10}}},
+        {"range": {"_seq_no": {"gt": 20}}},
+        {"range": {"_seq_no": {"gt": 30}}},
+    ]
+    calls = [name for name, _, _ in client.mock_calls]
+    blocked_at = [
+        i
+        for i, call in enumerate(client.mock_calls)
+        if call[0] == "indices.put_settings"
+        and call.kwargs["body"] == {"index.blocks.write": True}
+    ]
+    reindexed_at = [i for i, name in enumerate(calls) if name == "reindex"]
+    # only the last catch-up runs with writes blocked
+    assert len(blocked_at) == 1
+    assert reindexed_at[2] < blocked_at[0] < reindexed_at[3]
+    client.indices.update_aliases.assert_called_once()
+
+
+@patch("askthemall.opensearch.migration.scan")
+def test_upgrade_replays_recorded_deletions(scan, client):
+    client.tasks.get.return_value = completed(0)
+    scan.side_effect = [
+        [{"_source": {"query": json.dumps({"ids": {"values": ["1"]}})}}],
+        [],
+    ]
+
+    OpenSearchIndexMigrator(client, "migrations").upgrade("chats", 2, {})
+
+    client.delete_by_query.assert_any_call(
+        index="chats_v2",
+        body={"query": {"ids": {"values": ["1"]}}},
+        conflicts="proceed",
+    )
+
+
+def test_record_deletion():
+    client = MagicMock()
+
+    OpenSearchIndexMigrator(client, "migrations").record_deletion(
+        "chats", {"ids": {"values": ["1"]}}
+    )
+
+    body = client.index.call_args.kwargs["body"]
+    assert body["alias"] == "chats"
+    assert json.loads(body["query"]) == {"ids": {"values": ["1"]}}
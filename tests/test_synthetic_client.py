@@ -0,0 +1,88 @@
+import asyncio
+import time
+
+import pytest
+
+from askthemall.core.client import ChatInteraction
+from askthemall.core.scheduler import is_rate_limited
+from askthemall.synthetic import SyntheticChatClient, SyntheticError
+
+
+def client(**kwargs):
+    return SyntheticChatClient(
+        "some_id",
+        "Some name",
+        **{"first_token_delay": 0, "tokens_per_second": 10_000, **kwargs},
+    )
+
+
+def test_client_properties():
+    synthetic_client = client()
+    assert synthetic_client.id == "some_id"
+    assert synthetic_client.name == "Some name"
+    assert synthetic_client.client_type == "synthetic"
+    assert synthetic_client.model_name == "synthetic"
+
+
+def test_answers_are_reproducible():
+    first_session = client(seed=1).start_session()
+    second_session = client(seed=1).start_session()
+    other_session = client(seed=2).start_session()
+
+    answer = "".join(first_session.ask("some question"))
+
+    assert answer == "".join(second_session.ask("some question"))
+    assert answer != "".join(other_session.ask("some question"))
+    assert answer != "".join(first_session.ask("some question"))
+
+
+def test_restored_session_continues_chat():
+    session = client().start_session()
+    first_answer = "".join(session.ask("some question"))
+    second_answer = "".join(session.ask("other question"))
+
+    restored_session = client().restore_session(
+        [ChatInteraction("some question", first_answer)]
+    )
+
+    assert "".join(restored_session.ask("other question")) == second_answer
+
+
+def test_answer_length_follows_distribution():
+    session = client(answer_tokens_mean=10, answer_tokens_stddev=0).start_session()
+    assert len(list(session.ask("some question"))) == 10
+
+
+def test_answer_timing():
+    session = client(
+        first_token_delay=0.1,
+        tokens_per_second=100,
+        answer_tokens_mean=11,
+        answer_tokens_stddev=0,
+    ).start_session()
+    started_at = time.monotonic()
+    chunks = session.ask("some question")
+    next(chunks)
+    assert time.monotonic() - started_at == pytest.approx(0.1, abs=0.05)
+    list(chunks)
+    assert time.monotonic() - started_at == pytest.approx(0.2, abs=0.05)
+
+
+def test_errors():
+    session = client(error_rate=1, error_status_code=429).start_session()
+    with pytest.raises(SyntheticError) as error:
+        list(session.ask("some question"))
+    assert is_rate_limited(error.value)
+
+
+def test_aask():
+    session = client().start_session()
+    other_session = client().start_session()
+
+    async def ask():
+        return "".join([chunk async for chunk in session.aask("some question")])
+
+    assert asyncio.run(ask()) == "".join(other_session.ask("some question"))
+    assert asyncio.run(session.asuggest_title("some question")) == (
+        other_session.suggest_title("some question")
+    )
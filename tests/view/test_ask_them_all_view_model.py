@@ -0,0 +1,48 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+import streamlit as st
+
+from askthemall.view.model import AskThemAllViewModel
+
+
+@pytest.fixture(autouse=True)
+def session_state():
+    st.session_state.clear()
+    yield
+    st.session_state.clear()
+
+
+@pytest.fixture
+def view_model():
+    with patch("askthemall.view.model.AskThemAllModel"):
+        yield AskThemAllViewModel(
+            view_settings=MagicMock(), chat_cache_factory=MagicMock()
+        )
+
+
+def fan_out(*chat_ids):
+    fan_out = MagicMock()
+    fan_out.chats = [MagicMock(id=chat_id) for chat_id in chat_ids]
+    fan_out.get_chat.side_effect = lambda chat_id: next(
+        (chat for chat in fan_out.chats if chat.id == chat_id), None
+    )
+    return fan_out
+
+
+def test_removing_fan_out_chat_keeps_other_chats(view_model):
+    view_model.on_fan_out_started(fan_out("a", "b"))
+
+    view_model.on_chat_removed("a")
+
+    assert [chat.id for chat in st.session_state.fan_out.chats] == ["b"]
+    assert view_model.fan_out is not None
+
+
+def test_removing_last_fan_out_chat_ends_fan_out(view_model):
+    view_model.on_fan_out_started(fan_out("a", "b"))
+
+    view_model.on_chat_removed("a")
+    view_model.on_chat_removed("b")
+
+    assert view_model.fan_out is None
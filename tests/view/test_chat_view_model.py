@@ -0,0 +1,128 @@
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+import pytest
+import streamlit as st
+
+from askthemall.core.model import InteractionModel
+from askthemall.view import model
+from askthemall.view.model import ChatViewModel
+
+
+@pytest.fixture(autouse=True)
+def session_state():
+    st.session_state.clear()
+    yield
+    st.session_state.clear()
+
+
+def interaction(i):
+    return InteractionModel(
+        id=f"interaction-{i}",
+        chat_id="some_chat",
+        question=f"Question {i}",
+        answer=f"Answer {i}",
+        asked_at=datetime(2025, 1, 1),
+    )
+
+
+def chat(chat_id="some_chat", interaction_count=50, has_earlier=False, version=1):
+    chat = MagicMock(id=chat_id, has_earlier_interactions=has_earlier, version=version)
+    chat.interactions = [interaction(i) for i in range(interaction_count)]
+    return chat
+
+
+def view_model(chat):
+    return ChatViewModel(chat, MagicMock(), MagicMock())
+
+
+def ids(interactions):
+    return [i.interaction_id for i in interactions]
+
+
+def test_interactions_shows_latest_page():
+    chat_view_model = view_model(chat())
+
+    assert ids(chat_view_model.interactions) == [
+        f"interaction-{i}" for i in range(30, 50)
+    ]
+    assert chat_view_model.has_earlier_interactions
+
+
+def test_load_earlier_interactions_grows_window():
+    some_chat = chat()
+    chat_view_model = view_model(some_chat)
+
+    chat_view_model.load_earlier_interactions()
+
+    assert len(chat_view_model.interactions) == 40
+    assert chat_view_model.has_earlier_interactions
+    some_chat.load_earlier_interactions.assert_not_called()
+
+
+def test_load_earlier_interactions_reads_missing_from_chat():
+    some_chat = chat(interaction_count=30, has_earlier=True)
+    chat_view_model = view_model(some_chat)
+
+    chat_view_model.load_earlier_interactions()
+
+    some_chat.load_earlier_interactions.assert_called_once_with(10)
+
+
+def test_load_earlier_interactions_stops_at_first_interaction():
+    some_chat = chat(interaction_count=30)
+    chat_view_model = view_model(some_chat)
+
+    chat_view_model.load_earlier_interactions()
+
+    assert len(chat_view_model.interactions) == 30
+    assert not chat_view_model.has_earlier_interactions
+    some_chat.load_earlier_interactions.assert_not_called()
+
+
+def test_window_is_kept_per_chat():
+    some_chat = chat("some_chat")
+    view_model(some_chat).load_earlier_interactions()
+
+    assert len(view_model(chat("other_chat")).interactions) == 20
+    assert len(view_model(some_chat).interactions) == 40
+
+
+def test_interactions_are_reused_per_chat():
+    some_chat, other_chat = chat("some_chat"), chat("other_chat", version=2)
+
+    interactions = view_model(some_chat).interactions
+    view_model(other_chat).interactions
+
+    assert view_model(some_chat).interactions is interactions
+
+
+def test_interactions_are_rebuilt_when_chat_changes():
+    some_chat = chat()
+    interactions = view_model(some_chat).interactions
+
+    some_chat.interactions.append(interaction(50))
+    some_chat.version = 2
+
+    rebuilt = view_model(some_chat).interactions
+    assert rebuilt is not interactions
+    assert ids(rebuilt)[-1] == "interaction-50"
+
+
+def test_session_state_keeps_latest_chats(monkeypatch):
+    monkeypatch.setattr(model, "MAX_CHATS_IN_SESSION_STATE", 2)
+    for chat_id in ["a", "b", "c"]:
+        view_model(chat(chat_id)).interactions
+
+    assert list(st.session_state.chat_interactions) == ["b", "c"]
+
+
+def test_captions_are_formatted_once():
+    some_chat = chat()
+
+    with patch.object(model, "format_datetime", return_value="Jan 1") as format:
+        captions = [i.caption for i in view_model(some_chat).interactions]
+        captions += [i.caption for i in view_model(some_chat).interactions]
+
+    assert captions == ["Jan 1"] * 40
+    assert format.call_count == 20